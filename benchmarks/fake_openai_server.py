@@ -0,0 +1,468 @@
+"""
+Local OpenAI-compatible stub for benchmarking the pipeline without spending API credits.
+
+Serves POST /v1/responses with canned JSON shaped like the answer each pipeline prompt asks for,
+after a configurable latency, and injects 500s and 429s (with Retry-After) at configurable rates.
+Streaming requests get server-sent events with the text spread over the latency, and a fraction of
+plain JSON answers can be malformed the way prompt-only JSON sometimes is; structured-output
+(json_schema) requests always get valid JSON. Prompt caching is simulated the way providers do it:
+once a prompt of at least --cache-min-tokens has been seen, a later prompt sharing its prefix reports
+the shared part, in 128-token blocks, as cached_tokens. Several models can be served with their own
+latency (--model-latency), and requests that include output logprobs get them, low for the fraction of
+a model's answers set with --model-uncertainty, to exercise model cascades.
+GET /stats returns request counters.
+
+    python benchmarks/fake_openai_server.py --port 8765 --latency lognormal:0.8:0.5 --rate-limit-rate 0.02
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIELDS = [
+    "Reinforcement Learning",
+    "Computer Vision",
+    "Robotic Manipulation",
+    "Natural Language Processing",
+    "Graph Neural Networks",
+    "Distributed Systems",
+    "Query Optimization",
+    "Human-Computer Interaction",
+    "Network Congestion Control",
+    "Probabilistic Inference",
+]
+PAPER_PATTERNS = [
+    "A Survey of {field}",
+    "{field}: Foundations and Trends",
+    "Deep Learning for {field}",
+    "Scalable {field} in Practice",
+    "Rethinking {field}",
+    "{field} at Scale",
+    "On the Theory of {field}",
+    "Benchmarking {field}",
+]
+FOUNDATIONAL_TOPICS = [
+    "Machine Learning",
+    "Deep Learning",
+    "Probability Theory",
+    "Optimization",
+    "Control Theory",
+    "Information Theory",
+    "Statistical Learning",
+    "Signal Processing",
+    "Graph Theory",
+    "Database Theory",
+]
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution: fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA (seconds).
+    """
+    kind, *params = spec.split(":")
+    params = [float(param) for param in params]
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"Unsupported latency distribution '{spec}'.")
+
+
+def numbered_items(text, header):
+    """
+    Return the "1. item" lines of the numbered list that follows header in a prompt.
+    """
+    if header not in text:
+        return []
+    items = []
+    for line in text.split(header, 1)[1].splitlines():
+        match = re.match(r"\s*\d+\.\s+(.+?)\s*$", line)
+        if match:
+            items.append(match.group(1))
+        elif items or line.strip():
+            break
+    return items
+
+
+def titles(rng, count):
+    return [
+        rng.choice(PAPER_PATTERNS).format(field=rng.choice(FIELDS)) for _ in range(count)
+    ]
+
+
+def canned_answer(prompt, rng):
+    """
+    Build a response in the shape the given pipeline prompt asks for.
+    """
+    if '"project_title"' in prompt:
+        fields = rng.sample(FIELDS, 6)
+        return {
+            "project_title": f"Benchmark Project on {fields[0]}",
+            "project_summary": f"A benchmark project combining {fields[0]} and {fields[1]}.",
+            "prerequisites": ["Python", "Linear Algebra"],
+            "fundamental_concepts": rng.sample(FOUNDATIONAL_TOPICS, 3),
+            "core_concepts": fields[:3],
+            "specialized_concepts": [f"{field} for Benchmarks" for field in fields[3:]],
+        }
+    if '"papers"' in prompt:
+        return {"papers": [{"title": title} for title in titles(rng, 6)]}
+    if '"seminal_works"' in prompt:
+        return {
+            "seminal_works": [
+                {"title": title, "year": rng.randint(1990, 2023)} for title in titles(rng, 5)
+            ]
+        }
+    if '"top_papers"' in prompt:
+        candidates = re.search(r"Papers:\s*(.+)", prompt)
+        names = [name.strip() for name in candidates.group(1).split(", ")] if candidates else []
+        return {"top_papers": names[:6]}
+    if '"project_relevant"' in prompt:
+        topics = numbered_items(prompt, "Topics:")
+        return {
+            "project_relevant": rng.choice(["yes", "no"]),
+            "verdicts": [
+                {"index": index, "relevant": rng.choice(["yes", "no"])} for index in range(1, len(topics) + 1)
+            ],
+        }
+    if '"verdicts"' in prompt:
+        papers = numbered_items(prompt, "Papers:")
+        return {
+            "verdicts": [
+                {"index": index, "relevant": rng.choice(["yes", "yes", "no"])} for index in range(1, len(papers) + 1)
+            ]
+        }
+    if '"resources"' in prompt:
+        topics = numbered_items(prompt, "Topics:")
+        return {
+            "resources": [
+                {"index": index, "topic": topic, "resource": f"An Introduction to {topic} (Textbook)"}
+                for index, topic in enumerate(topics, start=1)
+            ]
+        }
+    if '"foundational_topics"' in prompt:
+        topics = rng.sample(FOUNDATIONAL_TOPICS, 3)
+        if '"resource"' in prompt:
+            return {
+                "foundational_topics": [
+                    {"topic": topic, "resource": f"An Introduction to {topic} (Textbook)"} for topic in topics
+                ]
+            }
+        return {"foundational_topics": [{"topic": topic} for topic in topics]}
+    if '"yes"' in prompt:
+        return rng.choice(["yes", "yes", "no"])
+    return {"answer": "ok"}
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency="fixed:0.05",
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        retry_after=1.0,
+        capacity=None,
+        malformed_rate=0.0,
+        cache_min_tokens=1024,
+        model_latency=None,
+        model_uncertainty=None,
+        seed=0,
+    ):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = parse_latency(latency)
+        # Per-model overrides: latency spec, and fraction of answers with low-probability tokens
+        self.model_latency = {model: parse_latency(spec) for model, spec in (model_latency or {}).items()}
+        self.model_uncertainty = dict(model_uncertainty or {})
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        # Requests allowed in flight at once; any beyond it are rejected with a 429
+        self.capacity = capacity
+        self.in_flight = 0
+        # Fraction of plain (non-structured) JSON answers wrapped in a code fence, as models sometimes do
+        self.malformed_rate = malformed_rate
+        # Prompt prefixes seen so far, one hash per 128-token block boundary
+        self.cache_min_tokens = cache_min_tokens
+        self.prefixes = set()
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.stats = {
+            "requests": 0,
+            "responses": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "structured": 0,
+            "streamed": 0,
+            "cached_tokens": 0,
+            "peak_in_flight": 0,
+            "by_model": {},
+        }
+
+    def draw(self, model=None):
+        latency = self.model_latency.get(model, self.latency)
+        with self.lock:
+            return latency(self.rng), self.rng.random(), self.rng.random(), self.rng.random()
+
+    def cached_tokens(self, model, prompt, block=128):
+        """
+        Tokens of prompt served from the simulated prefix cache, then cache its own prefixes.
+        Like provider caches, only prompts of at least cache_min_tokens take part, and a hit is
+        the longest previously seen prefix, rounded down to whole blocks.
+        """
+        if len(prompt) // 4 < self.cache_min_tokens:
+            return 0
+        size = block * 4
+        keys = [hash((model, prompt[:end])) for end in range(size, len(prompt) + 1, size)]
+        with self.lock:
+            hits = 0
+            while hits < len(keys) and keys[hits] in self.prefixes:
+                hits += 1
+            self.prefixes.update(keys[hits:])
+        cached = hits * block
+        return cached if cached >= self.cache_min_tokens else 0
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.lock:
+                self._send_json(200, self.server.stats)
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/responses"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        server = self.server
+        model = body.get("model", "unknown")
+        delay, error_draw, limit_draw, malformed_draw = server.draw(model)
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["by_model"][model] = server.stats["by_model"].get(model, 0) + 1
+            over_capacity = server.capacity is not None and server.in_flight >= server.capacity
+            rate_limited = over_capacity or limit_draw < server.rate_limit_rate
+            if rate_limited:
+                server.stats["rate_limited"] += 1
+            else:
+                server.in_flight += 1
+                server.stats["peak_in_flight"] = max(server.stats["peak_in_flight"], server.in_flight)
+
+        if rate_limited:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                {"Retry-After": str(server.retry_after)},
+            )
+            return
+
+        try:
+            self._respond(body, model, delay, error_draw, malformed_draw)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _respond(self, body, model, delay, error_draw, malformed_draw):
+        server = self.server
+        streaming = bool(body.get("stream"))
+        if not streaming:
+            time.sleep(delay)
+        if error_draw < server.error_rate:
+            if streaming:
+                time.sleep(delay)
+            with server.lock:
+                server.stats["errors"] += 1
+            self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+
+        prompt = f"{body.get('instructions', '')}\n{body.get('input', '')}"
+        # Seed from the prompt so identical prompts get identical answers across runs
+        digest = hashlib.sha256(f"{server.seed}:{model}:{prompt}".encode("utf-8")).digest()
+        answer = canned_answer(prompt, random.Random(digest))
+        text = answer if isinstance(answer, str) else json.dumps(answer)
+        structured = (body.get("text") or {}).get("format", {}).get("type") == "json_schema"
+        if not isinstance(answer, str) and not structured and malformed_draw < server.malformed_rate:
+            # The classic failure of prompt-only JSON: a fenced code block instead of a bare object
+            text = f"```json\n{text}\n```"
+        response = self._response_object(digest, model, prompt, text, server.cached_tokens(model, prompt))
+        if "message.output_text.logprobs" in (body.get("include") or []):
+            response["output"][0]["content"][0]["logprobs"] = self._logprobs(digest, model, text)
+        with server.lock:
+            server.stats["responses"] += 1
+            server.stats["cached_tokens"] += response["usage"]["input_tokens_details"]["cached_tokens"]
+            if structured:
+                server.stats["structured"] += 1
+            if streaming:
+                server.stats["streamed"] += 1
+
+        if streaming:
+            self._send_stream(response, text, delay)
+        else:
+            self._send_json(200, response)
+
+    def _response_object(self, digest, model, prompt, text, cached_tokens=0):
+        input_tokens = max(1, len(prompt) // 4)
+        output_tokens = max(1, len(text) // 4)
+        return {
+            "id": f"resp_{digest.hex()[:24]}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": "completed",
+            "output": [
+                {
+                    "type": "message",
+                    "id": f"msg_{digest.hex()[:24]}",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                }
+            ],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": cached_tokens},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    def _logprobs(self, digest, model, text):
+        """
+        Token logprobs of an answer: four characters per token, each with probability 0.99, or 0.5
+        for the model's uncertain answers. Whether an answer is uncertain depends only on the prompt.
+        """
+        uncertain = random.Random(digest + b"logprobs").random() < self.server.model_uncertainty.get(model, 0.0)
+        logprob = math.log(0.5 if uncertain else 0.99)
+        return [
+            {"token": token, "logprob": logprob, "bytes": list(token.encode("utf-8")), "top_logprobs": []}
+            for token in (text[start:start + 4] for start in range(0, len(text), 4))
+        ]
+
+    def _send_stream(self, response, text, delay, chunks=10):
+        """
+        Send the response as server-sent events, spreading text deltas evenly over delay.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        message_id = response["output"][0]["id"]
+        size = max(1, -(-len(text) // chunks))
+        events = [{"type": "response.created", "response": {**response, "status": "in_progress", "output": []}}]
+        events += [
+            {
+                "type": "response.output_text.delta",
+                "item_id": message_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": text[start:start + size],
+                "logprobs": [],
+            }
+            for start in range(0, len(text), size)
+        ]
+        events.append({"type": "response.completed", "response": response})
+        for number, event in enumerate(events):
+            if event["type"] == "response.output_text.delta":
+                time.sleep(delay / chunks)
+            event["sequence_number"] = number
+            data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on; 0 picks a free port")
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--capacity", type=int, help="Concurrent requests served before answering with 429s")
+    parser.add_argument(
+        "--malformed-rate", type=float, default=0.0, help="Fraction of plain JSON answers wrapped in a code fence"
+    )
+    parser.add_argument(
+        "--cache-min-tokens", type=int, default=1024, help="Shortest prompt prefix the simulated prompt cache serves"
+    )
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SPEC",
+        help="Latency distribution of one model, overriding --latency; may be repeated",
+    )
+    parser.add_argument(
+        "--model-uncertainty",
+        action="append",
+        default=[],
+        metavar="MODEL=FRACTION",
+        help="Fraction of a model's answers whose logprobs are low; may be repeated",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    model_latency = dict(value.split("=", 1) for value in args.model_latency)
+    model_uncertainty = {
+        model: float(fraction) for model, fraction in (value.split("=", 1) for value in args.model_uncertainty)
+    }
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        capacity=args.capacity,
+        malformed_rate=args.malformed_rate,
+        cache_min_tokens=args.cache_min_tokens,
+        model_latency=model_latency,
+        model_uncertainty=model_uncertainty,
+        seed=args.seed,
+    )
+    # The benchmark harness reads the bound port from the first line of output
+    print(f"http://{args.host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+End-to-end pipeline benchmark against the local fake OpenAI server.
+
+Starts benchmarks/fake_openai_server.py, runs main_workflow.main over the projects in /queries
+once per concurrency setting, and reports wall time, LLM calls per second and peak threads and
+memory. Results can be saved and compared against an earlier run to catch regressions.
+
+    python benchmarks/run_benchmark.py --max-concurrency 8 32 64 --latency lognormal:0.3:0.5
+    python benchmarks/run_benchmark.py --output baseline.json
+    python benchmarks/run_benchmark.py --baseline baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes; falls back to the peak RSS where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ResourceSampler:
+    """
+    Background thread that records peak thread count and peak RSS while a run is in progress.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            # The sampler's own thread is not part of the workload
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextlib.contextmanager
+def fake_server(server_args):
+    """
+    Run the fake OpenAI server in a subprocess and yield its base URL.
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "fake_openai_server.py"), "--port", "0", *server_args],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        base_url = process.stdout.readline().strip()
+        if not base_url:
+            raise RuntimeError("Fake OpenAI server failed to start.")
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.load(response)
+
+
+def run_once(
+    projects, max_concurrency, scheduler, config, base_url, quiet=True, structured_output=False, cascade=None
+):
+    """
+    Run the whole pipeline once in a scratch directory and return its measurements.
+    """
+    from main_workflow import main
+
+    before = server_stats(base_url)
+    with tempfile.TemporaryDirectory() as scratch:
+        metrics_path = os.path.join(scratch, "metrics.json")
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        error = None
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+                if quiet:
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                with ResourceSampler() as sampler:
+                    start = time.perf_counter()
+                    try:
+                        main(
+                            projects,
+                            use_cache=False,
+                            max_concurrency=max_concurrency,
+                            scheduler=scheduler,
+                            config=config,
+                            metrics_path=metrics_path,
+                            structured_output=structured_output,
+                            cascade=cascade,
+                        )
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    wall_time = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+        report = {}
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as file:
+                report = json.load(file)
+    after = server_stats(base_url)
+
+    requests = after["requests"] - before["requests"]
+    stages = report.get("stages", {}).values()
+    input_tokens = sum(stage["input_tokens"] for stage in stages)
+    return {
+        "max_concurrency": max_concurrency,
+        "wall_time": wall_time,
+        "requests": requests,
+        "calls_per_second": requests / wall_time if wall_time else 0.0,
+        "rate_limited": after["rate_limited"] - before["rate_limited"],
+        "server_errors": after["errors"] - before["errors"],
+        "parse_failures": sum(stage["parse_failures"] for stage in stages),
+        "cached_token_rate": sum(stage["cached_tokens"] for stage in stages) / input_tokens if input_tokens else 0.0,
+        "peak_llm_concurrency": report.get("max_concurrency", 0),
+        "peak_threads": sampler.peak_threads,
+        "peak_rss_mb": sampler.peak_rss / 2**20,
+        "error": error,
+    }
+
+
+def summarize(runs):
+    """
+    Median of each measurement across repeated runs of one setting.
+    """
+    summary = {"max_concurrency": runs[0]["max_concurrency"], "runs": len(runs)}
+    for key in ("wall_time", "requests", "calls_per_second", "rate_limited", "server_errors",
+                "parse_failures", "cached_token_rate", "peak_llm_concurrency", "peak_threads", "peak_rss_mb"):
+        summary[key] = statistics.median(run[key] for run in runs)
+    summary["errors"] = [run["error"] for run in runs if run["error"]]
+    return summary
+
+
+def print_table(results):
+    print(
+        f"\n{'concurrency':>11} {'wall (s)':>9} {'requests':>9} {'calls/s':>8} {'429s':>5} "
+        f"{'5xx':>4} {'parse':>6} {'cached':>7} {'peak llm':>9} {'threads':>8} {'rss (MB)':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['max_concurrency']:>11} {result['wall_time']:>9.2f} {result['requests']:>9.0f} "
+            f"{result['calls_per_second']:>8.1f} {result['rate_limited']:>5.0f} {result['server_errors']:>4.0f} "
+            f"{result['parse_failures']:>6.0f} {result['cached_token_rate']:>7.0%} {result['peak_llm_concurrency']:>9.0f} "
+            f"{result['peak_threads']:>8.0f} {result['peak_rss_mb']:>9.1f}"
+        )
+        for error in result["errors"]:
+            print(f"{'':>11} failed: {error}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Report settings whose wall time regressed by more than tolerance against a saved baseline.
+    Returns the number of regressions.
+    """
+    previous = {result["max_concurrency"]: result for result in baseline["results"]}
+    regressions = 0
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%}):")
+    for result in results:
+        before = previous.get(result["max_concurrency"])
+        if before is None:
+            continue
+        change = result["wall_time"] / before["wall_time"] - 1 if before["wall_time"] else 0.0
+        regressed = change > tolerance
+        regressions += regressed
+        print(
+            f"- concurrency {result['max_concurrency']}: {before['wall_time']:.2f}s -> {result['wall_time']:.2f}s "
+            f"({change:+.0%}){' REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    from utils.pipeline_config import PipelineConfig
+
+    queries = sorted(name[:-5] for name in os.listdir(os.path.join(REPO_DIR, "queries")) if name.endswith(".json"))
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline end to end against a fake OpenAI server.")
+    parser.add_argument("projects", nargs="*", default=queries, help="Projects in /queries (default: all)")
+    parser.add_argument("--max-concurrency", type=int, nargs="+", default=[32], help="Settings to compare")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per setting; the median is reported")
+    parser.add_argument("--scheduler", choices=["dataflow", "staged"], default="dataflow")
+    parser.add_argument("--select-chunk-size", type=int)
+    parser.add_argument("--citation-index", metavar="DIR", help="Offline citation index for seminal works")
+    parser.add_argument("--expansion-depth", type=int, default=1)
+    parser.add_argument("--expansion-max-nodes", type=int, default=30)
+    parser.add_argument("--expansion-max-calls", type=int)
+    parser.add_argument("--prune-batch-size", type=int, default=1)
+    parser.add_argument("--prefilter-low", type=float)
+    parser.add_argument("--prefilter-high", type=float)
+    parser.add_argument("--foundational-single-pass", action="store_true")
+    parser.add_argument("--structured-output", action="store_true")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5", help="Fake server latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--capacity", type=int, help="Concurrent requests the fake server accepts before 429s")
+    parser.add_argument(
+        "--malformed-rate", type=float, default=0.0, help="Fraction of plain JSON answers the fake server malforms"
+    )
+    parser.add_argument(
+        "--cache-min-tokens", type=int, default=1024, help="Shortest prompt prefix the fake server's prompt cache serves"
+    )
+    parser.add_argument(
+        "--cascade", action="append", default=[], metavar="STAGE=MODEL", help="Cascade a stage through a cheaper model"
+    )
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=SPEC", help="Fake server latency of one model"
+    )
+    parser.add_argument(
+        "--model-uncertainty",
+        action="append",
+        default=[],
+        metavar="MODEL=FRACTION",
+        help="Fraction of one model's fake answers with low logprobs",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    parser.add_argument("--output", metavar="PATH", help="Save results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed wall time regression vs baseline")
+    args = parser.parse_args()
+
+    server_args = [
+        "--latency", args.latency,
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--retry-after", str(args.retry_after),
+        "--malformed-rate", str(args.malformed_rate),
+        "--cache-min-tokens", str(args.cache_min_tokens),
+        "--seed", str(args.seed),
+    ]
+    if args.capacity is not None:
+        server_args += ["--capacity", str(args.capacity)]
+    for value in args.model_latency:
+        server_args += ["--model-latency", value]
+    for value in args.model_uncertainty:
+        server_args += ["--model-uncertainty", value]
+    config = PipelineConfig(
+        select_chunk_size=args.select_chunk_size,
+        citation_index=args.citation_index,
+        expansion_depth=args.expansion_depth,
+        expansion_max_nodes=args.expansion_max_nodes,
+        expansion_max_calls=args.expansion_max_calls,
+        prune_batch_size=args.prune_batch_size,
+        prefilter_low=args.prefilter_low,
+        prefilter_high=args.prefilter_high,
+        foundational_single_pass=args.foundational_single_pass,
+        stream=args.stream,
+    )
+
+    results = []
+    with fake_server(server_args) as base_url:
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        for max_concurrency in args.max_concurrency:
+            runs = []
+            for repeat in range(args.repeat):
+                print(f"Running {', '.join(args.projects)} at concurrency {max_concurrency} ({repeat + 1}/{args.repeat})")
+                runs.append(
+                    run_once(
+                        args.projects,
+                        max_concurrency,
+                        args.scheduler,
+                        config,
+                        base_url,
+                        quiet=not args.verbose,
+                        structured_output=args.structured_output,
+                        cascade=dict(value.split("=", 1) for value in args.cascade),
+                    )
+                )
+            results.append(summarize(runs))
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+        print(f"\nResults written to {args.output}")
+    failed = any(result["errors"] for result in results)
+    if args.baseline:
+        with open(args.baseline) as file:
+            failed |= compare(results, json.load(file), args.tolerance) > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
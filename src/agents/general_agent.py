@@ -1,21 +1,650 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import math
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
 import openai
 
+from utils.http_pool import ConnectionStats, build_async_http_client, build_http_client
+from utils.json_stream import JsonArrayStream, iter_array_items
+from utils.llm_cache import LLMCache
+from utils.metrics import percentile
+from utils.rate_control import RateController, estimate_tokens
+
+# Responses API include flag that returns the log probability of every output token
+OUTPUT_LOGPROBS = "message.output_text.logprobs"
+
+
+def answer_confidence(response):
+    """
+    Geometric mean probability of the tokens of a response's output text, from its logprobs;
+    None if the response carries no logprobs.
+    """
+    logprobs = [
+        entry.logprob
+        for item in response.output
+        if item.type == "message"
+        for content in item.content
+        if content.type == "output_text"
+        for entry in content.logprobs or []
+    ]
+    if not logprobs:
+        return None
+    return math.exp(sum(logprobs) / len(logprobs))
+
+
 class Agent:
-    def __init__(self, model="gpt-4o", api_key=None, temperature=0.0):
+    def __init__(
+        self,
+        model="gpt-4o",
+        api_key=None,
+        temperature=0.0,
+        cache=None,
+        refresh_cache=False,
+        base_url=None,
+        timeout=60.0,
+        max_connections=100,
+        max_keepalive_connections=32,
+        keepalive_expiry=30.0,
+        max_concurrency=32,
+        metrics=None,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=6,
+        call_deadline=None,
+        hedge_percentile=None,
+        hedge_min_samples=20,
+        structured_output=False,
+        stage_models=None,
+        cascade=None,
+        cascade_threshold=0.8,
+    ):
         self.model = model
+        # Per-stage routing: stage -> model answering that stage's calls instead of model
+        self.stage_models = dict(stage_models or {})
+        # Cascade: stage -> cheaper model that answers the stage's calls first. An answer is
+        # escalated to the stage's model when its confidence (answer_confidence) is below
+        # cascade_threshold, when it has no logprobs, or when JSON was asked for and it is not JSON
+        self.cascade = dict(cascade or {})
+        self.cascade_threshold = cascade_threshold
+        self.cascade_stats = {}
         self.api_key = api_key or openai.api_key
         self.temperature = temperature
+        # Optional utils.llm_cache.LLMCache; refresh_cache skips lookups but still stores new responses
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        # base_url allows pointing the agent at a local OpenAI-compatible stub for benchmarking
+        self.base_url = base_url
+        self.timeout = timeout
+        self.pool_limits = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+        }
+        # Upper bound on in-flight calls; the actual limit adapts below it to 429s and latency.
+        # Shared by every stage and project, together with the optional per-minute rate limits
+        self.max_concurrency = max_concurrency
+        self.rate_control = RateController(
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries,
+        )
+        self.retries = Counter()
+        # Seconds one attempt may take before it is abandoned and retried; None uses the client timeout
+        self.call_deadline = call_deadline
+        # Hedging: once a stage has hedge_min_samples latencies, an attempt still running after the
+        # stage's hedge_percentile latency gets a duplicate request, and the first to finish wins
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = {}
+        self.hedged = Counter()
+        self.hedge_wins = Counter()
+        # Send each prompt's JSON schema so the API constrains responses to it (see utils.response_formats)
+        self.structured_output = structured_output
+        self.connection_stats = ConnectionStats()
+        # Optional utils.metrics.Metrics; when None, no per-call instrumentation is recorded
+        self.metrics = metrics
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Async clients are bound to the event loop that created them
+        self._async_loop = None
+        self._async_client = None
+        # Single-flight: identical concurrent requests share one network call
+        self._inflight = {}
+        self._inflight_waiters = Counter()
+        self._sync_inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.singleflight_saved = Counter()
 
-    def query(self, instructions, input_text):
+    @property
+    def client(self):
         """
-        Query the GPT model with the given instructions and input text.
+        Shared, thread-safe OpenAI client whose connection pool is reused by every query.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    http_client = build_http_client(
+                        stats=self.connection_stats, timeout=self.timeout, **self.pool_limits
+                    )
+                    self._client = openai.OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        http_client=http_client,
+                        # Retries go through the rate controller instead of the client's own backoff
+                        max_retries=0,
+                    )
+        return self._client
+
+    def _async_state(self):
+        """
+        Return the async client for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            http_client = build_async_http_client(
+                stats=self.connection_stats, timeout=self.timeout, **self.pool_limits
+            )
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=http_client,
+                max_retries=0,
+            )
+            self._inflight = {}
+            self._inflight_waiters = Counter()
+            self._async_loop = loop
+        return self._async_client
+
+    def close(self):
+        """
+        Close the pooled HTTP connections.
+        """
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """
+        Close the async client bound to the running event loop.
+        """
+        if self._async_client is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_client.close()
+        self._async_loop = None
+        self._async_client = None
+
+    def run(self, coro):
+        """
+        Run a coroutine to completion on a fresh event loop and release its async client.
+        Used by the synchronous wrappers around the async pipeline.
         """
-        instructions += " For the json, do NOT include tick marks or any other formatting. Just ONLY provide the JSON object."
 
-        response = openai.OpenAI(api_key=self.api_key).responses.create(
-            model=self.model,
-            instructions=instructions,
-            input=input_text,
-            temperature=self.temperature,
+        async def runner():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+
+        return asyncio.run(runner())
+
+    def _lookup(self, key):
+        """
+        Return the cached response for a request key, or None.
+        """
+        if self.cache is None or self.refresh_cache:
+            return None
+        return self.cache.get(key)
+
+    def _store(self, key, response, model=None):
+        if self.cache is not None:
+            self.cache.set(key, model or self.model, response)
+
+    def model_for(self, stage):
+        """
+        Model that answers a stage's calls, or escalated calls in a cascaded stage.
+        """
+        return self.stage_models.get(stage, self.model)
+
+    def routing(self):
+        """
+        Description of the models answering each stage, for checkpoint fingerprints.
+        Just the model name while every stage uses it.
+        """
+        if not self.stage_models and not self.cascade:
+            return self.model
+        return {
+            "model": self.model,
+            "stage_models": self.stage_models,
+            "cascade": self.cascade,
+            "cascade_threshold": self.cascade_threshold if self.cascade else None,
+        }
+
+    def _cascade_requests(self, instructions, input_text, stage, response_format):
+        """
+        (request, cache key, whether JSON is expected) of the cheap first call of a cascaded
+        stage, or None if the stage is not cascaded.
+        """
+        cheap_model = self.cascade.get(stage)
+        if cheap_model is None or cheap_model == self.model_for(stage):
+            return None
+        request, key = self._request(instructions, input_text, response_format, cheap_model)
+        request["include"] = [OUTPUT_LOGPROBS]
+        return request, key, response_format is not None
+
+    def _confident(self, response, expects_json):
+        confidence = answer_confidence(response)
+        if confidence is None or confidence < self.cascade_threshold:
+            return False
+        if expects_json:
+            try:
+                json.loads(response.output_text)
+            except json.JSONDecodeError:
+                return False
+        return True
+
+    def _record_cascade(self, stage, cheap_latency, full_latency=None):
+        stats = self.cascade_stats.setdefault(
+            stage, {"answered": 0, "escalated": 0, "cheap_latency": 0.0, "full_latency": 0.0}
         )
+        stats["cheap_latency"] += cheap_latency
+        if full_latency is None:
+            stats["answered"] += 1
+        else:
+            stats["escalated"] += 1
+            stats["full_latency"] += full_latency
+
+    def cascade_report(self):
+        """
+        Per cascaded stage: calls answered by the cheap model, calls escalated, the escalation
+        rate, mean latency of cheap and escalated calls, and the latency saved against sending
+        every call straight to the stage's model. Savings are estimated from the escalated calls'
+        latency, so they are None until a call of the stage has escalated.
+        """
+        report = {}
+        for stage, stats in self.cascade_stats.items():
+            calls = stats["answered"] + stats["escalated"]
+            full_mean = stats["full_latency"] / stats["escalated"] if stats["escalated"] else None
+            report[stage] = {
+                "answered": stats["answered"],
+                "escalated": stats["escalated"],
+                "escalation_rate": stats["escalated"] / calls if calls else 0.0,
+                "cheap_latency_mean": stats["cheap_latency"] / calls if calls else 0.0,
+                "full_latency_mean": full_mean,
+                # Answered calls skip a full-model call; every call pays for the cheap one
+                "latency_saved": (
+                    stats["answered"] * full_mean - stats["cheap_latency"] if full_mean is not None else None
+                ),
+            }
+        return report
+
+    def parse_failed(self, stage):
+        """
+        Record that a stage could not parse a response.
+        """
+        if self.metrics is not None:
+            self.metrics.parse_failure(stage)
+
+    def _request(self, instructions, input_text, response_format=None, model=None):
+        """
+        Keyword arguments for responses.create, and the cache key of that request.
+        response_format is only sent in structured-output mode; model defaults to the agent's.
+        """
+        model = model or self.model
+        request = {
+            "model": model,
+            "instructions": instructions,
+            "input": input_text,
+            "temperature": self.temperature,
+        }
+        if self.call_deadline is not None:
+            request["timeout"] = self.call_deadline
+        if not self.structured_output:
+            response_format = None
+        if response_format is not None:
+            request["text"] = {"format": response_format}
+        key = LLMCache.make_key(model, self.temperature, instructions, input_text, response_format)
+        return request, key
+
+    def _create(self, request, stage):
+        """
+        Send one request through the rate controller, retrying transient failures with backoff.
+        """
+        estimated = estimate_tokens(request["instructions"], request["input"])
+        for attempt in itertools.count():
+            started = self.rate_control.throttle_sync(estimated)
+            token = self.metrics.call_started(stage, request["model"]) if self.metrics is not None else None
+            try:
+                response = self.client.responses.create(**request)
+            except BaseException as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                self.rate_control.limiter.release(started, stage, rate_limited=rate_limited, failed=not rate_limited)
+                if token is not None:
+                    self.metrics.call_finished(token, error=e)
+                if not self.rate_control.should_retry(e, attempt):
+                    raise
+                delay = self.rate_control.delay(e, attempt)
+            else:
+                self.rate_control.limiter.release(started, stage)
+                self.rate_control.settle(estimated, response)
+                if token is not None:
+                    self.metrics.call_finished(token, response)
+                return response
+            self.retries[stage] += 1
+            time.sleep(delay)
+
+    def _record_latency(self, stage, latency):
+        self._latencies.setdefault(stage, deque(maxlen=200)).append(latency)
+
+    def _hedge_delay(self, stage):
+        """
+        Seconds to wait on an attempt before hedging it, or None if hedging is off for now.
+        """
+        latencies = self._latencies.get(stage)
+        if self.hedge_percentile is None or latencies is None or len(latencies) < self.hedge_min_samples:
+            return None
+        return percentile(latencies, self.hedge_percentile)
+
+    async def _aattempt(self, client, request, stage, estimated, sent=None):
+        """
+        Send a single request through the rate controller; sent, if given, is resolved once the
+        request has its slot and goes out.
+        """
+        started = await self.rate_control.throttle(estimated)
+        if sent is not None and not sent.done():
+            sent.set_result(None)
+        token = self.metrics.call_started(stage, request["model"]) if self.metrics is not None else None
+        try:
+            response = await client.responses.create(**request)
+        except BaseException as e:
+            rate_limited = isinstance(e, openai.RateLimitError)
+            self.rate_control.limiter.release(started, stage, rate_limited=rate_limited, failed=not rate_limited)
+            if token is not None:
+                self.metrics.call_finished(token, error=e)
+            raise
+        self.rate_control.limiter.release(started, stage)
+        self.rate_control.settle(estimated, response)
+        if token is not None:
+            self.metrics.call_finished(token, response)
+        self._record_latency(stage, time.monotonic() - started)
+        return response
+
+    async def _ahedged_attempt(self, client, request, stage, estimated):
+        """
+        Send a request and, if it is still running after the stage's hedge delay, a duplicate.
+        Returns the first successful response and cancels the other request.
+        """
+        delay = self._hedge_delay(stage)
+        if delay is None:
+            return await self._aattempt(client, request, stage, estimated)
+
+        sent = asyncio.get_running_loop().create_future()
+        primary = asyncio.ensure_future(self._aattempt(client, request, stage, estimated, sent))
+        attempts = {primary}
+        try:
+            # Time spent queued for a concurrency slot is not latency, so the hedge clock starts at send
+            await asyncio.wait({primary, sent}, return_when=asyncio.FIRST_COMPLETED)
+            started = time.monotonic()
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                self.hedged[stage] += 1
+                attempts.add(asyncio.ensure_future(self._aattempt(client, request, stage, estimated)))
+            errors = []
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                errors.extend(task.exception() for task in done if task.exception() is not None)
+                if winners:
+                    if winners[0] is not primary:
+                        self.hedge_wins[stage] += 1
+                        # The losing request's latency is at least this long; recording it keeps
+                        # the percentile from drifting down as hedges cut off the slow tail
+                        self._record_latency(stage, time.monotonic() - started)
+                    return winners[0].result()
+            raise errors[0]
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _acreate(self, client, request, stage):
+        """
+        Async version of _create, with optional hedging of slow attempts.
+        """
+        estimated = estimate_tokens(request["instructions"], request["input"])
+        for attempt in itertools.count():
+            try:
+                return await self._ahedged_attempt(client, request, stage, estimated)
+            except Exception as e:
+                if not self.rate_control.should_retry(e, attempt):
+                    raise
+                delay = self.rate_control.delay(e, attempt)
+            self.retries[stage] += 1
+            await asyncio.sleep(delay)
+
+    async def _acall(self, key, client, request, stage, cascade=None):
+        """
+        The shared network call behind a single-flight key; caches the response when it lands.
+        With cascade (from _cascade_requests), the cheap model is asked first.
+        """
+        try:
+            if cascade is not None:
+                return await self._acascade(client, request, key, stage, *cascade)
+            response = await self._acreate(client, request, stage)
+            self._store(key, response.output_text, request["model"])
+            return response.output_text
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def query(self, instructions, input_text, stage=None, response_format=None):
+        """
+        Query the GPT model with the given instructions and input text.
+        stage labels the calling pipeline stage in the agent's statistics; response_format is the
+        prompt's JSON schema, used in structured-output mode.
+        """
+        request, key = self._request(instructions, input_text, response_format, self.model_for(stage))
+        cascade = self._cascade_requests(instructions, input_text, stage, response_format)
+        cached = self._lookup_routed(key, cascade)
+        if cached is not None:
+            if self.metrics is not None:
+                self.metrics.cache_hit(stage)
+            return cached
+
+        with self._inflight_lock:
+            call = self._sync_inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_inflight[key] = Future()
+        if not leader:
+            self.singleflight_saved[stage] += 1
+            return call.result()
+
+        try:
+            if cascade is not None:
+                text = self._cascade(request, key, stage, *cascade)
+            else:
+                text = self._create(request, stage).output_text
+                self._store(key, text, request["model"])
+            call.set_result(text)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._sync_inflight[key]
+        return text
+
+    def _cascade(self, request, key, stage, cheap_request, cheap_key, expects_json):
+        """
+        Ask the cheap model first and escalate to request's model if its answer is not confident.
+        Only confident cheap answers are cached under the cheap key, so an escalated call goes
+        straight to the full model's cached answer next time.
+        """
+        started = time.monotonic()
+        response = self._create(cheap_request, stage)
+        cheap_latency = time.monotonic() - started
+        if self._confident(response, expects_json):
+            self._record_cascade(stage, cheap_latency)
+            self._store(cheap_key, response.output_text, cheap_request["model"])
+            return response.output_text
+        started = time.monotonic()
+        response = self._create(request, stage)
+        self._record_cascade(stage, cheap_latency, time.monotonic() - started)
+        self._store(key, response.output_text, request["model"])
+        return response.output_text
+
+    async def _acascade(self, client, request, key, stage, cheap_request, cheap_key, expects_json):
+        """
+        Async version of _cascade.
+        """
+        started = time.monotonic()
+        response = await self._acreate(client, cheap_request, stage)
+        cheap_latency = time.monotonic() - started
+        if self._confident(response, expects_json):
+            self._record_cascade(stage, cheap_latency)
+            self._store(cheap_key, response.output_text, cheap_request["model"])
+            return response.output_text
+        started = time.monotonic()
+        response = await self._acreate(client, request, stage)
+        self._record_cascade(stage, cheap_latency, time.monotonic() - started)
+        self._store(key, response.output_text, request["model"])
         return response.output_text
+
+    def _lookup_routed(self, key, cascade):
+        """
+        Cached answer of a call: the cheap model's confident answer in a cascaded stage, else the
+        answer of the stage's model.
+        """
+        if cascade is not None:
+            cached = self._lookup(cascade[1])
+            if cached is not None:
+                return cached
+        return self._lookup(key)
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        """
+        Async version of query; concurrent calls share one connection pool and rate controller,
+        and identical in-flight requests are collapsed into a single network call.
+        """
+        request, key = self._request(instructions, input_text, response_format, self.model_for(stage))
+        cascade = self._cascade_requests(instructions, input_text, stage, response_format)
+        cached = self._lookup_routed(key, cascade)
+        if cached is not None:
+            if self.metrics is not None:
+                self.metrics.cache_hit(stage)
+            return cached
+
+        client = self._async_state()
+        call = self._inflight.get(key)
+        if call is None:
+            call = self._inflight[key] = asyncio.ensure_future(
+                self._acall(key, client, request, stage, cascade)
+            )
+        else:
+            self.singleflight_saved[stage] += 1
+
+        # The call runs as its own task, so one caller giving up (e.g. when its stage's time budget
+        # runs out) does not cancel it for the others; it is cancelled only once nobody is waiting
+        self._inflight_waiters[key] += 1
+        try:
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            if self._inflight_waiters[key] == 1:
+                call.cancel()
+                # Later identical requests start a fresh call rather than joining the cancelled one
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+            raise
+        finally:
+            self._inflight_waiters[key] -= 1
+            if not self._inflight_waiters[key]:
+                del self._inflight_waiters[key]
+
+    async def _astream_attempt(self, client, request, stage, estimated):
+        """
+        Stream a single request through the rate controller, yielding text as it arrives.
+        """
+        started = await self.rate_control.throttle(estimated)
+        token = self.metrics.call_started(stage, request["model"]) if self.metrics is not None else None
+        response = None
+        try:
+            stream = await client.responses.create(**request, stream=True)
+            try:
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        yield event.delta
+                    elif event.type == "response.completed":
+                        response = event.response
+            finally:
+                await stream.close()
+        except BaseException as e:
+            rate_limited = isinstance(e, openai.RateLimitError)
+            self.rate_control.limiter.release(started, stage, rate_limited=rate_limited, failed=not rate_limited)
+            if token is not None:
+                self.metrics.call_finished(token, error=e)
+            raise
+        self.rate_control.limiter.release(started, stage)
+        self.rate_control.settle(estimated, response)
+        if token is not None:
+            self.metrics.call_finished(token, response)
+
+    async def astream_items(self, instructions, input_text, key, stage=None, response_format=None, item_key=None):
+        """
+        Stream a JSON response and yield the elements of its key array as each one is complete,
+        so callers can start on the first element before the response finishes. Responses are
+        served from and stored in the cache like aquery, though only once the whole answer has
+        parsed. Streamed calls are not cascaded: they go to the stage's model.
+
+        A stream that fails part-way is retried. The retry is a new sample, so its elements are
+        matched against those already yielded by item_key (a function of an element; by default
+        its JSON) rather than by position: each distinct element is yielded once, whichever
+        attempt it came from.
+        """
+        request, cache_key = self._request(instructions, input_text, response_format, self.model_for(stage))
+        cached = self._lookup(cache_key)
+        if cached is not None:
+            if self.metrics is not None:
+                self.metrics.cache_hit(stage)
+            for item in iter_array_items(cached, key):
+                yield item
+            return
+
+        client = self._async_state()
+        estimated = estimate_tokens(request["instructions"], request["input"])
+        identity = item_key or (lambda item: json.dumps(item, sort_keys=True))
+        yielded = set()
+        for attempt in itertools.count():
+            parser = JsonArrayStream(key)
+            try:
+                async with contextlib.aclosing(self._astream_attempt(client, request, stage, estimated)) as chunks:
+                    async for chunk in chunks:
+                        for item in parser.feed(chunk):
+                            if identity(item) not in yielded:
+                                yielded.add(identity(item))
+                                yield item
+            except Exception as e:
+                if not self.rate_control.should_retry(e, attempt):
+                    raise
+                delay = self.rate_control.delay(e, attempt)
+            else:
+                # Only a complete, valid answer is cached; a truncated one would be replayed on every run
+                try:
+                    json.loads(parser.text)
+                    complete = parser.done
+                except ValueError:
+                    complete = False
+                if complete:
+                    self._store(cache_key, parser.text, request["model"])
+                else:
+                    self.parse_failed(stage)
+                return
+            self.retries[stage] += 1
+            await asyncio.sleep(delay)
@@ -1,10 +1,24 @@
+import asyncio
 import json
 
+from utils.budget import PartialResult, gather_within
+from utils.prompts import get_prompt
+
+TOP_PAPERS_PROMPT = get_prompt("top_papers")
+EXPLAIN_PROMPT = get_prompt("explain_relevance")
+
+# Papers kept from the count-1 candidates of each topic
+TOP_K = 6
+
 class SeminalEvalAgent:
-    def __init__(self, seminal_paper_counts_by_topic, gpt_agent, project_summary):
+    def __init__(self, seminal_paper_counts_by_topic, gpt_agent, project_summary, chunk_size=None):
         self.seminal_paper_counts_by_topic = seminal_paper_counts_by_topic
         self.gpt_agent = gpt_agent
         self.project_summary = project_summary
+        # Most candidate titles in one ranking prompt; None ranks every candidate in a single prompt
+        if chunk_size is not None and chunk_size <= TOP_K:
+            raise ValueError(f"chunk_size must be larger than {TOP_K} for the tournament to narrow down")
+        self.chunk_size = chunk_size
 
     def select_papers(self):
         """
@@ -12,48 +26,105 @@ class SeminalEvalAgent:
         1. Include all papers with a count > 1.
         2. Use the agent to determine the top 6 most relevant papers from the remaining ones, preserving their ranking.
         """
-        selected_papers = {}
-
-        for topic, paper_counts in self.seminal_paper_counts_by_topic.items():
-            # Separate papers with count > 1 and count == 1
-            high_count_papers = {
-                paper: count for paper, count in paper_counts.items() if count > 1
-            }
-            low_count_papers = {
-                paper: count for paper, count in paper_counts.items() if count == 1
-            }
-
-            # Add all high-count papers
-            selected_papers[topic] = list(high_count_papers.keys())
-            print(f"Topic '{topic}': High-count papers selected: {selected_papers[topic]}")
-
-            # Use the agent to determine the top 6 most relevant papers from the remaining ones
-            if low_count_papers:
-                input_text = f"""
-                The project summary is as follows: {self.project_summary}.
-                Assess the relevance of the following papers to the topic '{topic}' in the context of this project.
-                Rank the papers by relevance and provide the top 6 most relevant papers in a JSON array format.
-                Papers: {', '.join(low_count_papers.keys())}
-                Respond in the following format:
-                {{
-                    "top_papers": ["<paper title>", "<paper title>", ...]
-                }}
-                """
-                try:
-                    response = self.gpt_agent.query("You are a helpful assistant.", input_text).strip()
-                    response_data = json.loads(response)
-                    selected_low_count_papers = response_data.get("top_papers", [])
-                except Exception as e:
-                    print(f"Error assessing relevance for topic '{topic}': {e}")
-                    selected_low_count_papers = []
+        return self.gpt_agent.run(self.aselect_papers())
+
+    async def aselect_papers(self, budget=None):
+        """
+        Async version of select_papers; topics are evaluated concurrently.
+        Topics still running after budget seconds are listed in the result's missing.
+        """
+        results, missing = await gather_within(
+            budget,
+            {
+                topic: self.aselect_topic_papers(topic, paper_counts)
+                for topic, paper_counts in self.seminal_paper_counts_by_topic.items()
+            },
+        )
+        return PartialResult(results, missing=missing)
+
+    async def aselect_topic_papers(self, topic, paper_counts):
+        """
+        Select the papers for a single topic from its reference counts.
+        """
+        # Separate papers with count > 1 and count == 1
+        high_count_papers = {
+            paper: count for paper, count in paper_counts.items() if count > 1
+        }
+        low_count_papers = {
+            paper: count for paper, count in paper_counts.items() if count == 1
+        }
+
+        # Add all high-count papers
+        selected_papers = list(high_count_papers.keys())
+        print(f"Topic '{topic}': High-count papers selected: {selected_papers}")
 
-                # Add selected low-count papers
-                selected_papers[topic].extend(selected_low_count_papers)
+        # Use the agent to determine the top 6 most relevant papers from the remaining ones
+        if low_count_papers:
+            selected_low_count_papers = await self.atournament(topic, list(low_count_papers))
 
-            print(f"Topic '{topic}': Final selected papers: {selected_papers[topic]}")
+            # Add selected low-count papers
+            selected_papers.extend(selected_low_count_papers)
 
+        print(f"Topic '{topic}': Final selected papers: {selected_papers}")
         return selected_papers
 
+    async def arank_papers(self, topic, papers):
+        """
+        Ask the agent for the top TOP_K of papers by relevance to topic, best first.
+        Returns an empty list if the request or its response fails.
+        """
+        instructions, input_text = TOP_PAPERS_PROMPT.render(
+            project_summary=self.project_summary, topic=topic, top_k=TOP_K, papers=", ".join(papers)
+        )
+        try:
+            response = (
+                await self.gpt_agent.aquery(
+                    instructions,
+                    input_text,
+                    stage="select_papers",
+                    response_format=TOP_PAPERS_PROMPT.response_format,
+                )
+            ).strip()
+            response_data = json.loads(response)
+            return response_data.get("top_papers", [])
+        except Exception as e:
+            if isinstance(e, ValueError):
+                self.gpt_agent.parse_failed("select_papers")
+            print(f"Error assessing relevance for topic '{topic}': {e}")
+            return []
+
+    async def atournament(self, topic, papers):
+        """
+        Rank papers for topic without ever putting more than chunk_size of them in one prompt.
+        While there are too many candidates, they are split into chunks that are ranked in
+        parallel, and each chunk's top TOP_K advance to the next round; the final round ranks
+        the remaining winners against each other. Without a chunk_size this is one ranking call.
+        """
+        round_number = 1
+        while self.chunk_size is not None and len(papers) > self.chunk_size:
+            chunks = [papers[start:start + self.chunk_size] for start in range(0, len(papers), self.chunk_size)]
+            rankings = await asyncio.gather(*(self.arank_papers(topic, chunk) for chunk in chunks))
+            # Only a chunk's own candidates advance from it, each once and at most TOP_K of them.
+            # A full chunk has more than TOP_K candidates, so every round shrinks the field
+            winners = []
+            for chunk, ranking in zip(chunks, rankings):
+                members = set(chunk)
+                ranked = dict.fromkeys(paper for paper in ranking if isinstance(paper, str) and paper in members)
+                winners.extend(list(ranked)[:TOP_K])
+            winners = list(dict.fromkeys(winners))
+            print(
+                f"Topic '{topic}': Round {round_number} ranked {len(papers)} papers in {len(chunks)} chunks, "
+                f"{len(winners)} advance"
+            )
+            if not winners:
+                return []
+            if len(winners) >= len(papers):
+                # Cannot happen with chunk_size > TOP_K; rank what fits in one prompt rather than loop
+                winners = winners[:self.chunk_size]
+            papers = winners
+            round_number += 1
+        return await self.arank_papers(topic, papers)
+
     def explain_relevance(self, selected_papers):
         """
         Use agent to explain why each selected paper is relevant to the project.
@@ -63,12 +134,11 @@ class SeminalEvalAgent:
         for topic, papers in selected_papers.items():
             explanations[topic] = {}
             for paper in papers:
-                input_text = f"""
-                Explain why the paper titled '{paper}' is relevant to the topic '{topic}' in the context of this project.
-                Provide a concise explanation of its significance and how it contributes to the understanding or advancement of the topic.
-                """
+                instructions, input_text = EXPLAIN_PROMPT.render(
+                    project_summary=self.project_summary, topic=topic, paper=paper
+                )
                 try:
-                    response = self.gpt_agent.query("You are a helpful assistant.", input_text)
+                    response = self.gpt_agent.query(instructions, input_text, stage="explain_relevance")
                     explanations[topic][paper] = response.strip()
                 except Exception as e:
                     explanations[topic][paper] = f"Error generating explanation: {e}"
@@ -1,29 +1,61 @@
 import os
 import json
+import argparse
+import asyncio
+import subprocess
+import sys
 from pprint import pprint
-from concurrent.futures import ThreadPoolExecutor
+import networkx as nx
 from agents.general_agent import Agent
-from agents.seminal_eval_agent import SeminalEvalAgent
+from agents.seminal_eval_agent import TOP_K, SeminalEvalAgent
 from agents.concept_extraction_agent import ConceptExtractionAgent
+from utils.llm_cache import LLMCache
 from utils.tree_builder import build_tree_graph
 from utils.visualization import visualize
-from utils.survey_papers import query_survey_papers
-from utils.seminal_works import query_seminal_works
-from utils.prune_papers import prune_papers
-from utils.foundational_topics import find_foundational_topics_and_resources
-import sys
+from utils.survey_papers import aquery_survey_papers
+from utils.seminal_works import aquery_seminal_works
+from utils.prune_papers import aprune_papers
+from utils.foundational_topics import afind_foundational_topics_and_resources
+from utils.dataflow import arun_dataflow
+from utils.pipeline_config import PipelineConfig
+from utils.title_index import TitleIndex
+from utils.checkpoint import PIPELINE_STAGES, CheckpointStore, load_fresh_outputs, save_outputs, stage_version
+from utils.budget import missing_items
+from utils.metrics import Metrics
+from utils.work_queue import Worker, load_work_queue
 from dotenv import load_dotenv
 
 load_dotenv() 
 
+CONCEPT_FIELDS = (
+    "project_title",
+    "project_summary",
+    "core_concepts",
+    "specialized_concepts",
+    "fundamental_concepts",
+    "prerequisites",
+)
+
+# Stage labels of the pipeline's LLM calls, for per-stage model routing
+LLM_STAGES = (
+    "concept_extraction",
+    "survey_papers",
+    "seminal_works",
+    "select_papers",
+    "prune_papers",
+    "foundational_topics",
+    "foundational_resources",
+    "explain_relevance",
+)
+
 
-def extract_project_concepts(project, concept_agent):
+async def extract_project_concepts(project, concept_agent):
     """
     Extract project concepts using the concept extraction agent.
     """
     try:
         print("Extracting concepts from the project...")
-        response = concept_agent.extract_concepts(f"{project}.json")
+        response = await concept_agent.aextract_concepts(f"{project}.json")
         return (
             response["project_title"],
             response["project_summary"],
@@ -37,30 +69,42 @@ def extract_project_concepts(project, concept_agent):
         return None, None, None, None, None, None
 
 
-def main(project="robotics"):
-    # Setup
-    notebook_dir = os.path.dirname(os.path.abspath(__file__))
-    queries_folder = os.path.abspath(os.path.join(notebook_dir, "..", "queries"))
-    gpt_agent = Agent(api_key=os.getenv("OPENAI_API_KEY"))
-    concept_agent = ConceptExtractionAgent(gpt_agent, queries_folder=queries_folder)
+async def load_project_concepts(project, concept_agent, store=None):
+    """
+    Return the project's concepts as a dict, reusing the checkpoint while the project
+    description is unchanged. Returns None if the concepts could not be extracted.
+    """
+    fingerprint = None
+    if store is not None:
+        try:
+            description = concept_agent.read_description(f"{project}.json")
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}")
+            return None
+        fingerprint = store.fingerprint("concepts", stage_version("concepts"), {"description": description})
+        concepts = store.load("concepts", fingerprint)
+        if concepts is not None:
+            print("Checkpoint: reusing 'concepts'")
+            return concepts
 
-    # Step 1: Extract project concepts
-    project_title, project_summary, core_concepts, specialized_concepts, fundamental_concepts, prerequisites = extract_project_concepts(
-        project, concept_agent
-    )
-    if not project_title:
-        return
+    values = await extract_project_concepts(project, concept_agent)
+    if not values[0]:
+        return None
+    concepts = dict(zip(CONCEPT_FIELDS, values))
+    if store is not None:
+        store.save("concepts", fingerprint, concepts)
+    return concepts
 
-    # Step 2: Query survey papers
-    survey_papers = query_survey_papers(core_concepts, gpt_agent)
+
+def print_survey_papers(survey_papers):
     print("\nSurvey Papers:")
     for concept, papers in survey_papers.items():
         print(f"\nConcept: {concept}")
         for paper in papers.get("papers", []):
             print(f"- {paper['title']}")
 
-    # Step 3: Query seminal works
-    seminal_paper_counts_by_topic, top_references = query_seminal_works(survey_papers, gpt_agent)
+
+def print_seminal_counts(seminal_paper_counts_by_topic):
     print("\nSeminal Paper Counts by Topic:")
     for concept, counts in seminal_paper_counts_by_topic.items():
         print(f"\nConcept: {concept}")
@@ -68,17 +112,16 @@ def main(project="robotics"):
         for paper_title, count in sorted_counts:
             print(f"{paper_title}: {count}")
 
-    # Step 4: Select papers for evaluation
-    seminal_eval_agent = SeminalEvalAgent(seminal_paper_counts_by_topic, gpt_agent, project_summary)
-    selected_papers = seminal_eval_agent.select_papers()
+
+def print_selected_papers(selected_papers):
     print("\nSelected Papers for Evaluation:")
     for topic, papers in selected_papers.items():
         print(f"\nTopic: {topic}")
         for paper in papers:
             print(f"- {paper}")
 
-    # Step 5: Prune selected papers
-    pruned_selected_papers = prune_papers(specialized_concepts, selected_papers, gpt_agent, project_summary)
+
+def print_pruned_papers(pruned_selected_papers):
     pprint(pruned_selected_papers)
     print("\nPruned Selected Papers for Evaluation:")
     for topic, papers in pruned_selected_papers.items():
@@ -86,26 +129,693 @@ def main(project="robotics"):
         for paper in papers:
             print(f"- {paper}")
 
-    # Step 6: Find foundational topics and resources
-    final_foundational_topics = find_foundational_topics_and_resources(
-        pruned_selected_papers, fundamental_concepts, gpt_agent, core_concepts
-    )
+
+def print_foundational_topics(final_foundational_topics):
     print("\nFinal Foundational Topics and Recommended Resources:")
     for paper, topics in final_foundational_topics.items():
         print(f"\nPaper: {paper}")
         for topic in topics:
             print(f"- {topic['topic']}: {topic.get('resource', 'No resource available')}")
 
-    # Step 7: Build and visualize the tree graph
-    G = build_tree_graph(
-        project_title,
-        core_concepts,
+
+async def run_stages(
+    core_concepts,
+    specialized_concepts,
+    fundamental_concepts,
+    project_summary,
+    gpt_agent,
+    config,
+    resume=None,
+    events=None,
+):
+    """
+    Run steps 2-6 one stage at a time, printing each stage's results as it finishes.
+    Stages whose outputs are in resume (keyed by checkpoint stage name) are not recomputed.
+    events (a ProjectEvents) is told about each stage's results when the stage finishes.
+    """
+    resume = resume or {}
+
+    def finished(stage, output, selected=None):
+        if events is not None:
+            events.stage_finished(stage, output, selected)
+
+    # Step 2: Query survey papers
+    if "survey_papers" in resume:
+        survey_papers = resume["survey_papers"]
+    else:
+        survey_papers = await aquery_survey_papers(core_concepts, gpt_agent, config.budget("survey_papers"))
+    print_survey_papers(survey_papers)
+    finished("survey_papers", survey_papers)
+
+    # Step 3: Query seminal works
+    if "seminal_counts" in resume:
+        seminal_paper_counts_by_topic, top_references = resume["seminal_counts"]
+    else:
+        seminal_paper_counts_by_topic, top_references = await aquery_seminal_works(
+            survey_papers,
+            gpt_agent,
+            TitleIndex(threshold=config.title_similarity),
+            config.budget("seminal_counts"),
+            config.citations(),
+            config.expansion(gpt_agent, specialized_concepts, project_summary),
+            work_queue=config.work_queue_client(gpt_agent),
+        )
+    print_seminal_counts(seminal_paper_counts_by_topic)
+    finished("seminal_counts", seminal_paper_counts_by_topic)
+
+    # Step 4: Select papers for evaluation
+    if "selected" in resume:
+        selected_papers = resume["selected"]
+    else:
+        seminal_eval_agent = SeminalEvalAgent(
+            seminal_paper_counts_by_topic, gpt_agent, project_summary, config.select_chunk_size
+        )
+        selected_papers = await seminal_eval_agent.aselect_papers(config.budget("selected"))
+    print_selected_papers(selected_papers)
+    finished("selected", selected_papers)
+
+    # Step 5: Prune selected papers
+    if "pruned" in resume:
+        pruned_selected_papers = resume["pruned"]
+    else:
+        prefilter = config.prefilter(specialized_concepts, project_summary)
+        pruned_selected_papers = await aprune_papers(
+            specialized_concepts,
+            selected_papers,
+            gpt_agent,
+            project_summary,
+            config.prune_batch_size,
+            config.prune_cross_topic,
+            budget=config.budget("pruned"),
+            prefilter=prefilter,
+            work_queue=config.work_queue_client(gpt_agent),
+        )
+        if prefilter is not None:
+            print(f"Relevance prefilter: {prefilter.stats()}")
+    print_pruned_papers(pruned_selected_papers)
+    finished("pruned", pruned_selected_papers, selected_papers)
+
+    # Step 6: Find foundational topics and resources
+    if "foundational_topics" in resume:
+        final_foundational_topics = resume["foundational_topics"]
+    else:
+        final_foundational_topics = await afind_foundational_topics_and_resources(
+            pruned_selected_papers,
+            fundamental_concepts,
+            gpt_agent,
+            core_concepts,
+            config.foundational_single_pass,
+            budget=config.budget("foundational_topics"),
+            work_queue=config.work_queue_client(gpt_agent),
+        )
+    print_foundational_topics(final_foundational_topics)
+    finished("foundational_topics", final_foundational_topics)
+
+    return (
+        survey_papers,
+        seminal_paper_counts_by_topic,
+        top_references,
+        selected_papers,
         pruned_selected_papers,
         final_foundational_topics,
     )
-    visualize(G)
+
+
+async def run_project(
+    project,
+    gpt_agent,
+    queries_folder,
+    output_file="knowledge_graph.html",
+    scheduler="dataflow",
+    config=None,
+    graph_layout="precomputed",
+):
+    """
+    Run the full research pipeline for a single project on the current event loop.
+    """
+    config = config or PipelineConfig()
+    concept_agent = ConceptExtractionAgent(gpt_agent, queries_folder=queries_folder)
+    store = None
+    if config.checkpoint_dir:
+        store = CheckpointStore(
+            config.checkpoint_dir, project, gpt_agent.routing(), gpt_agent.temperature, gpt_agent.structured_output
+        )
+
+    # Step 1: Extract project concepts
+    concepts = await load_project_concepts(project, concept_agent, store)
+    if not concepts:
+        return
+    project_title = concepts["project_title"]
+    project_summary = concepts["project_summary"]
+    core_concepts = concepts["core_concepts"]
+    specialized_concepts = concepts["specialized_concepts"]
+    fundamental_concepts = concepts["fundamental_concepts"]
+    events = config.project_events(project, project_title, core_concepts)
+
+    # Reuse every stage whose checkpoint still matches its inputs
+    resume = load_fresh_outputs(store, concepts, config) if store is not None else {}
+
+    # Steps 2-6: either per-item dataflow or stage-by-stage with barriers
+    if scheduler == "dataflow" and "foundational_topics" not in resume:
+        (
+            survey_papers,
+            seminal_paper_counts_by_topic,
+            top_references,
+            selected_papers,
+            pruned_selected_papers,
+            final_foundational_topics,
+        ) = await arun_dataflow(
+            core_concepts,
+            specialized_concepts,
+            fundamental_concepts,
+            project_summary,
+            gpt_agent,
+            config,
+            resume,
+            events,
+        )
+        print_survey_papers(survey_papers)
+        print_seminal_counts(seminal_paper_counts_by_topic)
+        print_selected_papers(selected_papers)
+        print_pruned_papers(pruned_selected_papers)
+        print_foundational_topics(final_foundational_topics)
+    else:
+        (
+            survey_papers,
+            seminal_paper_counts_by_topic,
+            top_references,
+            selected_papers,
+            pruned_selected_papers,
+            final_foundational_topics,
+        ) = await run_stages(
+            core_concepts,
+            specialized_concepts,
+            fundamental_concepts,
+            project_summary,
+            gpt_agent,
+            config,
+            resume,
+            events,
+        )
+
+    # Step 7: Build and visualize the tree graph
+    if "graph" in resume:
+        G = nx.node_link_graph(resume["graph"])
+    else:
+        G = build_tree_graph(
+            project_title,
+            core_concepts,
+            pruned_selected_papers,
+            final_foundational_topics,
+        )
+
+    # Stages cut short by their time budget or by failed requests are reported and not checkpointed,
+    # nor is anything after them
+    partial = []
+    for stage, output in (
+        ("survey_papers", survey_papers),
+        ("seminal_counts", seminal_paper_counts_by_topic),
+        ("selected", selected_papers),
+        ("pruned", pruned_selected_papers),
+        ("foundational_topics", final_foundational_topics),
+    ):
+        if missing_items(output):
+            partial.append(stage)
+            print(f"\nStage '{stage}' is incomplete (out of time or failed); missing: {missing_items(output)}")
+
+    if store is not None:
+        outputs = {
+            "survey_papers": survey_papers,
+            "seminal_counts": [seminal_paper_counts_by_topic, top_references],
+            "selected": selected_papers,
+            "pruned": pruned_selected_papers,
+            "foundational_topics": final_foundational_topics,
+            "graph": nx.node_link_data(G),
+        }
+        skip = set(resume)
+        if partial:
+            skip.update(PIPELINE_STAGES[PIPELINE_STAGES.index(partial[0]):])
+        save_outputs(store, concepts, outputs, config, skip=skip)
+    if config.graphs() is not None and not partial:
+        print(f"Graph store: upserted '{project}': {config.graphs().upsert(project, G)}")
+    visualize(G, output_file, graph_layout)
+    if events is not None:
+        events.emit(
+            "graph_written", output_file=output_file, nodes=G.number_of_nodes(), edges=G.number_of_edges()
+        )
+
+
+def main(
+    project="robotics",
+    use_cache=True,
+    refresh_cache=False,
+    max_concurrency=32,
+    scheduler="dataflow",
+    config=None,
+    metrics_path=None,
+    trace_path=None,
+    requests_per_minute=None,
+    tokens_per_minute=None,
+    max_retries=6,
+    call_deadline=None,
+    hedge_percentile=None,
+    structured_output=False,
+    graph_layout="precomputed",
+    model="gpt-4o",
+    stage_models=None,
+    cascade=None,
+    cascade_threshold=0.8,
+    worker=False,
+    workers=0,
+    worker_idle_exit=None,
+):
+    if (worker or workers) and (config is None or config.work_queue is None):
+        raise ValueError("worker and workers need a config with a work_queue")
+
+    # Setup
+    notebook_dir = os.path.dirname(os.path.abspath(__file__))
+    queries_folder = os.path.abspath(os.path.join(notebook_dir, "..", "queries"))
+    cache = None
+    if use_cache:
+        cache_path = os.getenv(
+            "RESEARCHRAMP_CACHE_PATH", os.path.join(notebook_dir, "..", ".cache", "llm_cache.sqlite")
+        )
+        cache = LLMCache(cache_path)
+    metrics = Metrics() if metrics_path or trace_path else None
+    if workers:
+        # The account's rate limits are split evenly between this process and its local workers; a
+        # share never rounds down to 0, which would turn the limit off
+        if requests_per_minute:
+            requests_per_minute = max(1, requests_per_minute // (workers + 1))
+        if tokens_per_minute:
+            tokens_per_minute = max(1, tokens_per_minute // (workers + 1))
+    gpt_agent = Agent(
+        model=model,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        cache=cache,
+        refresh_cache=refresh_cache,
+        max_concurrency=max_concurrency,
+        metrics=metrics,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_retries=max_retries,
+        call_deadline=call_deadline,
+        hedge_percentile=hedge_percentile,
+        structured_output=structured_output,
+        stage_models=stage_models,
+        cascade=cascade,
+        cascade_threshold=cascade_threshold,
+    )
+
+    # Several projects share one event loop, connection pool and rate controller, and one event stream
+    if config is not None:
+        config.events()
+    projects = [project] if isinstance(project, str) else list(project)
+
+    async def run_all():
+        await asyncio.gather(
+            *(
+                run_project(
+                    name,
+                    gpt_agent,
+                    queries_folder,
+                    "knowledge_graph.html" if len(projects) == 1 else f"knowledge_graph_{name}.html",
+                    scheduler,
+                    config,
+                    graph_layout,
+                )
+                for name in projects
+            )
+        )
+
+    if worker:
+        queue_worker = Worker(
+            load_work_queue(config.work_queue), gpt_agent, concurrency=max_concurrency, idle_exit=worker_idle_exit
+        )
+        print(f"Worker {queue_worker.name} leasing tasks from {config.work_queue}")
+        gpt_agent.run(queue_worker.arun())
+        print(f"Worker {queue_worker.name}: {queue_worker.stats()}")
+    else:
+        command = worker_command(
+            config.work_queue if config is not None else None,
+            model,
+            stage_models,
+            cascade,
+            cascade_threshold,
+            use_cache,
+            refresh_cache,
+            max_concurrency,
+            requests_per_minute,
+            tokens_per_minute,
+            max_retries,
+            call_deadline,
+            hedge_percentile,
+            structured_output,
+        )
+        local_workers = [subprocess.Popen(command, stdout=subprocess.DEVNULL) for _ in range(workers)]
+        try:
+            gpt_agent.run(run_all())
+        finally:
+            for process in local_workers:
+                process.terminate()
+            for process in local_workers:
+                process.wait()
+        if config is not None and config.work_queue is not None:
+            print(f"Work queue: {load_work_queue(config.work_queue).stats()}")
+    if config is not None and config.events() is not None:
+        config.events().close()
+        if config.events_path:
+            print(f"Events written to {config.events_path}")
+
+    if cache is not None:
+        print(f"\nLLM cache: {cache.stats()}")
+    if config is not None and config.citations() is not None:
+        print(f"Citation index: {config.citations().stats()}")
+    if config is not None and config.graphs() is not None:
+        print(f"Graph store: {config.graphs().stats()}")
+    print(f"HTTP connections: {gpt_agent.connection_stats.snapshot()}")
+    print(f"Rate control: {gpt_agent.rate_control.limiter.snapshot()}")
+    if gpt_agent.retries:
+        print(f"Retried calls, by stage: {dict(gpt_agent.retries)}")
+    if gpt_agent.hedged:
+        print(
+            f"Hedged calls, by stage: {dict(gpt_agent.hedged)}; hedge finished first: {dict(gpt_agent.hedge_wins)}"
+        )
+    if gpt_agent.singleflight_saved:
+        print(f"Calls saved by single-flight, by stage: {dict(gpt_agent.singleflight_saved)}")
+    for stage, stats in gpt_agent.cascade_report().items():
+        saved = "n/a" if stats["latency_saved"] is None else f"{stats['latency_saved']:.1f}s"
+        print(
+            f"Cascade {stage}: {stats['answered']} answered by {gpt_agent.cascade[stage]}, "
+            f"{stats['escalated']} escalated to {gpt_agent.model_for(stage)} ({stats['escalation_rate']:.0%}), "
+            f"call latency saved {saved}"
+        )
+    gpt_agent.close()
+
+    if metrics is not None:
+        metrics.print_summary()
+        if metrics_path:
+            metrics.write_json(metrics_path)
+            print(f"Metrics report written to {metrics_path}")
+        if trace_path:
+            metrics.write_trace(trace_path)
+            print(f"Chrome trace written to {trace_path} (open in chrome://tracing or ui.perfetto.dev)")
+
+
+def worker_command(
+    work_queue,
+    model,
+    stage_models,
+    cascade,
+    cascade_threshold,
+    use_cache,
+    refresh_cache,
+    max_concurrency,
+    requests_per_minute,
+    tokens_per_minute,
+    max_retries,
+    call_deadline,
+    hedge_percentile,
+    structured_output,
+):
+    """
+    Command line of a local worker process leasing from work_queue with the same agent settings.
+    """
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--worker",
+        "--work-queue",
+        work_queue,
+        "--model",
+        model,
+        "--max-concurrency",
+        str(max_concurrency),
+        "--max-retries",
+        str(max_retries),
+        "--cascade-threshold",
+        str(cascade_threshold),
+    ]
+    for option, routes in (("--stage-model", stage_models), ("--cascade", cascade)):
+        for stage, stage_model in (routes or {}).items():
+            command += [option, f"{stage}={stage_model}"]
+    for option, value in (
+        ("--rpm", requests_per_minute),
+        ("--tpm", tokens_per_minute),
+        ("--call-deadline", call_deadline),
+        ("--hedge-percentile", hedge_percentile),
+    ):
+        if value is not None:
+            command += [option, str(value)]
+    if not use_cache:
+        command.append("--no-cache")
+    if refresh_cache:
+        command.append("--refresh-cache")
+    if structured_output:
+        command.append("--structured-output")
+    return command
 
 
 if __name__ == "__main__":
-    project = sys.argv[1] if len(sys.argv) > 1 else "robotics"
-    main(project)
+    parser = argparse.ArgumentParser(description="Build a research knowledge graph for one or more projects.")
+    parser.add_argument("projects", nargs="*", default=["robotics"], help="Project file names in /queries")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk LLM response cache")
+    parser.add_argument(
+        "--refresh-cache", action="store_true", help="Ignore cached responses and overwrite them with fresh ones"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=32,
+        help="Upper bound on in-flight LLM calls across all stages; the actual limit adapts to 429s and latency",
+    )
+    parser.add_argument("--rpm", type=int, help="Requests-per-minute limit of the OpenAI account")
+    parser.add_argument("--tpm", type=int, help="Tokens-per-minute limit of the OpenAI account")
+    parser.add_argument(
+        "--max-retries", type=int, default=6, help="Retries for rate-limited or failed LLM calls before giving up"
+    )
+    parser.add_argument(
+        "--scheduler",
+        choices=["dataflow", "staged"],
+        default="dataflow",
+        help="Run steps 2-6 as a per-item dataflow or as stage-wide barriers",
+    )
+    parser.add_argument(
+        "--citation-index",
+        metavar="DIR",
+        help="Offline Semantic Scholar citation index to answer seminal-works queries before asking the LLM",
+    )
+    parser.add_argument(
+        "--select-chunk-size",
+        type=int,
+        help="Most candidate titles per select_papers prompt; longer lists are ranked as a tournament of chunks",
+    )
+    parser.add_argument(
+        "--expansion-depth",
+        type=int,
+        default=1,
+        help="Citation hops followed from the survey papers; above 1, references of references are expanded",
+    )
+    parser.add_argument(
+        "--expansion-max-nodes", type=int, default=30, help="Most references expanded per concept"
+    )
+    parser.add_argument(
+        "--expansion-max-calls", type=int, help="Most LLM calls the expansion makes per concept (default: no cap)"
+    )
+    parser.add_argument(
+        "--expansion-width", type=int, default=8, help="References expanded in parallel per concept"
+    )
+    parser.add_argument(
+        "--prune-batch-size",
+        type=int,
+        default=1,
+        help="Papers judged per prune request; 1 sends one request per paper",
+    )
+    parser.add_argument(
+        "--prefilter-low",
+        type=float,
+        help="Reject papers whose local relevance score is below this without asking the LLM",
+    )
+    parser.add_argument(
+        "--prefilter-high",
+        type=float,
+        help="Accept papers whose local relevance score is at least this without asking the LLM",
+    )
+    parser.add_argument(
+        "--prune-cross-topic",
+        action="store_true",
+        help="Judge a paper listed under several topics in one request (staged scheduler)",
+    )
+    parser.add_argument(
+        "--foundational-single-pass",
+        action="store_true",
+        help="Ask for foundational topics and resources in one request per paper",
+    )
+    parser.add_argument(
+        "--title-similarity",
+        type=float,
+        default=0.8,
+        help="Similarity above which near-duplicate reference titles are merged before counting",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".checkpoints"),
+        help="Directory for per-project stage checkpoints",
+    )
+    parser.add_argument(
+        "--no-checkpoint", action="store_true", help="Recompute every stage and do not write checkpoints"
+    )
+    parser.add_argument(
+        "--structured-output",
+        action="store_true",
+        help="Constrain every JSON response to its schema with the API's structured outputs",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream survey lists and start each paper's seminal-works query as it arrives (dataflow scheduler)",
+    )
+    parser.add_argument(
+        "--call-deadline", type=float, help="Seconds an LLM call attempt may take before it is retried"
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        help="Send a duplicate request when a call outlasts this latency percentile of its stage (e.g. 0.95)",
+    )
+    parser.add_argument(
+        "--stage-budget",
+        action="append",
+        default=[],
+        metavar="STAGE=SECONDS",
+        help=f"Time budget for a stage ({', '.join(PIPELINE_STAGES[:-1])}); may be repeated",
+    )
+    parser.add_argument(
+        "--graph-store",
+        metavar="PATH",
+        help="SQLite knowledge graph shared across projects and runs; each project's graph is upserted into it",
+    )
+    parser.add_argument(
+        "--graph-layout",
+        choices=["precomputed", "physics"],
+        default="precomputed",
+        help="Lay the graph out in Python with physics off, or simulate it in the browser with pyvis",
+    )
+    parser.add_argument("--model", default="gpt-4o", help="Model answering every stage without its own --stage-model")
+    parser.add_argument(
+        "--stage-model",
+        action="append",
+        default=[],
+        metavar="STAGE=MODEL",
+        help=f"Model for one LLM stage ({', '.join(LLM_STAGES)}); may be repeated",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="append",
+        default=[],
+        metavar="STAGE=MODEL",
+        help="Answer a stage with this cheaper model first and escalate low-confidence answers; may be repeated",
+    )
+    parser.add_argument(
+        "--cascade-threshold",
+        type=float,
+        default=0.8,
+        help="Mean token probability below which a cascaded answer is escalated",
+    )
+    parser.add_argument(
+        "--events", metavar="PATH", help="Append each partial result to this JSON-lines log as soon as it is known"
+    )
+    parser.add_argument(
+        "--events-port",
+        type=int,
+        help="Serve a live-updating graph page and its server-sent event stream on this local port (0: any free port)",
+    )
+    parser.add_argument(
+        "--work-queue",
+        metavar="PATH",
+        help="Durable SQLite work queue; seminal-works, pruning and foundational-topic units run on its workers",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Local worker processes to start on --work-queue for this run"
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Run as a worker: lease and run tasks from --work-queue instead of running projects",
+    )
+    parser.add_argument(
+        "--worker-idle-exit", type=float, help="Seconds without tasks after which a --worker exits (default: never)"
+    )
+    parser.add_argument("--metrics", metavar="PATH", help="Write a per-stage metrics report as JSON")
+    parser.add_argument("--trace", metavar="PATH", help="Write a Chrome trace / Perfetto timeline of LLM calls")
+    args = parser.parse_args()
+    stage_budgets = {}
+    for budget in args.stage_budget:
+        stage, _, seconds = budget.partition("=")
+        if stage not in PIPELINE_STAGES[:-1] or not seconds:
+            parser.error(f"--stage-budget expects STAGE=SECONDS with STAGE one of {PIPELINE_STAGES[:-1]}")
+        stage_budgets[stage] = float(seconds)
+    routes = {}
+    for option, values in (("--stage-model", args.stage_model), ("--cascade", args.cascade)):
+        routes[option] = {}
+        for value in values:
+            stage, _, model = value.partition("=")
+            if stage not in LLM_STAGES or not model:
+                parser.error(f"{option} expects STAGE=MODEL with STAGE one of {list(LLM_STAGES)}")
+            routes[option][stage] = model
+    if not 0.0 <= args.cascade_threshold <= 1.0:
+        parser.error("--cascade-threshold must be between 0 and 1")
+    if args.expansion_depth < 1 or args.expansion_max_nodes < 0 or args.expansion_width < 1:
+        parser.error("--expansion-depth and --expansion-width must be at least 1, --expansion-max-nodes at least 0")
+    if (args.worker or args.workers) and not args.work_queue:
+        parser.error("--worker and --workers need a --work-queue")
+    if args.workers < 0:
+        parser.error("--workers must not be negative")
+    if args.select_chunk_size is not None and args.select_chunk_size <= TOP_K:
+        parser.error(f"--select-chunk-size must be larger than {TOP_K}")
+    if args.prefilter_low is not None and args.prefilter_high is not None and args.prefilter_low > args.prefilter_high:
+        parser.error("--prefilter-low must not exceed --prefilter-high")
+    main(
+        args.projects,
+        use_cache=not args.no_cache,
+        refresh_cache=args.refresh_cache,
+        max_concurrency=args.max_concurrency,
+        scheduler=args.scheduler,
+        config=PipelineConfig(
+            select_chunk_size=args.select_chunk_size,
+            prune_batch_size=args.prune_batch_size,
+            prune_cross_topic=args.prune_cross_topic,
+            prefilter_low=args.prefilter_low,
+            prefilter_high=args.prefilter_high,
+            foundational_single_pass=args.foundational_single_pass,
+            title_similarity=args.title_similarity,
+            checkpoint_dir=None if args.no_checkpoint else args.checkpoint_dir,
+            stage_budgets=stage_budgets,
+            stream=args.stream,
+            citation_index=args.citation_index,
+            graph_store=args.graph_store,
+            expansion_depth=args.expansion_depth,
+            expansion_max_nodes=args.expansion_max_nodes,
+            expansion_max_calls=args.expansion_max_calls,
+            expansion_width=args.expansion_width,
+            events_path=args.events,
+            events_port=args.events_port,
+            work_queue=args.work_queue,
+        ),
+        metrics_path=args.metrics,
+        trace_path=args.trace,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.max_retries,
+        call_deadline=args.call_deadline,
+        hedge_percentile=args.hedge_percentile,
+        structured_output=args.structured_output,
+        graph_layout=args.graph_layout,
+        model=args.model,
+        stage_models=routes["--stage-model"],
+        cascade=routes["--cascade"],
+        cascade_threshold=args.cascade_threshold,
+        worker=args.worker,
+        workers=args.workers,
+        worker_idle_exit=args.worker_idle_exit,
+    )
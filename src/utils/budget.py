@@ -0,0 +1,56 @@
+import asyncio
+
+
+class PartialResult(dict):
+    """
+    Stage output that may be incomplete: the items that finished, plus missing, the items that
+    did not finish within the stage's time budget or whose requests failed. Behaves as a plain
+    dict everywhere else.
+    """
+
+    def __init__(self, *args, missing=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.missing = list(missing)
+
+
+def missing_items(output):
+    """
+    Items a stage output is missing because its budget ran out or their requests failed; empty
+    for complete outputs.
+    """
+    return getattr(output, "missing", [])
+
+
+async def gather_within(budget, awaitables, fail_soft=False):
+    """
+    Await a dict of key -> awaitable, giving up on whatever has not finished after budget seconds.
+    Unfinished work is cancelled. Returns (results, missing): results maps the finished keys to
+    their results in input order, missing lists the keys that ran out of time. With no budget this
+    is asyncio.gather. An exception raised by any awaitable propagates, as with gather, unless
+    fail_soft is set: then it is printed and its key is listed in missing as well.
+    """
+    tasks = {key: asyncio.ensure_future(awaitable) for key, awaitable in awaitables.items()}
+    if budget is None:
+        await asyncio.gather(*tasks.values(), return_exceptions=fail_soft)
+        done = set(tasks.values())
+    elif not tasks:
+        return {}, []
+    else:
+        done, pending = await asyncio.wait(tasks.values(), timeout=max(budget, 0))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    missing = []
+    for key, task in tasks.items():
+        if task not in done:
+            missing.append(key)
+        elif task.exception() is not None:
+            if not fail_soft:
+                raise task.exception()
+            print(f"Request for {key!r} failed: {task.exception()!r}")
+            missing.append(key)
+        else:
+            results[key] = task.result()
+    return results, missing
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+
+# Stages after concept extraction, in pipeline order
+PIPELINE_STAGES = ["survey_papers", "seminal_counts", "selected", "pruned", "foundational_topics", "graph"]
+
+
+class CheckpointStore:
+    """
+    Per-project directory of stage outputs. Each checkpoint carries a fingerprint of everything
+    that determines the stage's output: its inputs, prompt version, stage settings, the model and
+    whether answers were asked for as structured output.
+    A checkpoint is only reused when the fingerprint matches, so a change anywhere recomputes that
+    stage and, through the changed inputs, everything downstream of it.
+    """
+
+    def __init__(self, root, project, model, temperature=0.0, structured_output=False):
+        self.directory = os.path.join(root, project)
+        self.model = model
+        self.temperature = temperature
+        self.structured_output = structured_output
+        os.makedirs(self.directory, exist_ok=True)
+
+    def fingerprint(self, stage, version, inputs):
+        payload = json.dumps(
+            {
+                "stage": stage,
+                "version": version,
+                "model": self.model,
+                "temperature": self.temperature,
+                "structured_output": self.structured_output,
+                "inputs": inputs,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, stage):
+        return os.path.join(self.directory, f"{stage}.json")
+
+    def load(self, stage, fingerprint):
+        """
+        Return the stored output for stage if its fingerprint matches, otherwise None.
+        """
+        try:
+            with open(self._path(stage), "r") as file:
+                checkpoint = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if checkpoint.get("fingerprint") != fingerprint:
+            return None
+        return checkpoint["data"]
+
+    def save(self, stage, fingerprint, data):
+        """
+        Atomically write a stage's output with its fingerprint.
+        """
+        path = self._path(stage)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"fingerprint": fingerprint, "data": data}, file, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+def stage_version(stage):
+    """
+    Version of the code that produces a stage: the versions of the prompt templates it sends,
+    or the graph builder's version for the graph.
+    """
+    # Imported here so the checkpoint module does not pull in every stage at import time
+    from utils import prompts, tree_builder
+
+    if stage == "graph":
+        return tree_builder.GRAPH_VERSION
+    return prompts.stage_version(stage)
+
+
+def stage_inputs(stage, concepts, outputs, config):
+    """
+    Everything a stage's output depends on, given the extracted concepts and upstream outputs.
+    """
+    if stage == "survey_papers":
+        return {"core_concepts": concepts["core_concepts"]}
+    if stage == "seminal_counts":
+        from utils.seminal_works import COUNT_VERSION
+
+        citation_index = config.citations()
+        return {
+            "survey_papers": outputs["survey_papers"],
+            "count_version": COUNT_VERSION,
+            "title_similarity": config.title_similarity,
+            "citation_index": citation_index.build_id if citation_index is not None else None,
+            # Expansion ranks references by relevance to the specialized concepts and project summary
+            "expansion": (
+                {
+                    "depth": config.expansion_depth,
+                    "max_nodes": config.expansion_max_nodes,
+                    "max_calls": config.expansion_max_calls,
+                    "width": config.expansion_width,
+                    "specialized_concepts": concepts["specialized_concepts"],
+                    "project_summary": concepts["project_summary"],
+                }
+                if config.expansion_depth > 1
+                else None
+            ),
+        }
+    if stage == "selected":
+        return {
+            "seminal_counts": outputs["seminal_counts"][0],
+            "project_summary": concepts["project_summary"],
+            "chunk_size": config.select_chunk_size,
+        }
+    if stage == "pruned":
+        return {
+            "selected": outputs["selected"],
+            "specialized_concepts": concepts["specialized_concepts"],
+            "project_summary": concepts["project_summary"],
+            "batch_size": config.prune_batch_size,
+            "cross_topic": config.prune_cross_topic,
+            "prefilter": [config.prefilter_low, config.prefilter_high],
+        }
+    if stage == "foundational_topics":
+        return {
+            "pruned": outputs["pruned"],
+            "fundamental_concepts": concepts["fundamental_concepts"],
+            "core_concepts": concepts["core_concepts"],
+            "single_pass": config.foundational_single_pass,
+        }
+    if stage == "graph":
+        return {
+            "project_title": concepts["project_title"],
+            "core_concepts": concepts["core_concepts"],
+            "pruned": outputs["pruned"],
+            "foundational_topics": outputs["foundational_topics"],
+        }
+    raise ValueError(f"Unknown stage '{stage}'.")
+
+
+def load_fresh_outputs(store, concepts, config):
+    """
+    Walk the stages in order and return the outputs of the longest prefix with fresh checkpoints.
+    """
+    outputs = {}
+    for stage in PIPELINE_STAGES:
+        fingerprint = store.fingerprint(stage, stage_version(stage), stage_inputs(stage, concepts, outputs, config))
+        data = store.load(stage, fingerprint)
+        if data is None:
+            break
+        outputs[stage] = data
+        print(f"Checkpoint: reusing '{stage}'")
+    return outputs
+
+
+def save_outputs(store, concepts, outputs, config, skip=()):
+    """
+    Write a checkpoint for every stage in outputs except those listed in skip.
+    """
+    for stage in PIPELINE_STAGES:
+        if stage not in outputs or stage in skip:
+            continue
+        fingerprint = store.fingerprint(stage, stage_version(stage), stage_inputs(stage, concepts, outputs, config))
+        store.save(stage, fingerprint, outputs[stage])
@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+
+from utils.budget import gather_within
+from utils.seminal_works import afind_seminal_works
+from utils.title_index import TitleIndex, normalize_title
+
+
+async def aexpand_citations(
+    concept,
+    results,
+    gpt_agent,
+    citation_index=None,
+    scorer=None,
+    max_depth=2,
+    max_nodes=30,
+    max_calls=None,
+    width=8,
+    budget=None,
+    work_queue=None,
+):
+    """
+    Follow the references of references for one concept, most promising titles first.
+
+    results are the concept's one-hop (concept, title, references) seminal-works results; their
+    references are depth 1. Every reference not yet expanded waits in a priority frontier ranked
+    by how often the expanded papers cite it, plus its relevance to the concept from scorer (a
+    RelevancePrefilter) when given. Expansion runs in waves: the width best titles are expanded
+    in parallel, their references join the frontier, and the next wave is picked. Titles are
+    deduplicated through a TitleIndex, so near-duplicate spellings are expanded once.
+
+    Hard limits: references at max_depth are counted but not expanded, at most max_nodes titles
+    are expanded, at most max_calls of them through the LLM (titles the citation_index answers do
+    not count), and no wave starts after budget seconds; a wave still running then is abandoned.
+    A title whose request fails is left out of expanded and counted as failed.
+    Waves are picked only from finished results, so without a budget the outcome does not depend
+    on timing and both schedulers expand the same titles. With a work_queue (a WorkQueueClient),
+    LLM expansions run as queued tasks on workers.
+
+    Returns (expanded, stats): expanded lists (concept, title, references) results in the shape
+    of afind_seminal_works, to be counted together with results.
+    """
+    find = work_queue.afind_seminal_works if work_queue is not None else afind_seminal_works
+    titles = TitleIndex()
+    visited = set()
+    cited = Counter()
+    relevance = {}
+    depth = {}
+    display = {}
+    frontier = []
+    order = itertools.count()
+
+    def key_of(title, year=None):
+        return normalize_title(titles.canonical(title, year))
+
+    def priority(key):
+        return cited[key] + relevance.get(key, 0.0)
+
+    def add_references(references, level):
+        touched = []
+        for reference in references:
+            title = reference.get("title") if isinstance(reference, dict) else None
+            key = key_of(title, reference.get("year")) if title else ""
+            if not key or key in visited:
+                continue
+            cited[key] += 1
+            if key not in depth:
+                depth[key] = level
+                display[key] = title
+            if depth[key] < max_depth and key not in touched:
+                touched.append(key)
+        new = [key for key in touched if key not in relevance]
+        if scorer is not None and new:
+            scores = scorer.scores(concept, [display[key] for key in new])
+            relevance.update((key, float(score)) for key, score in zip(new, scores))
+        # Entries whose priority has changed since they were pushed are skipped when popped
+        for key in touched:
+            heapq.heappush(frontier, (-priority(key), next(order), key))
+
+    for _, title, _ in results:
+        visited.add(key_of(title))
+    for _, _, references in results:
+        add_references(references, 1)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget if budget is not None else None
+    expanded = []
+    expanded_depths = []
+    calls = 0
+    skipped = 0
+    failed = 0
+    out_of_time = False
+    while frontier and len(expanded) < max_nodes and not out_of_time:
+        wave = {}
+        while frontier and len(wave) < width and len(expanded) + len(wave) < max_nodes:
+            negative, _, key = heapq.heappop(frontier)
+            if key in visited or -negative != priority(key):
+                continue
+            visited.add(key)
+            references = citation_index.seminal_works(display[key]) if citation_index is not None else None
+            if references is not None:
+                wave[key] = _answered(concept, display[key], references)
+            elif max_calls is not None and calls >= max_calls:
+                skipped += 1
+            else:
+                calls += 1
+                wave[key] = find(concept, {"title": display[key]}, gpt_agent)
+        if not wave:
+            break
+
+        finished, late = await gather_within(
+            deadline - loop.time() if deadline is not None else None, wave, fail_soft=True
+        )
+        # A wave that ended before the deadline left nothing unfinished; its missing keys failed
+        out_of_time = bool(late) and deadline is not None and loop.time() >= deadline
+        if not out_of_time:
+            failed += len(late)
+        for key, (_, title, references) in finished.items():
+            expanded.append((concept, title, references))
+            expanded_depths.append(depth[key])
+            add_references(references, depth[key] + 1)
+
+    stats = {
+        "expanded": len(expanded),
+        "llm_calls": calls,
+        "skipped_over_call_limit": skipped,
+        "failed": failed,
+        "frontier": len({key for _, _, key in frontier if key not in visited}),
+        "deepest": max(expanded_depths, default=0),
+        "out_of_time": out_of_time,
+    }
+    return expanded, stats
+
+
+async def _answered(concept, title, references):
+    return concept, title, references
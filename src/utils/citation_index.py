@@ -0,0 +1,261 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from utils.title_index import normalize_title
+
+FORMAT_VERSION = 1
+
+# Column files of an index directory and their array typecodes. Rows are papers ordered by
+# corpus id; references are stored CSR-style, ref_offsets[row]:ref_offsets[row + 1] slicing refs
+_COLUMNS = {
+    "corpus_ids": "q",
+    "years": "h",
+    "citation_counts": "i",
+    "title_offsets": "q",
+    "ref_offsets": "q",
+    "refs": "i",
+    "title_hashes": "Q",
+    "title_rows": "i",
+}
+
+
+def title_hash(title):
+    """
+    64-bit hash of a title's normalized form, the key of the title lookup table.
+    """
+    digest = hashlib.blake2b(normalize_title(title).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _read_jsonl(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def build_citation_index(paper_paths, citation_paths, output):
+    """
+    Build an index directory from Semantic Scholar dataset dump files.
+
+    paper_paths are JSONL files (optionally gzipped) from the "papers" dataset, with corpusid,
+    title, year and citationcount; citation_paths are JSONL files from the "citations" dataset,
+    with citingcorpusid and citedcorpusid. Citations to papers outside the dump are dropped.
+    Papers without a citationcount are ranked by the citations found in the dump.
+    Returns the index metadata.
+    """
+    papers = {}
+    for record in _read_jsonl(paper_paths):
+        corpus_id = record.get("corpusid")
+        if corpus_id is not None:
+            papers[int(corpus_id)] = record
+    corpus_ids = sorted(papers)
+    row_of = {corpus_id: row for row, corpus_id in enumerate(corpus_ids)}
+
+    edges = set()
+    for record in _read_jsonl(citation_paths):
+        citing = row_of.get(record.get("citingcorpusid"))
+        cited = row_of.get(record.get("citedcorpusid"))
+        if citing is not None and cited is not None and citing != cited:
+            edges.add((citing, cited))
+
+    cited_in_dump = [0] * len(corpus_ids)
+    for _, cited in edges:
+        cited_in_dump[cited] += 1
+    citation_counts = array("i")
+    years = array("h")
+    titles = bytearray()
+    title_offsets = array("q", [0])
+    for row, corpus_id in enumerate(corpus_ids):
+        record = papers[corpus_id]
+        count = record.get("citationcount")
+        citation_counts.append(int(count) if count is not None else cited_in_dump[row])
+        years.append(int(record.get("year") or 0))
+        titles += (record.get("title") or "").encode("utf-8")
+        title_offsets.append(len(titles))
+
+    # Each paper's references, most cited first, so a lookup only reads the head of its slice
+    refs = array("i")
+    ref_offsets = array("q", [0])
+    ordered = sorted(edges, key=lambda edge: (edge[0], -citation_counts[edge[1]], edge[1]))
+    position = 0
+    for row in range(len(corpus_ids)):
+        while position < len(ordered) and ordered[position][0] == row:
+            refs.append(ordered[position][1])
+            position += 1
+        ref_offsets.append(len(refs))
+
+    keyed = sorted(
+        (title_hash(papers[corpus_id]["title"]), row)
+        for row, corpus_id in enumerate(corpus_ids)
+        if papers[corpus_id].get("title")
+    )
+    columns = {
+        "corpus_ids": array("q", corpus_ids),
+        "years": years,
+        "citation_counts": citation_counts,
+        "title_offsets": title_offsets,
+        "ref_offsets": ref_offsets,
+        "refs": refs,
+        "title_hashes": array("Q", (key for key, _ in keyed)),
+        "title_rows": array("i", (row for _, row in keyed)),
+    }
+
+    os.makedirs(output, exist_ok=True)
+    digest = hashlib.sha256()
+    for name, column in columns.items():
+        data = column.tobytes()
+        digest.update(data)
+        with open(os.path.join(output, f"{name}.bin"), "wb") as file:
+            file.write(data)
+    digest.update(titles)
+    with open(os.path.join(output, "titles.bin"), "wb") as file:
+        file.write(titles)
+
+    # Written last: an index directory without meta.json is an unfinished build
+    meta = {
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "papers": len(corpus_ids),
+        "references": len(refs),
+        "build_id": digest.hexdigest()[:16],
+    }
+    with open(os.path.join(output, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+    return meta
+
+
+class CitationIndex:
+    """
+    Read-only, memory-mapped citation graph built by build_citation_index.
+
+    Every column is mapped straight from disk, so opening an index costs nothing up front and
+    only the pages a lookup touches are read. A title is found by binary search over the
+    sorted hashes of normalized titles, then confirmed against the stored title.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            self.meta = json.load(file)
+        if self.meta.get("format") != FORMAT_VERSION or self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Citation index at {directory} was built by an incompatible version; rebuild it.")
+        self.build_id = self.meta["build_id"]
+        self.hits = 0
+        self.misses = 0
+        self._maps = []
+        for name, typecode in _COLUMNS.items():
+            setattr(self, f"_{name}", self._map(f"{name}.bin").cast(typecode))
+        self._titles = self._map("titles.bin")
+
+    def _map(self, filename):
+        with open(os.path.join(self.directory, filename), "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return memoryview(b"")
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)
+
+    def __len__(self):
+        return len(self._corpus_ids)
+
+    def find(self, title):
+        """
+        Row of the paper whose normalized title matches title, or None.
+        """
+        key = title_hash(title)
+        normalized = normalize_title(title)
+        position = bisect_left(self._title_hashes, key)
+        while position < len(self._title_hashes) and self._title_hashes[position] == key:
+            row = self._title_rows[position]
+            if normalize_title(self.title(row)) == normalized:
+                return row
+            position += 1
+        return None
+
+    def title(self, row):
+        return bytes(self._titles[self._title_offsets[row]:self._title_offsets[row + 1]]).decode("utf-8")
+
+    def year(self, row):
+        return self._years[row] or None
+
+    def corpus_id(self, row):
+        return self._corpus_ids[row]
+
+    def citation_count(self, row):
+        return self._citation_counts[row]
+
+    def references(self, row):
+        """
+        Rows of the papers row cites, most cited first.
+        """
+        return self._refs[self._ref_offsets[row]:self._ref_offsets[row + 1]]
+
+    def seminal_works(self, title, limit=5):
+        """
+        The limit most cited works referenced by the paper titled title, in the shape of the
+        seminal_works prompt's answer. None when the paper or its references are not indexed.
+        """
+        row = self.find(title)
+        references = self.references(row)[:limit] if row is not None else []
+        if not references:
+            self.misses += 1
+            return None
+        self.hits += 1
+        works = []
+        for reference in references:
+            work = {"title": self.title(reference)}
+            if self.year(reference):
+                work["year"] = self.year(reference)
+            works.append(work)
+        return works
+
+    def stats(self):
+        return {"papers": len(self), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        for name in _COLUMNS:
+            getattr(self, f"_{name}").release()
+        self._titles.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+
+@lru_cache(maxsize=None)
+def load_citation_index(directory):
+    """
+    Open the index at directory once per process; stages and projects share the mapping.
+    """
+    return CitationIndex(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query an offline Semantic Scholar citation index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build an index from Semantic Scholar dataset dump files")
+    build.add_argument("--papers", nargs="+", required=True, help="JSONL(.gz) files of the papers dataset")
+    build.add_argument("--citations", nargs="+", required=True, help="JSONL(.gz) files of the citations dataset")
+    build.add_argument("--output", required=True, help="Directory to write the index to")
+    lookup = commands.add_parser("lookup", help="Print the seminal works the index finds for a title")
+    lookup.add_argument("index", help="Index directory")
+    lookup.add_argument("title")
+    lookup.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_citation_index(args.papers, args.citations, args.output), indent=2))
+    else:
+        index = CitationIndex(args.index)
+        works = index.seminal_works(args.title, args.limit)
+        print(json.dumps(works, indent=2) if works is not None else f"'{args.title}' has no indexed references")
@@ -0,0 +1,236 @@
+import asyncio
+import math
+
+from agents.seminal_eval_agent import SeminalEvalAgent
+from utils.survey_papers import afind_survey_papers, astream_survey_papers
+from utils.seminal_works import afind_seminal_works, count_seminal_works
+from utils.prune_papers import ajudge_topic_papers
+from utils.pipeline_config import PipelineConfig
+from utils.title_index import TitleIndex
+from utils.foundational_topics import ResourceIndex, afind_foundational_for_paper
+from utils.budget import PartialResult, gather_within
+
+
+async def arun_dataflow(
+    core_concepts,
+    specialized_concepts,
+    fundamental_concepts,
+    project_summary,
+    gpt_agent,
+    config=None,
+    resume=None,
+    events=None,
+):
+    """
+    Run steps 2-6 of the pipeline as a per-item dataflow instead of stage-wide barriers.
+
+    A concept's survey list feeds its seminal-works queries as soon as it arrives, and a paper
+    that passes pruning goes straight into foundational-topic and resource lookup. The only
+    join is per topic: SeminalEvalAgent needs every reference count for a topic before selecting.
+    Returns the same structures as running the stages one after another.
+
+    resume maps stage checkpoint names ("survey_papers", "seminal_counts", "selected", "pruned")
+    to outputs that are already known; those stages are skipped for every concept.
+
+    Stage budgets from config cap each concept's wait on a stage; what runs out of time, or whose
+    requests fail, is listed in the missing of the matching output, and the concept's later
+    stages go without it.
+
+    events (a ProjectEvents) is told about each concept's results and each paper's verdict and
+    foundational topics as soon as they are known.
+    """
+    config = config or PipelineConfig()
+    resume = resume or {}
+    survey_papers = {}
+    seminal_paper_counts_by_topic = {}
+    top_references = {}
+    selected_papers = {}
+    verdicts = {}
+    foundational_tasks = {}
+    missing = {stage: [] for stage in ("survey_papers", "seminal_counts", "selected", "pruned")}
+    seminal_eval_agent = SeminalEvalAgent({}, gpt_agent, project_summary, config.select_chunk_size)
+    resource_index = ResourceIndex(gpt_agent)
+    # Shared so a reference gets the same canonical title under every concept
+    title_index = TitleIndex(threshold=config.title_similarity)
+    citation_index = config.citations()
+    prefilter = config.prefilter(specialized_concepts, project_summary)
+    expansion = config.expansion(gpt_agent, specialized_concepts, project_summary)
+    # Per-item units run locally, or as queued tasks on workers when config has a work queue
+    work_queue = config.work_queue_client(gpt_agent)
+    find_seminal_works = work_queue.afind_seminal_works if work_queue is not None else afind_seminal_works
+    judge_topic_papers = work_queue.ajudge_topic_papers if work_queue is not None else ajudge_topic_papers
+    find_foundational = (
+        work_queue.afind_foundational_for_paper if work_queue is not None else afind_foundational_for_paper
+    )
+
+    async def foundational_flow(paper):
+        paper, topics = await find_foundational(
+            paper, fundamental_concepts, gpt_agent, core_concepts, resource_index, config.foundational_single_pass
+        )
+        if events is not None:
+            events.foundational(paper, topics)
+        return topics
+
+    def start_foundational(paper):
+        # The same paper may pass under several concepts; look it up only once
+        if paper not in foundational_tasks:
+            foundational_tasks[paper] = asyncio.ensure_future(foundational_flow(paper))
+
+    def judged(concept, paper, verdict):
+        verdicts[(concept, paper)] = verdict
+        if events is not None:
+            events.judged(concept, paper, verdict)
+        if verdict:
+            start_foundational(paper)
+
+    async def prune_flow(concept, batch):
+        batch_verdicts = await judge_topic_papers(
+            concept, batch, specialized_concepts, gpt_agent, project_summary, config.prune_batch_size
+        )
+        for paper, verdict in zip(batch, batch_verdicts):
+            judged(concept, paper, verdict)
+
+    def resume_pruned(concept, selected):
+        passed = set(resume["pruned"].get(concept, []))
+        for paper in selected:
+            judged(concept, paper, paper if paper in passed else None)
+
+    async def streamed_survey(concept, seminal_tasks):
+        papers = []
+        async for paper in astream_survey_papers(concept, gpt_agent):
+            papers.append(paper)
+            if events is not None:
+                events.emit("survey_paper", concept=concept, title=paper.get("title"))
+            seminal_tasks.append(asyncio.ensure_future(find_seminal_works(concept, paper, gpt_agent, citation_index)))
+        print(f"Survey papers for {concept}: {[paper.get('title') for paper in papers]}")
+        return concept, {"papers": papers}
+
+    async def concept_flow(concept):
+        # Seminal-works queries started while the survey list was still streaming in
+        seminal_tasks = []
+        if "survey_papers" in resume:
+            papers = resume["survey_papers"][concept]
+        elif config.stream:
+            results, late = await gather_within(
+                config.budget("survey_papers"), {concept: streamed_survey(concept, seminal_tasks)}
+            )
+            if late:
+                for task in seminal_tasks:
+                    task.cancel()
+                missing["survey_papers"].append(concept)
+                return
+            concept, papers = results[concept]
+        else:
+            results, late = await gather_within(
+                config.budget("survey_papers"), {concept: afind_survey_papers(concept, gpt_agent)}
+            )
+            if late:
+                missing["survey_papers"].append(concept)
+                return
+            concept, papers = results[concept]
+        survey_papers[concept] = papers
+        if events is not None:
+            events.survey_papers(concept, papers)
+
+        if "seminal_counts" in resume:
+            counts, references = resume["seminal_counts"]
+        else:
+            survey_list = papers.get("papers", [])
+            seminal_queries = seminal_tasks + [
+                find_seminal_works(concept, paper, gpt_agent, citation_index) for paper in survey_list[len(seminal_tasks):]
+            ]
+            started = asyncio.get_running_loop().time()
+            budget = config.budget("seminal_counts")
+            results, late = await gather_within(budget, dict(enumerate(seminal_queries)), fail_soft=True)
+            missing["seminal_counts"].extend(
+                (concept, survey_list[index].get("title", "Unknown Title")) for index in late
+            )
+            results = list(results.values())
+            if expansion is not None and results:
+                remaining = budget - (asyncio.get_running_loop().time() - started) if budget is not None else None
+                expanded, stats = await expansion(concept, results, budget=remaining)
+                print(f"Citation expansion for '{concept}': {stats}")
+                results.extend(expanded)
+            counts, references = count_seminal_works(results, title_index)
+        if concept not in counts:
+            return
+        seminal_paper_counts_by_topic[concept] = counts[concept]
+        top_references[concept] = references[concept]
+        if events is not None:
+            events.seminal_counts(concept, counts[concept])
+
+        # Per-topic join: selection needs every count for this concept
+        if "selected" in resume:
+            selected = resume["selected"][concept]
+        else:
+            results, late = await gather_within(
+                config.budget("selected"), {concept: seminal_eval_agent.aselect_topic_papers(concept, counts[concept])}
+            )
+            if late:
+                missing["selected"].append(concept)
+                return
+            selected = results[concept]
+        selected_papers[concept] = selected
+        if events is not None:
+            events.selected(concept, selected)
+
+        if "pruned" in resume:
+            resume_pruned(concept, selected)
+            return
+        size = max(config.prune_batch_size, 1)
+        undecided = selected
+        if prefilter is not None:
+            decided, undecided = prefilter.split(concept, selected)
+            for paper, relevant in decided.items():
+                judged(concept, paper, paper if relevant else None)
+            prefilter.requests_avoided += math.ceil(len(selected) / size) - math.ceil(len(undecided) / size)
+        batches = {start: undecided[start:start + size] for start in range(0, len(undecided), size)}
+        _, late = await gather_within(
+            config.budget("pruned"),
+            {start: prune_flow(concept, batch) for start, batch in batches.items()},
+            fail_soft=True,
+        )
+        missing["pruned"].extend((concept, paper) for start in late for paper in batches[start])
+
+    await asyncio.gather(*(concept_flow(concept) for concept in core_concepts))
+    foundational_results, foundational_missing = await gather_within(
+        config.budget("foundational_topics"), foundational_tasks, fail_soft=True
+    )
+
+    # Rebuild every result in stage order so the output matches the staged pipeline
+    survey_papers = PartialResult(
+        ((concept, survey_papers[concept]) for concept in core_concepts if concept in survey_papers),
+        missing=missing["survey_papers"],
+    )
+    ordered = [concept for concept in core_concepts if concept in seminal_paper_counts_by_topic]
+    seminal_paper_counts_by_topic = PartialResult(
+        ((concept, seminal_paper_counts_by_topic[concept]) for concept in ordered), missing=missing["seminal_counts"]
+    )
+    top_references = {concept: top_references[concept] for concept in ordered}
+    ordered = [concept for concept in ordered if concept in selected_papers]
+    selected_papers = PartialResult(
+        ((concept, selected_papers[concept]) for concept in ordered), missing=missing["selected"]
+    )
+    pruned_papers = PartialResult(
+        (
+            (concept, [paper for paper in selected_papers[concept] if verdicts.get((concept, paper))])
+            for concept in ordered
+        ),
+        missing=missing["pruned"],
+    )
+    foundational_topics = PartialResult(missing=foundational_missing)
+    for papers in pruned_papers.values():
+        for paper in papers:
+            if paper in foundational_results:
+                foundational_topics[paper] = foundational_results[paper]
+
+    if prefilter is not None:
+        print(f"Relevance prefilter: {prefilter.stats()}")
+    return (
+        survey_papers,
+        seminal_paper_counts_by_topic,
+        top_references,
+        selected_papers,
+        pruned_papers,
+        foundational_topics,
+    )
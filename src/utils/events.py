@@ -0,0 +1,291 @@
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.tree_builder import paper_attributes, topic_attributes
+from utils.visualization import NODE_STYLES, VIS_NETWORK_DIR, VIS_NETWORK_URL
+
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT = 15.0
+
+LIVE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>ResearchRamp (live)</title>
+<script src="/__VIS_URL__"></script>
+<style>
+  body { margin: 0; font-family: sans-serif; }
+  #status { position: absolute; top: 8px; left: 8px; z-index: 1; background: white; padding: 2px 6px; }
+  #graph { width: 100%; height: 100vh; }
+</style>
+</head>
+<body>
+<div id="status">Waiting for results...</div>
+<div id="graph"></div>
+<script>
+  var styles = __STYLES__;
+  var nodes = new vis.DataSet();
+  var edges = new vis.DataSet();
+  var network = new vis.Network(
+    document.getElementById("graph"),
+    { nodes: nodes, edges: edges },
+    {
+      layout: { improvedLayout: false },
+      physics: { solver: "forceAtlas2Based", stabilization: false, minVelocity: 0.75 },
+      nodes: { font: { multi: true, size: 20 }, size: 25, shape: "box", widthConstraint: { maximum: 200 } },
+      edges: { arrows: "to", smooth: false },
+      interaction: { hover: true, dragNodes: true, selectConnectedEdges: false }
+    }
+  );
+  var status = document.getElementById("status");
+  var source = new EventSource("/events");
+  source.onmessage = function (message) {
+    var event = JSON.parse(message.data);
+    var prefix = event.project ? event.project + ": " : "";
+    if (event.type === "node") {
+      var id = event.project + "\\u0000" + event.id;
+      nodes.update({ id: id, label: event.id, title: event.metadata, color: styles[event.group] || styles["default"] });
+      if (event.parent !== null) {
+        var parent = event.project + "\\u0000" + event.parent;
+        edges.update({ id: parent + "\\u0000" + id, from: parent, to: id });
+      }
+      return;
+    }
+    if (event.type === "run_finished") {
+      status.textContent = "Finished in " + event.elapsed.toFixed(1) + "s";
+      source.close();
+      return;
+    }
+    status.textContent = prefix + event.type + " (" + event.elapsed.toFixed(1) + "s, " + nodes.length + " nodes)";
+  };
+</script>
+</body>
+</html>
+"""
+
+
+class EventStream:
+    """
+    Partial results of a run as they become known, one event per finished LLM result.
+
+    Every event is a dict with a sequence number, the seconds since the stream was opened, the
+    project, a type and the type's payload. Events are appended to a JSON-lines file at path
+    (flushed line by line, so `tail -f` follows a run) and, after serve(), pushed to browsers
+    over server-sent events. Clients that connect late are sent the whole history first.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._history = []
+        self._subscribers = []
+        self._file = None
+        self._closed = False
+        self.server = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+
+    def emit(self, project, type, **payload):
+        with self._lock:
+            event = {
+                "seq": len(self._history),
+                "elapsed": round(time.perf_counter() - self._origin, 3),
+                "project": project,
+                "type": type,
+                **payload,
+            }
+            self._history.append(event)
+            if self._file is not None:
+                self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._file.flush()
+            for subscriber in self._subscribers:
+                subscriber.put(event)
+        return event
+
+    def subscribe(self):
+        """
+        A queue that receives every event emitted so far and from now on, then None once closed.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            for event in self._history:
+                subscriber.put(event)
+            if self._closed:
+                subscriber.put(None)
+            else:
+                self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """
+        Serve the live graph page at / (with the vendored vis-network) and the event stream at
+        /events from a background thread.
+        Returns the server's URL; port 0 picks a free port.
+        """
+        self.server = EventServer((host, port), self)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}/"
+
+    def close(self):
+        """
+        Emit run_finished, end every client's stream and close the log file.
+        """
+        self.emit(None, "run_finished")
+        with self._lock:
+            self._closed = True
+            for subscriber in self._subscribers:
+                subscriber.put(None)
+            self._subscribers = []
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class EventServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, stream):
+        self.stream = stream
+        super().__init__(address, EventHandler)
+
+
+class EventHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/events":
+            return self.send_events()
+        if self.path == "/" + VIS_NETWORK_URL:
+            with open(os.path.join(VIS_NETWORK_DIR, "vis-network.min.js"), "rb") as file:
+                return self.send_body(file.read(), "application/javascript")
+        if self.path not in ("/", "/index.html"):
+            self.send_error(404)
+            return
+        body = (
+            LIVE_PAGE.replace("__VIS_URL__", VIS_NETWORK_URL).replace("__STYLES__", json.dumps(NODE_STYLES))
+        ).encode("utf-8")
+        self.send_body(body, "text/html; charset=utf-8")
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        subscriber = self.server.stream.subscribe()
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=HEARTBEAT)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                if event is None:
+                    break
+                data = json.dumps(event, ensure_ascii=False)
+                self.wfile.write(f"id: {event['seq']}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.stream.unsubscribe(subscriber)
+
+
+class ProjectEvents:
+    """
+    Events of one project, including a live copy of its knowledge graph.
+
+    The graph grows as results arrive: core concepts when the concepts are known, a seminal paper
+    when it passes pruning under a concept, and foundational topics when they are found for a paper.
+    Nodes carry the attributes build_tree_graph gives them and are announced as "node" events with
+    their parent; a node announced again (a paper whose topics arrived, or a topic reached from a
+    second paper) replaces the earlier one and adds the new edge. Only the final graph built by
+    build_tree_graph is checkpointed and stored; this one is for watching the run.
+    """
+
+    def __init__(self, stream, project, project_title, core_concepts):
+        self.stream = stream
+        self.project = project
+        self.topics = {}
+        self.emit("concepts", project_title=project_title, core_concepts=list(core_concepts))
+        self.node(project_title, None, group="project_title", metadata="Project Title")
+        for concept in core_concepts:
+            self.node(concept, project_title, group="core_concept", metadata="Core Concept")
+
+    def emit(self, type, **payload):
+        return self.stream.emit(self.project, type, **payload)
+
+    def node(self, label, parent, group, metadata, **attributes):
+        self.emit("node", id=label, parent=parent, group=group, metadata=metadata, **attributes)
+
+    def survey_papers(self, concept, papers):
+        self.emit("survey_papers", concept=concept, titles=[paper.get("title") for paper in papers.get("papers", [])])
+
+    def seminal_counts(self, concept, counts):
+        self.emit("seminal_counts", concept=concept, counts=counts)
+
+    def selected(self, concept, papers):
+        self.emit("selected", concept=concept, papers=papers)
+
+    def stage_finished(self, stage, output, selected=None):
+        """
+        Announce every item of a whole stage's output at once, for the staged scheduler; pruning
+        verdicts are read off selected (the selected papers) and the pruned output.
+        """
+        if stage == "survey_papers":
+            for concept, papers in output.items():
+                self.survey_papers(concept, papers)
+        elif stage == "seminal_counts":
+            for concept, counts in output.items():
+                self.seminal_counts(concept, counts)
+        elif stage == "selected":
+            for concept, papers in output.items():
+                self.selected(concept, papers)
+        elif stage == "pruned":
+            for concept, papers in selected.items():
+                passed = set(output.get(concept, []))
+                for paper in papers:
+                    self.judged(concept, paper, paper in passed)
+        elif stage == "foundational_topics":
+            for paper, topics in output.items():
+                self.foundational(paper, topics)
+
+    def judged(self, concept, paper, relevant):
+        """
+        Announce a pruning verdict; a relevant paper joins the graph under its concept.
+        """
+        self.emit("pruned", concept=concept, paper=paper, relevant=bool(relevant))
+        if relevant:
+            self.node(paper, concept, **paper_attributes(self.topics.get(paper, [])))
+
+    def foundational(self, paper, topics):
+        """
+        Announce a paper's foundational topics and add them to the graph under it.
+        """
+        self.topics[paper] = topics
+        self.emit("foundational_topics", paper=paper, topics=topics)
+        self.node(paper, None, **paper_attributes(topics))
+        for topic in topics:
+            self.node(topic["topic"], paper, **topic_attributes(topic))
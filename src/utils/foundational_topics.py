@@ -1,97 +1,243 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
 
+from utils.budget import PartialResult, gather_within
+from utils.prompts import get_prompt
+from utils.title_index import normalize_title
 
-def find_foundational_topics_and_resources(
-    pruned_papers, existing_fundamental_concepts, gpt_agent, core_concepts
-):
+TOPICS_PROMPT = get_prompt("foundational_topics")
+TOPICS_WITH_RESOURCES_PROMPT = get_prompt("foundational_topics_with_resources")
+RESOURCES_PROMPT = get_prompt("resources")
+
+
+def topic_entries(topics):
     """
-    Use an LLM agent to identify foundational topics required for the pruned list of papers
-    and recommend resources for each topic in two passes.
+    The well-formed entries of a foundational_topics list, dicts with a non-empty "topic" string;
+    malformed entries in the model's answer are skipped. Raises ValueError if it is not a list.
+    """
+    if not isinstance(topics, list):
+        raise ValueError(f"Expected a list of foundational topics, got {type(topics).__name__}")
+    return [
+        topic for topic in topics if isinstance(topic, dict) and isinstance(topic.get("topic"), str) and topic["topic"]
+    ]
+
+
+async def afind_paper_topics(paper, existing_fundamental_concepts, gpt_agent, core_concepts):
+    """
+    Identify the foundational topics required to understand a single paper. An unparseable
+    answer yields no topics; a request that still fails after the agent's retries raises, so
+    callers can report the paper as missing rather than as having no foundational topics.
+    """
+    instructions, input_text = TOPICS_PROMPT.render(
+        existing_topics=", ".join(existing_fundamental_concepts), core_concepts=", ".join(core_concepts), paper=paper
+    )
+    try:
+        response = await gpt_agent.aquery(
+            instructions,
+            input_text,
+            stage="foundational_topics",
+            response_format=TOPICS_PROMPT.response_format,
+        )
+        print(f"Response for foundational topics for paper '{paper}':", response)
+        response_data = json.loads(response)
+        return paper, topic_entries(response_data.get("foundational_topics", []))
+    except (ValueError, AttributeError) as e:
+        gpt_agent.parse_failed("foundational_topics")
+        print(f"Error parsing foundational topics for paper '{paper}': {e}")
+        return paper, []
+
+
+class ResourceIndex:
+    """
+    Per-run topic -> resource index. Each distinct normalized topic is resolved once, and the
+    resource is shared by every paper that needs the topic. Unresolved topics are looked up in
+    batches of batch_size per request; a batch whose answer cannot be parsed is split in half and
+    retried, and a failed request raises in every paper waiting on that batch's topics.
     """
-    foundational_topics = {}
-
-    def process_paper_for_topics(paper):
-        input_text = f"""
-        The project involves the following paper: {paper}.
-            Identify all foundational topics required to understand this paper.
-            Include both the existing foundational topics: {', '.join(existing_fundamental_concepts)}
-            and any additional foundational topics not listed. 
-            Foundational concepts are foundational to the core concepts ({', '.join(core_concepts)}) and provide the necessary theoretical or technical background 
-            to understand and work with the core concepts. Foundational topics should not include core concepts.
-            They are more advanced than prerequisites but not as specific as core concepts. 
-            Examples: Machine Learning, Deep Learning, Robotic Kinematics, Control Theory.
-            Foundational topics should not be too basic either.
-            Too basic: Linear Algebra, Calculus, Classical Mechanics.
-            Respond in the following JSON format.
-            Do NOT include tick marks or any other formatting. Just ONLY provide the JSON object:
-            {{
-                "foundational_topics": [
-                    {{
-                        "topic": "<topic>"
-                    }},
-                    {{
-                        "topic": "<topic>"
-                    }}
-                ]
-            }}
+
+    def __init__(self, gpt_agent, batch_size=20):
+        self.gpt_agent = gpt_agent
+        self.batch_size = batch_size
+        self.resources = {}
+        self._pending = {}
+
+    def record(self, topic, resource):
         """
-        try:
-            response = gpt_agent.query("You are a helpful assistant.", input_text)
-            print(f"Response for foundational topics for paper '{paper}':", response)
-            response_data = json.loads(response)
-            return paper, response_data.get("foundational_topics", [])
-        except Exception as e:
-            print(f"Error generating foundational topics for paper '{paper}': {e}")
-            return paper, []
-
-    def process_paper_for_resources(paper, topics):
-        input_text = f"""
-        The following foundational topics have been identified for the paper '{paper}': {', '.join([t['topic'] for t in topics])}.
-        For each topic, recommend a research paper, textbook, or resource that provides
-        a comprehensive introduction to the topic. Respond in the following JSON format
-        Do NOT include tick marks or any other formatting. Just ONLY provide the JSON object:
-        {{
-            "{paper}": [
-                {{
-                    "topic": "<topic>",
-                    "resource": "<resource title and author or link>"
-                }},
-                {{
-                    "topic": "<topic>",
-                    "resource": "<resource title and author or link>"
-                }}
-            ]
-        }}
+        Remember a resource for a topic unless one is already known; return the indexed resource.
+        """
+        key = normalize_title(topic)
+        if resource and key not in self.resources:
+            self.resources[key] = resource
+        return self.resources.get(key)
+
+    def attach(self, topics):
         """
+        Return a copy of topics with the indexed resource attached where one is known.
+        """
+        attached = []
+        for topic in topics:
+            entry = {"topic": topic["topic"]}
+            resource = self.resources.get(normalize_title(topic["topic"]))
+            if resource:
+                entry["resource"] = resource
+            attached.append(entry)
+        return attached
+
+    async def resolve(self, topics):
+        """
+        Make sure every topic name has been looked up, batching the ones nobody has asked for yet.
+        """
+        loop = asyncio.get_running_loop()
+        new = {}
+        for topic in topics:
+            key = normalize_title(topic)
+            if key and key not in self.resources and key not in self._pending and key not in new:
+                new[key] = topic
+        for key in new:
+            self._pending[key] = loop.create_future()
+
+        names = list(new.values())
+        batches = [names[start:start + self.batch_size] for start in range(0, len(names), self.batch_size)]
+        waiting = [self._pending[normalize_title(topic)] for topic in topics if normalize_title(topic) in self._pending]
         try:
-            response = gpt_agent.query("You are a helpful assistant.", input_text)
-            print(f"Response for resources for paper '{paper}':", response)
-            response_data = json.loads(response)
-            return paper, response_data.get(paper, [])
+            await asyncio.gather(*(self._resolve_batch(batch) for batch in batches))
+        finally:
+            # If this lookup was cancelled, release the papers waiting on its topics without a resource
+            for key in new:
+                future = self._pending.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+        await asyncio.gather(*waiting)
+
+    async def _resolve_batch(self, topics):
+        topic_list = "\n".join(f"{index}. {topic}" for index, topic in enumerate(topics, start=1))
+        instructions, input_text = RESOURCES_PROMPT.render(topic_list=topic_list)
+        try:
+            response = await self.gpt_agent.aquery(
+                instructions,
+                input_text,
+                stage="foundational_resources",
+                response_format=RESOURCES_PROMPT.response_format,
+            )
+            print(f"Response for resources for {len(topics)} topics:", response)
+            found = {}
+            for entry in json.loads(response).get("resources", []):
+                index = int(entry.get("index", 0))
+                if 1 <= index <= len(topics) and entry.get("resource"):
+                    found[index] = entry["resource"]
+        except (ValueError, TypeError, AttributeError) as e:
+            self.gpt_agent.parse_failed("foundational_resources")
+            if len(topics) > 1:
+                print(f"Error generating resources for {len(topics)} topics, splitting: {e}")
+                middle = len(topics) // 2
+                await asyncio.gather(self._resolve_batch(topics[:middle]), self._resolve_batch(topics[middle:]))
+                return
+            print(f"Error generating resources for topic '{topics[0]}': {e}")
+            found = {}
         except Exception as e:
-            print(f"Error generating resources for paper '{paper}': {e}")
-            return paper, []
-
-    # First pass: Generate foundational topics grouped by paper
-    with ThreadPoolExecutor() as executor:
-        future_to_paper = {
-            executor.submit(process_paper_for_topics, paper): paper
-            for topic, papers in pruned_papers.items()
+            # Only this batch's topics fail; batches running alongside it resolve their own
+            print(f"Error generating resources for {len(topics)} topics: {e}")
+            for topic in topics:
+                future = self._pending.pop(normalize_title(topic), None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                    # Retrieved here so a topic nobody else waits on does not log the error again
+                    future.exception()
+            return
+
+        for index, topic in enumerate(topics, start=1):
+            if index in found:
+                self.record(topic, found[index])
+            future = self._pending.pop(normalize_title(topic), None)
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+async def afind_paper_topics_and_resources(paper, existing_fundamental_concepts, gpt_agent, core_concepts, index):
+    """
+    Single-pass lookup: identify a paper's foundational topics and a resource for each in one request.
+    Topics already in the index reuse the indexed resource so every paper shares the same one.
+    """
+    instructions, input_text = TOPICS_WITH_RESOURCES_PROMPT.render(
+        existing_topics=", ".join(existing_fundamental_concepts), core_concepts=", ".join(core_concepts), paper=paper
+    )
+    try:
+        response = await gpt_agent.aquery(
+            instructions,
+            input_text,
+            stage="foundational_topics",
+            response_format=TOPICS_WITH_RESOURCES_PROMPT.response_format,
+        )
+        print(f"Response for foundational topics and resources for paper '{paper}':", response)
+        topics = topic_entries(json.loads(response).get("foundational_topics", []))
+    except (ValueError, AttributeError) as e:
+        gpt_agent.parse_failed("foundational_topics")
+        print(f"Error parsing foundational topics for paper '{paper}': {e}")
+        return paper, []
+
+    for topic in topics:
+        index.record(topic["topic"], topic.get("resource"))
+    return paper, index.attach(topics)
+
+
+async def afind_foundational_for_paper(
+    paper, existing_fundamental_concepts, gpt_agent, core_concepts, index, single_pass=False
+):
+    """
+    Find a paper's foundational topics with resources attached from the shared index.
+    """
+    if single_pass:
+        return await afind_paper_topics_and_resources(
+            paper, existing_fundamental_concepts, gpt_agent, core_concepts, index
+        )
+    paper, topics = await afind_paper_topics(paper, existing_fundamental_concepts, gpt_agent, core_concepts)
+    await index.resolve([topic["topic"] for topic in topics])
+    return paper, index.attach(topics)
+
+
+async def afind_foundational_topics_and_resources(
+    pruned_papers,
+    existing_fundamental_concepts,
+    gpt_agent,
+    core_concepts,
+    single_pass=False,
+    index=None,
+    budget=None,
+    work_queue=None,
+):
+    """
+    Async version of find_foundational_topics_and_resources; all papers run concurrently and
+    resources come from a topic -> resource index shared across papers. Papers still running
+    after budget seconds, or whose requests failed, are listed in the result's missing. With a
+    work_queue (a WorkQueueClient), each paper runs as a queued task on a worker, which looks
+    resources up in its own index.
+    """
+    find = work_queue.afind_foundational_for_paper if work_queue is not None else afind_foundational_for_paper
+    index = index or ResourceIndex(gpt_agent)
+    papers = list(dict.fromkeys(paper for topic, papers in pruned_papers.items() for paper in papers))
+    results, missing = await gather_within(
+        budget,
+        {
+            paper: find(
+                paper, existing_fundamental_concepts, gpt_agent, core_concepts, index, single_pass
+            )
             for paper in papers
-        }
-        for future in future_to_paper:
-            paper, topics = future.result()
-            foundational_topics[paper] = topics
-
-    # Second pass: Attach resources to each foundational topic
-    with ThreadPoolExecutor() as executor:
-        future_to_paper = {
-            executor.submit(process_paper_for_resources, paper, topics): paper
-            for paper, topics in foundational_topics.items()
-        }
-        for future in future_to_paper:
-            paper, resources = future.result()
-            foundational_topics[paper] = resources
-
-    return foundational_topics
+        },
+        fail_soft=True,
+    )
+    return PartialResult(results.values(), missing=missing)
+
+
+def find_foundational_topics_and_resources(
+    pruned_papers, existing_fundamental_concepts, gpt_agent, core_concepts, single_pass=False
+):
+    """
+    Use an LLM agent to identify foundational topics required for the pruned list of papers
+    and recommend resources for each topic. By default topics are found per paper and each
+    distinct topic's resource is looked up once; single_pass asks for both in one request per paper.
+    """
+    return gpt_agent.run(
+        afind_foundational_topics_and_resources(
+            pruned_papers, existing_fundamental_concepts, gpt_agent, core_concepts, single_pass
+        )
+    )
@@ -0,0 +1,89 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+def spanning_tree(G, root):
+    """
+    Breadth-first spanning tree of G from root: (parent, children, order). A node reachable along
+    several paths, such as a paper listed under two concepts, hangs under the first one reached.
+    Nodes not reachable from root are attached to it, so every node gets a place.
+    """
+    parent = {root: None}
+    children = {node: [] for node in G.nodes}
+    order = []
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for child in G.successors(node):
+            if child not in parent:
+                parent[child] = node
+                children[node].append(child)
+                queue.append(child)
+    for node in G.nodes:
+        if node not in parent:
+            parent[node] = root
+            children[root].append(node)
+            order.append(node)
+    return parent, children, order
+
+
+def find_root(G):
+    """
+    The project title node, or else the first node without incoming edges.
+    """
+    for node, data in G.nodes(data=True):
+        if data.get("group") == "project_title":
+            return node
+    return next((node for node in G.nodes if G.in_degree(node) == 0), next(iter(G.nodes)))
+
+
+def radial_layout(G, root=None, ring_spacing=350.0, node_spacing=220.0):
+    """
+    Radial tree layout: the root sits at the origin and each level of the spanning tree on a ring
+    around it. Every subtree gets an angular wedge proportional to its number of leaves, so
+    branches never cross, and each ring is pushed out until its nodes are at least node_spacing
+    apart along the ring. Returns (positions, parent): positions maps each node to integer (x, y)
+    canvas coordinates.
+    """
+    if G.number_of_nodes() == 0:
+        return {}, {}
+    root = root if root is not None else find_root(G)
+    parent, children, order = spanning_tree(G, root)
+
+    leaves = {}
+    for node in reversed(order):
+        leaves[node] = sum(leaves[child] for child in children[node]) or 1
+
+    depth = {root: 0}
+    angle = {root: 0.0}
+    wedge_start = {root: 0.0}
+    wedge = {root: 2 * math.pi}
+    for node in order:
+        start = wedge_start[node]
+        for child in children[node]:
+            share = wedge[node] * leaves[child] / leaves[node]
+            depth[child] = depth[node] + 1
+            wedge_start[child] = start
+            wedge[child] = share
+            angle[child] = start + share / 2
+            start += share
+
+    # Ring radius per depth: one ring_spacing further out than the previous ring, or further still
+    # if the closest neighbours on the ring would be less than node_spacing apart
+    max_depth = max(depth.values())
+    radii = [0.0]
+    for level in range(1, max_depth + 1):
+        ring = np.sort([angle[node] for node in order if depth[node] == level])
+        gaps = np.diff(np.append(ring, ring[0] + 2 * math.pi)) if len(ring) > 1 else np.array([2 * math.pi])
+        radii.append(max(radii[-1] + ring_spacing, node_spacing / max(gaps.min(), 1e-9)))
+
+    nodes = list(order)
+    angles = np.array([angle[node] for node in nodes])
+    radius = np.array([radii[depth[node]] for node in nodes])
+    xs = np.rint(radius * np.cos(angles)).astype(int)
+    ys = np.rint(radius * np.sin(angles)).astype(int)
+    positions = {node: (int(x), int(y)) for node, x, y in zip(nodes, xs, ys)}
+    return positions, parent
@@ -0,0 +1,285 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import networkx as nx
+
+from utils.title_index import normalize_title
+
+# Key prefix per node group; a node's key is its prefix and its normalized label, so the same
+# paper or topic found by different projects (or spelled slightly differently) is one node
+_KEY_PREFIXES = {
+    "project_title": "project",
+    "core_concept": "concept",
+    "seminal_paper": "paper",
+    "foundational_topic": "topic",
+}
+
+
+def node_key(label, group):
+    """
+    Canonical ID of a graph node, e.g. node_key("Attention Is All You Need", "seminal_paper")
+    -> "paper:attention is all you need".
+    """
+    return f"{_KEY_PREFIXES.get(group, group or 'node')}:{normalize_title(str(label))}"
+
+
+class GraphStore:
+    """
+    Knowledge graph shared by every project and run, persisted in SQLite.
+
+    Nodes are stored once under their canonical key with their group and the label, metadata and
+    resource they were last upserted with. Edges and node memberships are stored per project as
+    integer node ids, in the order the project's graph listed them and with the node's label and
+    metadata in that project, so subgraph() rebuilds the graph that was upserted, in the same order
+    so the layout of a re-rendered page does not change. The one difference: labels of one group
+    that normalize to the same key are a single node, stored with the first of them, and edges
+    to or from the others attach to it. A resource of None comes back as no resource. Upserting a project only writes the edges and
+    memberships that differ from what is stored for it, and nodes no project references any more
+    are dropped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                label TEXT NOT NULL,
+                node_group TEXT NOT NULL,
+                metadata TEXT NOT NULL DEFAULT '',
+                resource TEXT
+            );
+            CREATE TABLE IF NOT EXISTS projects (
+                name TEXT PRIMARY KEY,
+                root INTEGER NOT NULL REFERENCES nodes (id),
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS memberships (
+                project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+                node INTEGER NOT NULL REFERENCES nodes (id),
+                position INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                metadata TEXT NOT NULL DEFAULT '',
+                resource TEXT,
+                PRIMARY KEY (project, node)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_memberships_node ON memberships (node);
+            CREATE TABLE IF NOT EXISTS edges (
+                project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+                source INTEGER NOT NULL REFERENCES nodes (id),
+                target INTEGER NOT NULL REFERENCES nodes (id),
+                position INTEGER NOT NULL,
+                PRIMARY KEY (project, source, target)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_edges_target ON edges (target);
+            """
+        )
+        self._conn.commit()
+
+    def upsert(self, project, G):
+        """
+        Store G, a build_tree_graph graph, as the current graph of project.
+        Returns counts of the memberships and edges added and removed.
+        """
+        keys = {node: node_key(node, data.get("group")) for node, data in G.nodes(data=True)}
+        root = next((node for node, data in G.nodes(data=True) if data.get("group") == "project_title"), None)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO nodes (key, label, node_group, metadata, resource) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET label = excluded.label, node_group = excluded.node_group, "
+                "metadata = excluded.metadata, resource = COALESCE(excluded.resource, nodes.resource)",
+                [
+                    (
+                        keys[node],
+                        str(node),
+                        data.get("group", "default"),
+                        data.get("metadata", ""),
+                        data.get("resource"),
+                    )
+                    for node, data in G.nodes(data=True)
+                ],
+            )
+            ids = {}
+            for node, key in keys.items():
+                ids[node] = self._conn.execute("SELECT id FROM nodes WHERE key = ?", (key,)).fetchone()[0]
+            if root is None:
+                root = next(iter(G.nodes))
+            self._conn.execute(
+                "INSERT INTO projects (name, root, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET root = excluded.root, updated_at = excluded.updated_at",
+                (project, ids[root], time.time()),
+            )
+
+            # Several labels may share a key; the first occurrence fixes the position and metadata
+            members = {}
+            for node, data in G.nodes(data=True):
+                members.setdefault(
+                    (ids[node],), (len(members), str(node), data.get("metadata", ""), data.get("resource"))
+                )
+            edges = {}
+            for source, target in G.edges():
+                edges.setdefault((ids[source], ids[target]), (len(edges),))
+            counts = {
+                "memberships": self._sync(
+                    "memberships", ("node",), ("position", "label", "metadata", "resource"), project, members
+                ),
+                "edges": self._sync("edges", ("source", "target"), ("position",), project, edges),
+            }
+            self._conn.execute("DELETE FROM nodes WHERE id NOT IN (SELECT node FROM memberships)")
+        return counts
+
+    def _sync(self, table, key_columns, value_columns, project, rows):
+        # Write only the difference between the stored rows of project and rows (key -> values)
+        keys = len(key_columns)
+        stored = {
+            tuple(row[:keys]): tuple(row[keys:])
+            for row in self._conn.execute(
+                f"SELECT {', '.join(key_columns + value_columns)} FROM {table} WHERE project = ?", (project,)
+            )
+        }
+        where = " AND ".join(f"{column} = ?" for column in key_columns)
+        removed = [key for key in stored if key not in rows]
+        self._conn.executemany(
+            f"DELETE FROM {table} WHERE project = ? AND {where}", [(project, *key) for key in removed]
+        )
+        columns = ("project",) + key_columns + value_columns
+        self._conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT (project, {', '.join(key_columns)}) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in value_columns),
+            [(project, *key, *values) for key, values in rows.items() if stored.get(key) != values],
+        )
+        return {"added": sum(1 for key in rows if key not in stored), "removed": len(removed)}
+
+    def projects(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM projects ORDER BY name")]
+
+    def projects_for(self, label, group="seminal_paper"):
+        """
+        Projects whose graph contains the node for label, e.g. every project depending on a paper.
+        """
+        with self._lock:
+            return [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT memberships.project FROM nodes JOIN memberships ON memberships.node = nodes.id "
+                    "WHERE nodes.key = ? ORDER BY memberships.project",
+                    (node_key(label, group),),
+                )
+            ]
+
+    def shared_nodes(self, group=None, min_projects=2):
+        """
+        (label, group, projects) for every node referenced by at least min_projects projects.
+        """
+        query = (
+            "SELECT nodes.label, nodes.node_group, GROUP_CONCAT(memberships.project, '\x1f') FROM nodes "
+            "JOIN memberships ON memberships.node = nodes.id "
+            + ("WHERE nodes.node_group = ? " if group else "")
+            + "GROUP BY nodes.id HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC, nodes.label"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, ((group,) if group else ()) + (min_projects,)).fetchall()
+        return [(label, node_group, sorted(projects.split("\x1f"))) for label, node_group, projects in rows]
+
+    def subgraph(self, project):
+        """
+        The graph last upserted for project as an nx.DiGraph in build_tree_graph's format,
+        or None if the store has no graph for project. Near-duplicate labels come back merged
+        (see GraphStore).
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM projects WHERE name = ?", (project,)).fetchone() is None:
+                return None
+            nodes = self._conn.execute(
+                "SELECT nodes.id, memberships.label, nodes.node_group, memberships.metadata, memberships.resource "
+                "FROM memberships "
+                "JOIN nodes ON nodes.id = memberships.node WHERE memberships.project = ? ORDER BY memberships.position",
+                (project,),
+            ).fetchall()
+            edges = self._conn.execute(
+                "SELECT source, target FROM edges WHERE project = ? ORDER BY position", (project,)
+            ).fetchall()
+        G = nx.DiGraph()
+        labels = {}
+        for node_id, label, node_group, metadata, resource in nodes:
+            labels[node_id] = label
+            attributes = {"group": node_group, "metadata": metadata}
+            if resource is not None:
+                attributes["resource"] = resource
+            G.add_node(label, **attributes)
+        G.add_edges_from((labels[source], labels[target]) for source, target in edges)
+        return G
+
+    def remove_project(self, project):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM projects WHERE name = ?", (project,))
+            self._conn.execute("DELETE FROM nodes WHERE id NOT IN (SELECT node FROM memberships)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("projects", "nodes", "edges")
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def load_graph_store(path):
+    """
+    Open the store at path once per process; every project run writes through one connection.
+    """
+    return GraphStore(path)
+
+
+if __name__ == "__main__":
+    from utils.visualization import visualize
+
+    parser = argparse.ArgumentParser(description="Query or render the persistent knowledge graph store.")
+    parser.add_argument("store", help="Path of the graph store database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Print the number of projects, nodes and edges")
+    depends = commands.add_parser("projects-for", help="List the projects whose graph contains a node")
+    depends.add_argument("label")
+    depends.add_argument("--group", default="seminal_paper", choices=list(_KEY_PREFIXES))
+    shared = commands.add_parser("shared", help="List nodes referenced by several projects")
+    shared.add_argument("--group", choices=list(_KEY_PREFIXES))
+    shared.add_argument("--min-projects", type=int, default=2)
+    render = commands.add_parser("render", help="Write a project's graph page from the store")
+    render.add_argument("project")
+    render.add_argument("--output", help="Page to write (default knowledge_graph_<project>.html)")
+    render.add_argument("--graph-layout", choices=["precomputed", "physics"], default="precomputed")
+    args = parser.parse_args()
+
+    store = GraphStore(args.store)
+    if args.command == "stats":
+        print(store.stats())
+    elif args.command == "projects-for":
+        print("\n".join(store.projects_for(args.label, args.group)) or f"No project references '{args.label}'")
+    elif args.command == "shared":
+        for label, node_group, projects in store.shared_nodes(args.group, args.min_projects):
+            print(f"{label} ({node_group}): {', '.join(projects)}")
+    else:
+        G = store.subgraph(args.project)
+        if G is None:
+            parser.error(f"The store has no graph for project '{args.project}'")
+        output = args.output or f"knowledge_graph_{args.project}.html"
+        visualize(G, output, args.graph_layout)
+        print(f"Wrote {output}")
+    store.close()
@@ -0,0 +1,94 @@
+import threading
+
+import httpx
+
+
+class ConnectionStats:
+    """
+    Thread-safe counters for HTTP requests and newly opened connections.
+
+    Fed by httpcore trace events, so a request that reuses a pooled keep-alive
+    connection is counted without a matching TCP connect or TLS handshake.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event_name, info):
+        self.trace(event_name, info)
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def aon_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.atrace
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.tcp_connects, 0)
+            return {
+                "requests": self.requests,
+                "tcp_connects": self.tcp_connects,
+                "tls_handshakes": self.tls_handshakes,
+                "reused_connections": reused,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+
+def build_http_client(
+    stats=None,
+    timeout=60.0,
+    connect_timeout=10.0,
+    max_connections=100,
+    max_keepalive_connections=32,
+    keepalive_expiry=30.0,
+):
+    """
+    Build a pooled httpx client with keep-alive and timeouts, optionally recording connection stats.
+    """
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        event_hooks={"request": [stats.on_request]} if stats is not None else {},
+    )
+
+
+def build_async_http_client(
+    stats=None,
+    timeout=60.0,
+    connect_timeout=10.0,
+    max_connections=100,
+    max_keepalive_connections=32,
+    keepalive_expiry=30.0,
+):
+    """
+    Async counterpart of build_http_client for use with openai.AsyncOpenAI.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        event_hooks={"request": [stats.aon_request]} if stats is not None else {},
+    )
@@ -0,0 +1,94 @@
+import json
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for one array inside a JSON document that arrives in pieces.
+
+    feed() takes the next chunk of text and returns the elements of the array under key that
+    were completed by it, so a consumer can act on the first element while the rest of the
+    response is still being generated. Only the first array under key (at any depth) is read.
+    Elements that are not valid JSON on their own are skipped.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        # After '"key":' the next structural character should open the array
+        self._expect_array = False
+        self._array_depth = None
+        self._item_start = None
+
+    def _emit(self, end, items):
+        try:
+            items.append(json.loads(self.text[self._item_start:end]))
+        except json.JSONDecodeError:
+            pass
+        self._item_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        items = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            in_array = self._array_depth is not None
+            at_item_level = in_array and self._depth == self._array_depth
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:self._pos]
+            elif char.isspace():
+                pass
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+                self._expect_array = False
+                if at_item_level and self._item_start is None:
+                    self._item_start = self._pos
+            elif char in "{[":
+                if at_item_level and self._item_start is None:
+                    self._item_start = self._pos
+                if self._expect_array and char == "[":
+                    self._array_depth = self._depth + 1
+                self._expect_array = False
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if in_array and self._depth == self._array_depth - 1:
+                    # The array itself closed; a trailing scalar element ends here
+                    if self._item_start is not None:
+                        self._emit(self._pos, items)
+                    self.done = True
+                elif in_array and self._depth == self._array_depth and self._item_start is not None:
+                    self._emit(self._pos + 1, items)
+            elif char == ",":
+                if at_item_level and self._item_start is not None:
+                    self._emit(self._pos, items)
+            elif char == ":":
+                self._expect_array = not in_array and self._last_string == self.key
+            else:
+                self._expect_array = False
+                if at_item_level and self._item_start is None:
+                    self._item_start = self._pos
+            self._pos += 1
+        return items
+
+
+def iter_array_items(text, key):
+    """
+    Elements of the first array under key in a complete JSON document.
+    """
+    return JsonArrayStream(key).feed(text)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Eviction trims the cache to this share of max_bytes, so a full cache is scanned once per
+# tenth of its size written rather than on every write
+EVICT_TO = 0.9
+
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for LLM responses backed by SQLite.
+
+    Entries are keyed on a hash of the model, temperature, instructions and input text,
+    so re-running a project (or a nearby one that shares prompts) is answered locally.
+    Eviction is by age (max_age_seconds) and by total stored size (max_bytes), oldest
+    access first.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, max_age_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Stored bytes as of the last evict() plus what set() has written since; an overestimate
+        # when entries are replaced or written by another process, corrected by the next evict()
+        self._bytes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model, temperature, instructions, input_text, response_format=None):
+        """
+        Build the content address for a request. A structured-output response_format is part of
+        the request, so it is part of the key; plain requests keep their original keys.
+        """
+        request = [model, temperature, instructions, input_text]
+        if response_format is not None:
+            request.append(response_format)
+        payload = json.dumps(request, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached response for key, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, model, response):
+        """
+        Store a response, and evict old entries once the cache may have grown past max_bytes.
+        """
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._conn.commit()
+            self._bytes += size
+            full = self.max_bytes and self._bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then, if over max_bytes, the least recently used ones until under
+        EVICT_TO of max_bytes.
+        """
+        with self._lock:
+            if self.max_age_seconds:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+                )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ).fetchall()
+                stale = []
+                for key, size in rows:
+                    if total <= self.max_bytes * EVICT_TO:
+                        break
+                    stale.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self._bytes = total
+            self._conn.commit()
+
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters and current size of the cache.
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Metrics:
+    """
+    Per-stage instrumentation for LLM calls: call counts, latency, token usage, cache hits,
+    parse failures and concurrency. Calls are recorded by Agent when it is given a Metrics
+    instance; with no instance attached the agent skips all of this.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.calls = []
+        self.parse_failures = defaultdict(int)
+        self.cache_hits = defaultdict(int)
+        self._in_flight = defaultdict(int)
+        self._max_in_flight = defaultdict(int)
+        self._total_in_flight = 0
+        self.max_total_in_flight = 0
+        # Free trace lanes, so overlapping calls land on separate rows of the timeline
+        self._free_lanes = []
+        self._lane_count = 0
+
+    def call_started(self, stage, model=None):
+        """
+        Record the start of a network call to model; returns a token for call_finished.
+        """
+        with self._lock:
+            self._in_flight[stage] += 1
+            self._max_in_flight[stage] = max(self._max_in_flight[stage], self._in_flight[stage])
+            self._total_in_flight += 1
+            self.max_total_in_flight = max(self.max_total_in_flight, self._total_in_flight)
+            if self._free_lanes:
+                lane = min(self._free_lanes)
+                self._free_lanes.remove(lane)
+            else:
+                lane = self._lane_count
+                self._lane_count += 1
+        return stage, model, lane, time.perf_counter()
+
+    def call_finished(self, token, response=None, error=None):
+        """
+        Record the end of a network call along with its token usage or error.
+        """
+        end = time.perf_counter()
+        stage, model, lane, start = token
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "input_tokens_details", None)
+        call = {
+            "stage": stage,
+            "model": model,
+            "lane": lane,
+            "start": start - self._origin,
+            "end": end - self._origin,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "error": type(error).__name__ if error is not None else None,
+        }
+        with self._lock:
+            self.calls.append(call)
+            self._in_flight[stage] -= 1
+            self._total_in_flight -= 1
+            self._free_lanes.append(lane)
+
+    def cache_hit(self, stage):
+        with self._lock:
+            self.cache_hits[stage] += 1
+
+    def parse_failure(self, stage):
+        with self._lock:
+            self.parse_failures[stage] += 1
+
+    def report(self):
+        """
+        Summarize the recorded calls per stage.
+        """
+        with self._lock:
+            calls = list(self.calls)
+            stages = {}
+            for stage in set(call["stage"] for call in calls) | set(self.parse_failures) | set(self.cache_hits):
+                stage_calls = [call for call in calls if call["stage"] == stage]
+                latencies = [call["end"] - call["start"] for call in stage_calls]
+                input_tokens = sum(call["input_tokens"] for call in stage_calls)
+                cached_tokens = sum(call["cached_tokens"] for call in stage_calls)
+                stages[str(stage)] = {
+                    "calls": len(stage_calls),
+                    "errors": sum(1 for call in stage_calls if call["error"]),
+                    "cache_hits": self.cache_hits.get(stage, 0),
+                    "parse_failures": self.parse_failures.get(stage, 0),
+                    "latency_p50": percentile(latencies, 0.5),
+                    "latency_p90": percentile(latencies, 0.9),
+                    "latency_p99": percentile(latencies, 0.99),
+                    "latency_max": max(latencies, default=0.0),
+                    "wall_time": (
+                        max(call["end"] for call in stage_calls) - min(call["start"] for call in stage_calls)
+                        if stage_calls
+                        else 0.0
+                    ),
+                    "input_tokens": input_tokens,
+                    "output_tokens": sum(call["output_tokens"] for call in stage_calls),
+                    "cached_tokens": cached_tokens,
+                    "cached_token_rate": cached_tokens / input_tokens if input_tokens else 0.0,
+                    "max_concurrency": self._max_in_flight.get(stage, 0),
+                    "calls_by_model": dict(Counter(call["model"] for call in stage_calls if call["model"])),
+                }
+            return {
+                "elapsed": time.perf_counter() - self._origin,
+                "calls": len(calls),
+                "max_concurrency": self.max_total_in_flight,
+                "stages": stages,
+            }
+
+    def trace_events(self):
+        """
+        Chrome trace / Perfetto events: one slice per call on its lane, plus one slice per stage window.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        events = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "LLM calls"}},
+            {"name": "process_name", "ph": "M", "pid": 2, "args": {"name": "Stages"}},
+        ]
+        for call in calls:
+            events.append(
+                {
+                    "name": str(call["stage"]),
+                    "cat": "llm",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": call["lane"],
+                    "ts": call["start"] * 1e6,
+                    "dur": (call["end"] - call["start"]) * 1e6,
+                    "args": {key: call[key] for key in ("model", "input_tokens", "output_tokens", "cached_tokens", "error")},
+                }
+            )
+        windows = {}
+        for call in calls:
+            start, end = windows.get(call["stage"], (call["start"], call["end"]))
+            windows[call["stage"]] = (min(start, call["start"]), max(end, call["end"]))
+        for tid, (stage, (start, end)) in enumerate(sorted(windows.items(), key=lambda item: item[1][0])):
+            events.append(
+                {
+                    "name": str(stage),
+                    "cat": "stage",
+                    "ph": "X",
+                    "pid": 2,
+                    "tid": tid,
+                    "ts": start * 1e6,
+                    "dur": (end - start) * 1e6,
+                }
+            )
+        return events
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def write_trace(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, file)
+
+    def print_summary(self):
+        report = self.report()
+        print(f"\nLLM calls: {report['calls']} in {report['elapsed']:.1f}s, peak concurrency {report['max_concurrency']}")
+        for stage, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["wall_time"]):
+            print(
+                f"- {stage}: {stats['calls']} calls ({stats['cache_hits']} cached, {stats['errors']} errors, "
+                f"{stats['parse_failures']} parse failures), p50 {stats['latency_p50']:.2f}s, "
+                f"p99 {stats['latency_p99']:.2f}s, wall {stats['wall_time']:.1f}s, "
+                f"tokens in/out/cached {stats['input_tokens']}/{stats['output_tokens']}/{stats['cached_tokens']} "
+                f"({stats['cached_token_rate']:.0%} cached), "
+                f"peak concurrency {stats['max_concurrency']}"
+                + (f", calls by model {stats['calls_by_model']}" if len(stats["calls_by_model"]) > 1 else "")
+            )
@@ -0,0 +1,174 @@
+import json
+import uuid
+from functools import partial
+
+from utils.citation_expansion import aexpand_citations
+from utils.citation_index import load_citation_index
+from utils.events import EventStream, ProjectEvents
+from utils.graph_store import load_graph_store
+from utils.prompts import stage_version
+from utils.relevance_prefilter import RelevancePrefilter
+from utils.work_queue import WorkQueueClient, load_work_queue
+
+
+class PipelineConfig:
+    """
+    Tunable settings for pipeline steps 2-6, shared by the staged and dataflow schedulers.
+    """
+
+    def __init__(
+        self,
+        select_chunk_size=None,
+        prune_batch_size=1,
+        prune_cross_topic=False,
+        prefilter_low=None,
+        prefilter_high=None,
+        foundational_single_pass=False,
+        title_similarity=0.8,
+        checkpoint_dir=None,
+        stage_budgets=None,
+        stream=False,
+        citation_index=None,
+        graph_store=None,
+        expansion_depth=1,
+        expansion_max_nodes=30,
+        expansion_max_calls=None,
+        expansion_width=8,
+        events_path=None,
+        events_port=None,
+        work_queue=None,
+    ):
+        # Most candidate titles per select_papers ranking prompt; longer candidate lists are ranked
+        # as a tournament of parallel chunks. None ranks each topic's candidates in one prompt
+        self.select_chunk_size = select_chunk_size
+        # Papers judged per prune_papers request; 1 keeps the original one-call-per-paper prompt
+        self.prune_batch_size = prune_batch_size
+        # Judge a title listed under several topics once for all of them (staged scheduler only,
+        # since the dataflow scheduler prunes each topic as soon as its selection is ready)
+        self.prune_cross_topic = prune_cross_topic
+        # Local relevance scores below prefilter_low reject a paper, and scores of at least
+        # prefilter_high accept it, without asking the LLM; None leaves that side to the LLM
+        self.prefilter_low = prefilter_low
+        self.prefilter_high = prefilter_high
+        # Ask for foundational topics and their resources in one request per paper
+        self.foundational_single_pass = foundational_single_pass
+        # Minimum shingle Jaccard similarity for two reference titles to be merged before counting
+        self.title_similarity = title_similarity
+        # Directory for per-project stage checkpoints; None disables checkpointing
+        self.checkpoint_dir = checkpoint_dir
+        # Seconds each stage may wait for stragglers, keyed by checkpoint stage name; a stage that runs
+        # out returns what finished and lists the rest in its output's missing. The dataflow scheduler
+        # applies a budget to each concept's wait on a stage, and to the final wait on foundational topics
+        self.stage_budgets = dict(stage_budgets or {})
+        # Stream survey responses so each survey paper's seminal-works query starts as soon as the
+        # paper arrives rather than when the whole list is done (dataflow scheduler only)
+        self.stream = stream
+        # Directory of an offline citation index (see utils/citation_index.py) that answers the
+        # seminal-works stage for the survey papers it covers; None asks the LLM for every paper
+        self.citation_index = citation_index
+        # SQLite file of the knowledge graph shared across projects and runs (see utils/graph_store.py);
+        # each project's graph is upserted into it after it is built. None keeps graphs in memory only
+        self.graph_store = graph_store
+        # Multi-hop citation expansion (see utils/citation_expansion.py): citation hops followed from
+        # the survey papers, 1 keeping the single seminal-works hop. Per concept, at most
+        # expansion_max_nodes references are expanded, at most expansion_max_calls of them through
+        # the LLM (None for no cap), expansion_width at a time
+        self.expansion_depth = expansion_depth
+        self.expansion_max_nodes = expansion_max_nodes
+        self.expansion_max_calls = expansion_max_calls
+        self.expansion_width = expansion_width
+        # Partial results as they arrive (see utils/events.py): appended as JSON lines to events_path,
+        # and served with a live graph page on events_port (0 picks a free port). None disables each
+        self.events_path = events_path
+        self.events_port = events_port
+        self._events = None
+        # Durable queue (see utils/work_queue.py), a SQLite path or backend URL, through which the
+        # seminal-works, pruning and foundational-topic units run on worker processes; None runs
+        # them in this process
+        self.work_queue = work_queue
+        self._work_queue_client = None
+
+    def budget(self, stage):
+        return self.stage_budgets.get(stage)
+
+    def prefilter(self, specialized_topics, project_summary):
+        """
+        A fresh RelevancePrefilter for one project, or None when no threshold is set.
+        """
+        if self.prefilter_low is None and self.prefilter_high is None:
+            return None
+        return RelevancePrefilter(specialized_topics, project_summary, self.prefilter_low, self.prefilter_high)
+
+    def expansion(self, gpt_agent, specialized_topics, project_summary):
+        """
+        The citation expansion of one project, an async (concept, results, budget=None) ->
+        (expanded, stats), or None when expansion_depth keeps a single hop.
+        """
+        if self.expansion_depth <= 1:
+            return None
+        return partial(
+            aexpand_citations,
+            gpt_agent=gpt_agent,
+            citation_index=self.citations(),
+            work_queue=self.work_queue_client(gpt_agent),
+            scorer=RelevancePrefilter(specialized_topics, project_summary),
+            max_depth=self.expansion_depth,
+            max_nodes=self.expansion_max_nodes,
+            max_calls=self.expansion_max_calls,
+            width=self.expansion_width,
+        )
+
+    def events(self):
+        """
+        The run's event stream, opened (and its server started) on first use, or None when neither
+        an events file nor an events port is configured.
+        """
+        if self.events_path is None and self.events_port is None:
+            return None
+        if self._events is None:
+            self._events = EventStream(self.events_path)
+            if self.events_port is not None:
+                print(f"Live graph: {self._events.serve(self.events_port)}")
+        return self._events
+
+    def project_events(self, project, project_title, core_concepts):
+        """
+        The events of one project, or None when no event stream is configured.
+        """
+        stream = self.events()
+        return ProjectEvents(stream, project, project_title, core_concepts) if stream is not None else None
+
+    def work_queue_client(self, gpt_agent):
+        """
+        The run's WorkQueueClient, or None when no work queue is configured. Task keys include
+        gpt_agent's model routing, temperature, structured-output mode and call deadline, which
+        workers are expected to share, and the versions of the queued stages' prompts. When gpt_agent bypasses or refreshes its response
+        cache, the keys are scoped to this run so results queued by earlier runs are not reused.
+        """
+        if self.work_queue is None:
+            return None
+        if self._work_queue_client is None:
+            scope = [
+                gpt_agent.routing(),
+                gpt_agent.temperature,
+                gpt_agent.structured_output,
+                gpt_agent.call_deadline,
+                {stage: stage_version(stage) for stage in ("seminal_counts", "pruned", "foundational_topics")},
+            ]
+            if gpt_agent.cache is None or gpt_agent.refresh_cache:
+                scope.append(uuid.uuid4().hex)
+            namespace = json.dumps(scope, sort_keys=True)
+            self._work_queue_client = WorkQueueClient(load_work_queue(self.work_queue), namespace)
+        return self._work_queue_client
+
+    def citations(self):
+        """
+        The opened citation index, or None when none is configured.
+        """
+        return load_citation_index(self.citation_index) if self.citation_index else None
+
+    def graphs(self):
+        """
+        The opened graph store, or None when none is configured.
+        """
+        return load_graph_store(self.graph_store) if self.graph_store else None
@@ -0,0 +1,388 @@
+from textwrap import dedent
+
+from utils import response_formats
+
+# Every prompt the pipeline sends, as versioned templates. Providers cache the longest prompt
+# prefix they have seen recently, so each template is split by how often its text changes:
+#   instructions - static for the template, sent as the request's instructions
+#   context      - fixed for a whole project run (project summary, concept lists), first in the input
+#   item         - the per-call content (a paper, a topic, a list), last in the input
+# Calls of one stage then share everything up to their item, and calls of one project share the
+# context as well. Bump a template's version whenever its text changes: the versions of a
+# stage's templates are part of that stage's checkpoint fingerprint.
+
+JSON_ONLY = "Do NOT include tick marks or any other formatting. Just ONLY provide the JSON object."
+
+
+class Prompt:
+    """
+    A versioned prompt template; render() fills in the context and item fields.
+    """
+
+    def __init__(self, name, version, instructions, item, context="", response_format=None):
+        self.name = name
+        self.version = version
+        self.instructions = dedent(instructions).strip()
+        self.context = dedent(context).strip()
+        self.item = dedent(item).strip()
+        self.response_format = response_format
+
+    def render(self, **fields):
+        """
+        Return (instructions, input_text) for one call.
+        """
+        parts = [self.context.format(**fields)] if self.context else []
+        parts.append(self.item.format(**fields))
+        return self.instructions, "\n\n".join(parts)
+
+
+PROMPTS = {}
+
+
+def register(prompt):
+    if prompt.name in PROMPTS:
+        raise ValueError(f"Prompt '{prompt.name}' is already registered.")
+    PROMPTS[prompt.name] = prompt
+    return prompt
+
+
+def get_prompt(name):
+    return PROMPTS[name]
+
+
+# Templates used by each checkpointed stage
+STAGE_PROMPTS = {
+    "concepts": ["concepts"],
+    "survey_papers": ["survey_papers"],
+    "seminal_counts": ["seminal_works"],
+    "selected": ["top_papers"],
+    "pruned": ["prune_paper", "prune_batch", "prune_topics"],
+    "foundational_topics": ["foundational_topics", "foundational_topics_with_resources", "resources"],
+}
+
+
+def stage_version(stage):
+    """
+    Versions of the templates a stage sends, e.g. {"survey_papers": 2}.
+    """
+    return {name: PROMPTS[name].version for name in STAGE_PROMPTS[stage]}
+
+
+FOUNDATIONAL_TOPIC_RULES = """
+    Foundational concepts are foundational to the core concepts listed in the input and provide the necessary theoretical or technical background
+    to understand and work with the core concepts. Foundational topics should not include core concepts.
+    They are more advanced than prerequisites but not as specific as core concepts.
+    Examples: Machine Learning, Deep Learning, Robotic Kinematics, Control Theory.
+    Foundational topics should not be too basic either.
+    Too basic: Linear Algebra, Calculus, Classical Mechanics.
+"""
+
+PROJECT_CONTEXT = """
+    Specialized topics of the project: {specialized_topics}
+    Project: {project_summary}
+"""
+
+register(
+    Prompt(
+        "concepts",
+        2,
+        f"""
+        You are a helpful assistant.
+        Analyze the project description given in the input and extract the following information:
+
+        - Project Title: A concise title summarizing the project.
+        - Project Summary: A brief summary of the project in 2-3 sentences.
+        - Prerequisites: These are the static knowledge, skills, or tools that the user must already possess before engaging with the project.
+          They are typically foundational and do not require further explanation within the context of the project.
+          Examples include basic programming skills, familiarity with Python, linear algebra, or basic calculus.
+          Avoid listing concepts that are introduced or developed as part of the project itself.
+        - Fundamental Concepts: These are foundational to the core concepts and provide the necessary theoretical or technical background
+          to understand and work with the core concepts. They are more advanced than prerequisites but not as specific as core concepts.
+          Examples: Machine Learning, Deep Learning, Robotic Kinematics, Control Theory.
+        - Core Concepts: These are the central focus areas of the project and represent the main topics or themes the project is addressing.
+          They are typically the tags or keywords associated with the project.
+          Examples: Reinforcement Learning (RL), Computer Vision, Robotics.
+        - Specialized Concepts: These are specific applications or implementations of the core concepts within the context of the project.
+          They are highly specific and often represent advanced or applied topics.
+          Examples: RL for Grasping Strategies, Sim-to-Real Transfer, Affordance-Based Manipulation.
+
+        Provide the output in the following JSON format. {JSON_ONLY}
+        {{
+            "project_title": "<project title>",
+            "project_summary": "<project summary>",
+            "prerequisites": ["<list of concepts>"],
+            "fundamental_concepts": ["<list of concepts>"],
+            "core_concepts": ["<list of concepts>"],
+            "specialized_concepts": ["<list of concepts>"]
+        }}
+        """,
+        """
+        Project Description:
+        {description}
+        """,
+        response_format=response_formats.CONCEPTS,
+    )
+)
+
+register(
+    Prompt(
+        "survey_papers",
+        2,
+        f"""
+        You are a helpful assistant.
+        Provide 6 survey papers on the topic given in the input in the following JSON format. {JSON_ONLY}
+        {{
+            "papers": [
+                {{
+                    "title": "<title>"
+                }}
+            ]
+        }}
+        """,
+        "Topic: {concept}",
+        response_format=response_formats.SURVEY_PAPERS,
+    )
+)
+
+register(
+    Prompt(
+        "seminal_works",
+        2,
+        f"""
+        You are a helpful assistant.
+        For the paper titled in the input, provide the 5 most seminal works (including papers and textbooks) in the field that are related to this paper and would likely be cited.
+        If you cannot access external databases, respond with 5 hypothetical seminal works based on the paper title in the following example JSON format (not with this content, but with the same structure).
+        {JSON_ONLY}
+        {{
+            "seminal_works": [
+                {{"title": "Seminal Work 1", "year": 1998}},
+                {{"title": "Seminal Work 2", "year": 2013}},
+                {{"title": "Seminal Work 3", "year": 2015}},
+                {{"title": "Seminal Work 4", "year": 2020}},
+                {{"title": "Seminal Work 5", "year": 2021}}
+            ]
+        }}
+        """,
+        "Paper: {title}",
+        response_format=response_formats.SEMINAL_WORKS,
+    )
+)
+
+register(
+    Prompt(
+        "top_papers",
+        2,
+        f"""
+        You are a helpful assistant.
+        Assess the relevance of the papers listed in the input to the topic given in the input, in the context of the project described there.
+        Rank the papers by relevance and provide the most relevant papers, as many as the input asks for, in a JSON array format.
+        Respond in the following format. {JSON_ONLY}
+        {{
+            "top_papers": ["<paper title>", "<paper title>", ...]
+        }}
+        """,
+        """
+        Topic: {topic}
+        Provide the top {top_k} of these papers.
+        Papers: {papers}
+        """,
+        context="Project: {project_summary}",
+        response_format=response_formats.TOP_PAPERS,
+    )
+)
+
+register(
+    Prompt(
+        "prune_paper",
+        2,
+        """
+        You are a helpful assistant.
+        The input lists the project's specialized topics, the project itself, a topic and a paper.
+        Determine if the paper is directly relevant and truly essential to either one of these:
+        1. general understanding of the topic
+        2. the project.
+
+        Respond with ONLY the word "yes" (nothing other than the word) if it is relevant or beneficial to understanding the topic in general.
+        Otherwise respond with ONLY the word "no" (nothing other than the word).
+        """,
+        """
+        Topic: {topic}
+        Paper: {paper}
+        """,
+        context=PROJECT_CONTEXT,
+    )
+)
+
+register(
+    Prompt(
+        "prune_batch",
+        2,
+        f"""
+        You are a helpful assistant.
+        The input lists the project's specialized topics, the project itself, a topic and numbered papers.
+        For each numbered paper, determine if it is directly relevant and truly essential to either one of these:
+        1. general understanding of the topic
+        2. the project.
+
+        Answer "yes" if the paper is relevant or beneficial to understanding the topic in general, otherwise answer "no".
+
+        Respond in the following JSON format with exactly one verdict per paper, using the paper numbers from the input.
+        {JSON_ONLY}
+        {{
+            "verdicts": [
+                {{"index": 1, "relevant": "yes"}},
+                {{"index": 2, "relevant": "no"}}
+            ]
+        }}
+        """,
+        """
+        Topic: {topic}
+
+        Papers:
+        {paper_list}
+        """,
+        context=PROJECT_CONTEXT,
+        response_format=response_formats.BATCH_VERDICTS,
+    )
+)
+
+register(
+    Prompt(
+        "prune_topics",
+        2,
+        f"""
+        You are a helpful assistant.
+        The input lists the project's specialized topics, the project itself, a paper and numbered topics.
+        Determine if the paper is directly relevant and truly essential to:
+        - the project.
+        - the general understanding of each of the numbered topics.
+
+        Respond in the following JSON format with "yes" or "no" for the project and exactly one verdict per topic, using the topic numbers from the input.
+        {JSON_ONLY}
+        {{
+            "project_relevant": "yes",
+            "verdicts": [
+                {{"index": 1, "relevant": "yes"}},
+                {{"index": 2, "relevant": "no"}}
+            ]
+        }}
+        """,
+        """
+        Paper: {paper}
+
+        Topics:
+        {topic_list}
+        """,
+        context=PROJECT_CONTEXT,
+        response_format=response_formats.TOPIC_VERDICTS,
+    )
+)
+
+FOUNDATIONAL_CONTEXT = """
+    Existing foundational topics: {existing_topics}
+    Core concepts: {core_concepts}
+"""
+
+register(
+    Prompt(
+        "foundational_topics",
+        2,
+        f"""
+        You are a helpful assistant.
+        Identify all foundational topics required to understand the paper given in the input.
+        Include both the existing foundational topics listed in the input and any additional foundational topics not listed.
+        {FOUNDATIONAL_TOPIC_RULES}
+        Respond in the following JSON format. {JSON_ONLY}
+        {{
+            "foundational_topics": [
+                {{
+                    "topic": "<topic>"
+                }},
+                {{
+                    "topic": "<topic>"
+                }}
+            ]
+        }}
+        """,
+        "Paper: {paper}",
+        context=FOUNDATIONAL_CONTEXT,
+        response_format=response_formats.FOUNDATIONAL_TOPICS,
+    )
+)
+
+register(
+    Prompt(
+        "foundational_topics_with_resources",
+        2,
+        f"""
+        You are a helpful assistant.
+        Identify all foundational topics required to understand the paper given in the input.
+        Include both the existing foundational topics listed in the input and any additional foundational topics not listed.
+        {FOUNDATIONAL_TOPIC_RULES}
+        For each topic, recommend a research paper, textbook, or resource that provides
+        a comprehensive introduction to the topic.
+        Respond in the following JSON format. {JSON_ONLY}
+        {{
+            "foundational_topics": [
+                {{
+                    "topic": "<topic>",
+                    "resource": "<resource title and author or link>"
+                }},
+                {{
+                    "topic": "<topic>",
+                    "resource": "<resource title and author or link>"
+                }}
+            ]
+        }}
+        """,
+        "Paper: {paper}",
+        context=FOUNDATIONAL_CONTEXT,
+        response_format=response_formats.FOUNDATIONAL_TOPICS_WITH_RESOURCES,
+    )
+)
+
+register(
+    Prompt(
+        "resources",
+        2,
+        f"""
+        You are a helpful assistant.
+        For each numbered foundational topic in the input, recommend a research paper, textbook, or resource that provides
+        a comprehensive introduction to the topic.
+
+        Respond in the following JSON format with one entry per topic, using the topic numbers from the input.
+        {JSON_ONLY}
+        {{
+            "resources": [
+                {{
+                    "index": 1,
+                    "topic": "<topic>",
+                    "resource": "<resource title and author or link>"
+                }}
+            ]
+        }}
+        """,
+        """
+        Topics:
+        {topic_list}
+        """,
+        response_format=response_formats.RESOURCES,
+    )
+)
+
+register(
+    Prompt(
+        "explain_relevance",
+        2,
+        """
+        You are a helpful assistant.
+        Explain why the paper given in the input is relevant to the topic given in the input in the context of this project.
+        Provide a concise explanation of its significance and how it contributes to the understanding or advancement of the topic.
+        """,
+        """
+        Topic: {topic}
+        Paper: {paper}
+        """,
+        context="Project: {project_summary}",
+    )
+)
@@ -1,33 +1,271 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
 
+from utils.budget import PartialResult, gather_within
+from utils.prompts import get_prompt
+from utils.title_index import normalize_title
 
-def prune_papers(specialized_topics, evaluation_papers, gpt_agent, project_summary):
+PRUNE_PAPER_PROMPT = get_prompt("prune_paper")
+PRUNE_BATCH_PROMPT = get_prompt("prune_batch")
+PRUNE_TOPICS_PROMPT = get_prompt("prune_topics")
+
+
+async def ajudge_paper(topic, paper, specialized_topics, gpt_agent, project_summary):
     """
-    Prune evaluation papers using specialized topics.
+    Ask the agent whether a single paper is relevant; return the paper if so, otherwise None.
+    A request that still fails after the agent's retries raises rather than counting as a "no",
+    so callers can report the paper as unjudged.
     """
-    pruned_papers = {}
+    instructions, input_text = PRUNE_PAPER_PROMPT.render(
+        specialized_topics=", ".join(specialized_topics), project_summary=project_summary, topic=topic, paper=paper
+    )
+    response = await gpt_agent.aquery(instructions, input_text, stage="prune_papers")
+    response = response.strip().lower()
+    print(f"Response for paper '{paper}': {response}")
+    if response not in ("yes", "no"):
+        gpt_agent.parse_failed("prune_papers")
+    return paper if response == "yes" else None
 
-    def process_paper(topic, paper):
-        input_text = f"""
-        The project focuses on the following specialized topics: {', '.join(specialized_topics)}.
-        Determine if the paper titled '{paper}' is directly relevant and truly essential to either one of these:
-        1. general understanding of {topic}
-        2. the project: {project_summary}.
 
-        Respond with ONLY the word "yes" (nothing other than the word) if it is relevant or beneficial to understanding the topic in general.
-        Otherwise respond with ONLY the word "no" (nothing other than the word).
-        """
+def parse_batch_verdicts(response, count):
+    """
+    Parse a batched verdict response into a list of booleans, one per paper in prompt order.
+    Raises ValueError if the response is not valid JSON or does not cover every paper.
+    """
+    try:
+        data = json.loads(response)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in batch response: {e}")
+
+    verdicts = {}
+    for entry in data.get("verdicts", []) if isinstance(data, dict) else []:
         try:
-            response = gpt_agent.query("You are a helpful assistant.", input_text).strip().lower()
-            print(f"Response for paper '{paper}': {response}")
-            return paper if response == "yes" else None
-        except Exception as e:
-            print(f"Error processing paper '{paper}': {e}")
-            return None
-
-    with ThreadPoolExecutor() as executor:
+            index = int(entry["index"])
+            answer = str(entry["relevant"]).strip().lower()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if answer in ("yes", "no") and 1 <= index <= count:
+            verdicts[index] = answer == "yes"
+
+    if len(verdicts) != count:
+        raise ValueError(f"Batch response covered {len(verdicts)} of {count} papers")
+    return [verdicts[index] for index in range(1, count + 1)]
+
+
+async def ajudge_paper_batch(topic, papers, specialized_topics, gpt_agent, project_summary):
+    """
+    Judge several papers for one topic in a single request.
+    If the response cannot be parsed, the batch is split in half and retried; a single paper
+    falls back to the per-paper prompt. Returns one entry per paper: the paper or None.
+    Failed requests raise, as in ajudge_paper.
+    """
+    if len(papers) == 1:
+        return [await ajudge_paper(topic, papers[0], specialized_topics, gpt_agent, project_summary)]
+
+    paper_list = "\n".join(f"{index}. {paper}" for index, paper in enumerate(papers, start=1))
+    instructions, input_text = PRUNE_BATCH_PROMPT.render(
+        specialized_topics=", ".join(specialized_topics),
+        project_summary=project_summary,
+        topic=topic,
+        paper_list=paper_list,
+    )
+    try:
+        response = await gpt_agent.aquery(
+            instructions,
+            input_text,
+            stage="prune_papers",
+            response_format=PRUNE_BATCH_PROMPT.response_format,
+        )
+        verdicts = parse_batch_verdicts(response, len(papers))
+    except ValueError as e:
+        gpt_agent.parse_failed("prune_papers")
+        print(f"Error processing batch of {len(papers)} papers for topic '{topic}', splitting: {e}")
+        middle = len(papers) // 2
+        halves = await asyncio.gather(
+            ajudge_paper_batch(topic, papers[:middle], specialized_topics, gpt_agent, project_summary),
+            ajudge_paper_batch(topic, papers[middle:], specialized_topics, gpt_agent, project_summary),
+        )
+        return halves[0] + halves[1]
+
+    for paper, relevant in zip(papers, verdicts):
+        print(f"Response for paper '{paper}': {'yes' if relevant else 'no'}")
+    return [paper if relevant else None for paper, relevant in zip(papers, verdicts)]
+
+
+async def ajudge_paper_topics(paper, topics, specialized_topics, gpt_agent, project_summary):
+    """
+    Judge one paper that appears under several topics in a single request.
+    The original prompt accepts a paper if it is essential to the topic or to the project, so the
+    project half of the verdict is asked once and shared by every topic. Falls back to one
+    request per topic if the response cannot be parsed. Returns one entry per topic: the paper or None.
+    Failed requests raise, as in ajudge_paper.
+    """
+    topic_list = "\n".join(f"{index}. {topic}" for index, topic in enumerate(topics, start=1))
+    instructions, input_text = PRUNE_TOPICS_PROMPT.render(
+        specialized_topics=", ".join(specialized_topics),
+        project_summary=project_summary,
+        paper=paper,
+        topic_list=topic_list,
+    )
+    try:
+        response = await gpt_agent.aquery(
+            instructions,
+            input_text,
+            stage="prune_papers",
+            response_format=PRUNE_TOPICS_PROMPT.response_format,
+        )
+        topic_verdicts = parse_batch_verdicts(response, len(topics))
+        project_relevant = str(json.loads(response).get("project_relevant", "")).strip().lower() == "yes"
+    except ValueError as e:
+        gpt_agent.parse_failed("prune_papers")
+        print(f"Error processing paper '{paper}' across {len(topics)} topics, judging each topic: {e}")
+        return await asyncio.gather(
+            *(ajudge_paper(topic, paper, specialized_topics, gpt_agent, project_summary) for topic in topics)
+        )
+
+    verdicts = [project_relevant or relevant for relevant in topic_verdicts]
+    print(f"Response for paper '{paper}' across topics {topics}: {verdicts}")
+    return [paper if relevant else None for relevant in verdicts]
+
+
+async def ajudge_topic_papers(topic, papers, specialized_topics, gpt_agent, project_summary, batch_size=1):
+    """
+    Judge every paper of a topic concurrently, batch_size papers per request.
+    Returns one entry per paper: the paper if relevant, otherwise None.
+    """
+    if batch_size <= 1:
+        return await asyncio.gather(
+            *(ajudge_paper(topic, paper, specialized_topics, gpt_agent, project_summary) for paper in papers)
+        )
+
+    batches = [papers[start:start + batch_size] for start in range(0, len(papers), batch_size)]
+    results = await asyncio.gather(
+        *(ajudge_paper_batch(topic, batch, specialized_topics, gpt_agent, project_summary) for batch in batches)
+    )
+    return [verdict for batch in results for verdict in batch]
+
+
+def plan_judgements(evaluation_papers, cross_topic=False):
+    """
+    Group the (topic, paper) pairs to judge: returns (occurrences, per_topic, shared), where
+    occurrences maps each normalized title to its spelling under each topic, per_topic lists the
+    papers judged on their own per topic and shared lists (normalized title, topics) judged once
+    across topics.
+    """
+    occurrences = {}
+    for topic, papers in evaluation_papers.items():
+        for paper in papers:
+            occurrences.setdefault(normalize_title(paper), {}).setdefault(topic, paper)
+
+    per_topic = {topic: [] for topic in evaluation_papers}
+    shared = []
+    for key, topics in occurrences.items():
+        if cross_topic and len(topics) > 1:
+            shared.append((key, list(topics)))
+        else:
+            for topic, paper in topics.items():
+                per_topic[topic].append(paper)
+    return occurrences, per_topic, shared
+
+
+def request_count(per_topic, shared, batch_size=1):
+    """
+    Requests needed to judge a plan from plan_judgements.
+    """
+    size = max(batch_size, 1)
+    return sum(-(-len(papers) // size) for papers in per_topic.values()) + len(shared)
+
+
+async def aprune_papers(
+    specialized_topics,
+    evaluation_papers,
+    gpt_agent,
+    project_summary,
+    batch_size=1,
+    cross_topic=False,
+    budget=None,
+    prefilter=None,
+    work_queue=None,
+):
+    """
+    Prune evaluation papers using specialized topics; every (topic, paper) pair across all topics
+    is submitted at once. Spellings of a title that differ only in case or punctuation are judged
+    once per topic. With cross_topic, a title listed under several topics is judged in one request
+    for all of them. With batch_size > 1, each request carries up to batch_size papers of one topic.
+    With a RelevancePrefilter, papers it scores outside its uncertain band are decided locally and
+    only the rest are sent to the agent.
+    Verdicts still pending after budget seconds, or whose requests failed, are listed as
+    (topic, paper) pairs in the result's missing, and those papers are left out.
+    With a work_queue (a WorkQueueClient), each request's judgements run as a queued task on a worker.
+    """
+    judge_batch = work_queue.ajudge_paper_batch if work_queue is not None else ajudge_paper_batch
+    judge_topics = work_queue.ajudge_paper_topics if work_queue is not None else ajudge_paper_topics
+    # Verdicts keyed by (topic, normalized title), reused for every occurrence
+    verdicts = {}
+    to_judge = evaluation_papers
+    if prefilter is not None:
+        to_judge = {}
         for topic, papers in evaluation_papers.items():
-            futures = {executor.submit(process_paper, topic, paper): paper for paper in papers}
-            pruned_papers[topic] = [future.result() for future in futures if future.result()]
+            decided, to_judge[topic] = prefilter.split(topic, papers)
+            for paper, relevant in decided.items():
+                verdicts[(topic, normalize_title(paper))] = relevant
+        prefilter.requests_avoided += request_count(
+            *plan_judgements(evaluation_papers, cross_topic)[1:], batch_size
+        ) - request_count(*plan_judgements(to_judge, cross_topic)[1:], batch_size)
+    occurrences, per_topic, shared = plan_judgements(to_judge, cross_topic)
+
+    # Each unit is one request's worth of judgements: the (topic, normalized title) pairs it decides
+    units = []
+    size = max(batch_size, 1)
+    for topic, papers in per_topic.items():
+        for start in range(0, len(papers), size):
+            batch = papers[start:start + size]
+            units.append(
+                (
+                    [(topic, normalize_title(paper)) for paper in batch],
+                    judge_batch(topic, batch, specialized_topics, gpt_agent, project_summary),
+                )
+            )
+    for key, topics in shared:
+        units.append(
+            (
+                [(topic, key) for topic in topics],
+                judge_topics(occurrences[key][topics[0]], topics, specialized_topics, gpt_agent, project_summary),
+            )
+        )
+    results, missing = await gather_within(
+        budget, {index: judge for index, (pairs, judge) in enumerate(units)}, fail_soft=True
+    )
+
+    for index, unit_verdicts in results.items():
+        for pair, verdict in zip(units[index][0], unit_verdicts):
+            verdicts[pair] = verdict is not None
+    pending = {pair for index in missing for pair in units[index][0]}
+
+    pruned_papers = PartialResult()
+    for topic, papers in evaluation_papers.items():
+        pruned_papers[topic] = [paper for paper in papers if verdicts.get((topic, normalize_title(paper)))]
+        pruned_papers.missing.extend(
+            (topic, paper) for paper in papers if (topic, normalize_title(paper)) in pending
+        )
 
     return pruned_papers
+
+
+def prune_papers(
+    specialized_topics, evaluation_papers, gpt_agent, project_summary, batch_size=1, cross_topic=False, prefilter=None
+):
+    """
+    Prune evaluation papers using specialized topics.
+    """
+    return gpt_agent.run(
+        aprune_papers(
+            specialized_topics,
+            evaluation_papers,
+            gpt_agent,
+            project_summary,
+            batch_size,
+            cross_topic,
+            prefilter=prefilter,
+        )
+    )
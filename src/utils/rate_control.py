@@ -0,0 +1,274 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import openai
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at rate_per_minute, holding at most one minute's worth.
+
+    reserve() debits the bucket immediately (it may go negative) and returns how long the caller
+    must wait before its reservation is covered, so sync and async callers can share one bucket.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, amount):
+        """
+        Correct an earlier reservation once the real cost is known; positive amounts debit more.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for LLM calls that adapts to the provider with AIMD.
+
+    The limit starts low and grows by one per successful call until the first sign of congestion
+    (slow start), then by one per limit-many successes. A 429 halves it and a call much slower than
+    its stage's usual latency shrinks it slightly. Only calls that started after the last decrease
+    can trigger another one, so a burst of 429s from one window counts as a single signal.
+    The limit never exceeds max_limit.
+    """
+
+    def __init__(
+        self,
+        max_limit=32,
+        initial_limit=4,
+        min_limit=1,
+        backoff=0.5,
+        latency_backoff=0.9,
+        latency_tolerance=3.0,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.latency_tolerance = latency_tolerance
+        self.slow_start = True
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        self._last_decrease = float("-inf")
+        # Typical latency per stage, tracked from calls that were not flagged as slow
+        self._baseline = {}
+        self._lock = threading.Lock()
+        self._sync_waiters = threading.Condition(self._lock)
+        self._async_waiters = deque()
+        # Waiters handed a slot whose wake-up has not run yet
+        self._granted = set()
+
+    def _has_capacity(self):
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def _wake(self):
+        """
+        Hand free slots to waiting coroutines, then to waiting threads. Called with the lock held.
+        """
+        while self._async_waiters and self._has_capacity():
+            loop, waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self._granted.add(waiter)
+            loop.call_soon_threadsafe(_resolve, waiter)
+        if self._has_capacity():
+            self._sync_waiters.notify()
+
+    async def acquire(self):
+        """
+        Wait for a free slot; returns the start time to pass to release.
+        """
+        with self._lock:
+            if self._has_capacity() and not self._async_waiters:
+                self.in_flight += 1
+                return time.monotonic()
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self._async_waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                # The slot may have been granted just before the cancellation landed
+                if waiter in self._granted:
+                    self._granted.discard(waiter)
+                    self.in_flight -= 1
+                    self._wake()
+            raise
+        with self._lock:
+            self._granted.discard(waiter)
+        return time.monotonic()
+
+    def acquire_sync(self):
+        with self._lock:
+            while not self._has_capacity() or self._async_waiters:
+                self._sync_waiters.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started, stage=None, rate_limited=False, failed=False):
+        """
+        Free a slot and feed the call's outcome into the limit. Failures other than 429s
+        (connection errors, cancellation) say nothing about capacity and leave the limit alone.
+        """
+        latency = time.monotonic() - started
+        with self._lock:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self._decrease(started, self.backoff)
+            elif not failed:
+                baseline = self._baseline.get(stage)
+                if baseline is not None and latency > self.latency_tolerance * baseline:
+                    self._decrease(started, self.latency_backoff)
+                else:
+                    self._baseline[stage] = latency if baseline is None else 0.9 * baseline + 0.1 * latency
+                    self._increase()
+            self._wake()
+
+    def _increase(self):
+        self.limit = min(self.max_limit, self.limit + (1.0 if self.slow_start else 1.0 / self.limit))
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, started, factor):
+        if started < self._last_decrease:
+            return
+        self.slow_start = False
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.decreases += 1
+        self._last_decrease = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": round(self.limit, 1),
+                "peak_limit": round(self.peak_limit, 1),
+                "decreases": self.decreases,
+                "rate_limited": self.rate_limited,
+            }
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# Transient failures worth retrying; anything else (bad request, auth) is raised immediately
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def retry_delay(error, attempt, base_delay=0.5, max_delay=30.0):
+    """
+    Seconds to wait before retrying after error on the given attempt (0-based).
+    Honors Retry-After / retry-after-ms from the response, plus a little jitter so that callers
+    throttled together do not retry together; otherwise uses exponential backoff with full jitter.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = None
+    try:
+        if "retry-after-ms" in headers:
+            retry_after = float(headers["retry-after-ms"]) / 1000.0
+        elif "retry-after" in headers:
+            retry_after = float(headers["retry-after"])
+    except ValueError:
+        retry_after = None
+    if retry_after is not None and 0 <= retry_after <= max_delay:
+        return retry_after + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def estimate_tokens(*texts, completion_allowance=500):
+    """
+    Rough token count for rate limiting before the real usage is known (about 4 characters per token).
+    """
+    return sum(len(text) for text in texts) // 4 + completion_allowance
+
+
+class RateController:
+    """
+    Shared throttle for every LLM call: an adaptive concurrency limit, optional requests-per-minute
+    and tokens-per-minute buckets matching the account's rate limits, and the retry policy.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=32,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=6,
+        base_delay=0.5,
+        max_delay=30.0,
+    ):
+        self.limiter = AdaptiveLimiter(max_limit=max_concurrency)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _reserve(self, estimated_tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        return delay
+
+    def settle(self, estimated_tokens, response):
+        """
+        Replace a call's estimated token reservation with its actual usage.
+        """
+        usage = getattr(response, "usage", None)
+        if self.tokens is not None and usage is not None:
+            self.tokens.adjust((usage.input_tokens or 0) + (usage.output_tokens or 0) - estimated_tokens)
+
+    async def throttle(self, estimated_tokens):
+        """
+        Wait for the rate buckets, then for a concurrency slot; returns the slot's start time.
+        """
+        delay = self._reserve(estimated_tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        return await self.limiter.acquire()
+
+    def throttle_sync(self, estimated_tokens):
+        delay = self._reserve(estimated_tokens)
+        if delay:
+            time.sleep(delay)
+        return self.limiter.acquire_sync()
+
+    def should_retry(self, error, attempt):
+        return isinstance(error, RETRYABLE_ERRORS) and attempt < self.max_retries
+
+    def delay(self, error, attempt):
+        return retry_delay(error, attempt, self.base_delay, self.max_delay)
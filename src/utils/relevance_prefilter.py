@@ -0,0 +1,107 @@
+import zlib
+
+import numpy as np
+
+from utils.title_index import normalize_title
+
+# Words that say nothing about a paper's subject; they would otherwise dominate short titles
+STOPWORDS = frozenset(
+    """
+    a an and are as at be by for from in into is it its of on or over the their this to toward towards
+    under using via with without we our how what why when new study studies approach approaches
+    paper papers method methods towards based
+    """.split()
+)
+
+
+class RelevancePrefilter:
+    """
+    Local relevance score for prune_papers, so the LLM only judges the papers it is needed for.
+
+    Titles and reference texts (the topic, each specialized concept and the project summary) are
+    embedded by feature hashing: each non-stopword contributes its word and its character
+    trigrams, so "optimizer" and "optimization" still overlap, hashed into dimensions signed
+    buckets. A paper's score is the best cosine similarity between its title and any reference
+    text, computed for all papers of a topic in one matrix product. Papers scoring below low are
+    rejected and papers scoring at least high are accepted without a request; either threshold
+    may be None to never decide that way. The embedding of a title does not depend on the other
+    candidates, so a paper gets the same score whichever scheduler or batch it arrives in.
+    """
+
+    def __init__(self, specialized_topics, project_summary, low=None, high=None, dimensions=1 << 14):
+        if low is not None and high is not None and low > high:
+            raise ValueError("The prefilter's low threshold must not exceed its high threshold.")
+        self.low = low
+        self.high = high
+        self.dimensions = dimensions
+        self._references = self.embed(list(specialized_topics) + [project_summary or ""])
+        self._topic_references = {}
+        self.accepted = 0
+        self.rejected = 0
+        self.uncertain = 0
+        self.requests_avoided = 0
+
+    def _features(self, text):
+        features = []
+        for word in normalize_title(text).split():
+            if word in STOPWORDS or len(word) < 2:
+                continue
+            padded = f"<{word}>"
+            trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+            features.append((f"w:{word}", 1.0))
+            features.extend((f"c:{trigram}", 1.0 / len(trigrams)) for trigram in trigrams)
+        return features
+
+    def embed(self, texts):
+        """
+        L2-normalized hashed feature vectors of texts, one row per text.
+        """
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(digest % self.dimensions)
+                values.append(weight if digest & 0x80000000 else -weight)
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), values)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def scores(self, topic, papers):
+        """
+        Relevance score in [-1, 1] of each paper to topic or the project.
+        """
+        if not papers:
+            return np.zeros(0, dtype=np.float32)
+        if topic not in self._topic_references:
+            self._topic_references[topic] = np.vstack([self.embed([topic]), self._references])
+        return (self.embed(papers) @ self._topic_references[topic].T).max(axis=1)
+
+    def split(self, topic, papers):
+        """
+        Decide what can be decided locally. Returns (decided, uncertain): decided maps each paper
+        settled by a threshold to True (accept) or False (reject), uncertain lists the papers, in
+        order, that still need the LLM.
+        """
+        decided = {}
+        uncertain = []
+        for paper, score in zip(papers, self.scores(topic, papers)):
+            if self.low is not None and score < self.low:
+                decided[paper] = False
+                self.rejected += 1
+            elif self.high is not None and score >= self.high:
+                decided[paper] = True
+                self.accepted += 1
+            else:
+                uncertain.append(paper)
+                self.uncertain += 1
+        return decided, uncertain
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "sent_to_llm": self.uncertain,
+            "requests_avoided": self.requests_avoided,
+        }
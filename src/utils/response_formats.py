@@ -0,0 +1,65 @@
+# JSON schemas for the structured-output mode of each prompt. With Agent(structured_output=True)
+# the API constrains the response to the schema, so it always parses; each schema mirrors the
+# JSON shape the prompt already describes.
+
+
+def _object(**properties):
+    # Strict schemas require every property to be listed as required and no others allowed
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def _array(items):
+    return {"type": "array", "items": items}
+
+
+def _format(name, schema):
+    return {"type": "json_schema", "name": name, "strict": True, "schema": schema}
+
+
+_STRING = {"type": "string"}
+_VERDICT = {"type": "string", "enum": ["yes", "no"]}
+
+CONCEPTS = _format(
+    "project_concepts",
+    _object(
+        project_title=_STRING,
+        project_summary=_STRING,
+        prerequisites=_array(_STRING),
+        fundamental_concepts=_array(_STRING),
+        core_concepts=_array(_STRING),
+        specialized_concepts=_array(_STRING),
+    ),
+)
+
+SURVEY_PAPERS = _format("survey_papers", _object(papers=_array(_object(title=_STRING))))
+
+SEMINAL_WORKS = _format(
+    "seminal_works", _object(seminal_works=_array(_object(title=_STRING, year={"type": "integer"})))
+)
+
+TOP_PAPERS = _format("top_papers", _object(top_papers=_array(_STRING)))
+
+BATCH_VERDICTS = _format(
+    "batch_verdicts", _object(verdicts=_array(_object(index={"type": "integer"}, relevant=_VERDICT)))
+)
+
+TOPIC_VERDICTS = _format(
+    "topic_verdicts",
+    _object(project_relevant=_VERDICT, verdicts=_array(_object(index={"type": "integer"}, relevant=_VERDICT))),
+)
+
+FOUNDATIONAL_TOPICS = _format("foundational_topics", _object(foundational_topics=_array(_object(topic=_STRING))))
+
+FOUNDATIONAL_TOPICS_WITH_RESOURCES = _format(
+    "foundational_topics_with_resources",
+    _object(foundational_topics=_array(_object(topic=_STRING, resource=_STRING))),
+)
+
+RESOURCES = _format(
+    "resources", _object(resources=_array(_object(index={"type": "integer"}, topic=_STRING, resource=_STRING)))
+)
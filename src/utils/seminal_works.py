@@ -1,57 +1,114 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
 
+from utils.budget import PartialResult, gather_within
+from utils.prompts import get_prompt
+from utils.title_index import TitleIndex
 
-def query_seminal_works(survey_papers, gpt_agent):
+SEMINAL_WORKS_PROMPT = get_prompt("seminal_works")
+
+# Version of how references are counted, part of the seminal_counts checkpoint fingerprint
+COUNT_VERSION = 2
+
+
+async def afind_seminal_works(concept, paper, gpt_agent, citation_index=None):
     """
-    Query for seminal works for each paper in the survey papers.
+    Query for the seminal works cited by a single survey paper.
+    With a citation_index, a paper found in it is answered with its most cited references
+    and the LLM is only asked about papers the index does not cover.
     """
+    title = paper.get("title", "Unknown Title")
+    if citation_index is not None:
+        references = citation_index.seminal_works(title)
+        if references is not None:
+            return concept, title, references
+    try:
+        gpt_response = await gpt_agent.aquery(
+            *SEMINAL_WORKS_PROMPT.render(title=title),
+            stage="seminal_works",
+            response_format=SEMINAL_WORKS_PROMPT.response_format,
+        )
+        references = json.loads(gpt_response).get("seminal_works", [])
+        return concept, title, references
+    except json.JSONDecodeError:
+        gpt_agent.parse_failed("seminal_works")
+        print(f"Failed to parse GPT-4 response for paper: {title}")
+        return concept, title, []
+
+
+def count_seminal_works(results, title_index=None):
+    """
+    Aggregate (concept, title, references) results into per-topic reference counts.
+    Near-duplicate reference titles are merged into one canonical title through title_index, and
+    a canonical title counts at most once per citing paper, however many spellings it listed.
+    """
+    title_index = title_index if title_index is not None else TitleIndex()
     seminal_paper_counts_by_topic = {}
     top_references = {}
 
-    def find_seminal_works(concept, paper):
-        title = paper.get("title", "Unknown Title")
-        input_text = f"""
-        For the paper titled '{title}', provide the 5 most seminal works (including papers and textbooks) in the field that are related to this paper and would likely be cited. 
-        If you cannot access external databases, respond with 5 hypothetical seminal works based on the paper title in the following example JSON format (not with this content, but with the same structure):
-        Do NOT include tick marks or any other formatting. Just ONLY provide the JSON object: 
-        {{
-            "seminal_works": [
-                {{"title": "Seminal Work 1", "year": 1998}},
-                {{"title": "Seminal Work 2", "year": 2013}},
-                {{"title": "Seminal Work 3", "year": 2015}},
-                {{"title": "Seminal Work 4", "year": 2020}},
-                {{"title": "Seminal Work 5", "year": 2021}}
-            ]
-        }}
-        """
-        try:
-            gpt_response = gpt_agent.query("You are a helpful assistant.", input_text)
-            references = json.loads(gpt_response).get("seminal_works", [])
-            return concept, title, references
-        except json.JSONDecodeError:
-            print(f"Failed to parse GPT-4 response for paper: {title}")
-            return concept, title, []
+    for concept, title, references in results:
+        if concept not in top_references:
+            top_references[concept] = {}
+        if concept not in seminal_paper_counts_by_topic:
+            seminal_paper_counts_by_topic[concept] = {}
 
-    with ThreadPoolExecutor() as executor:
-        future_to_paper = {
-            executor.submit(find_seminal_works, concept, paper): (concept, paper)
-            for concept, papers in survey_papers.items()
-            for paper in papers.get("papers", [])
-        }
-        for future in future_to_paper:
-            concept, title, references = future.result()
-            if concept not in top_references:
-                top_references[concept] = {}
-            if concept not in seminal_paper_counts_by_topic:
-                seminal_paper_counts_by_topic[concept] = {}
-
-            top_references[concept][title] = references
-            for ref in references:
-                ref_title = ref["title"]
-                if ref_title in seminal_paper_counts_by_topic[concept]:
-                    seminal_paper_counts_by_topic[concept][ref_title] += 1
-                else:
-                    seminal_paper_counts_by_topic[concept][ref_title] = 1
+        top_references[concept][title] = references
+        cited = dict.fromkeys(title_index.canonical(ref["title"], ref.get("year")) for ref in references)
+        for ref_title in cited:
+            if ref_title in seminal_paper_counts_by_topic[concept]:
+                seminal_paper_counts_by_topic[concept][ref_title] += 1
+            else:
+                seminal_paper_counts_by_topic[concept][ref_title] = 1
 
     return seminal_paper_counts_by_topic, top_references
+
+
+async def aquery_seminal_works(
+    survey_papers, gpt_agent, title_index=None, budget=None, citation_index=None, expansion=None, work_queue=None
+):
+    """
+    Query for seminal works for each paper in the survey papers concurrently.
+    Survey papers still running after budget seconds, or whose requests failed, are listed, as
+    (concept, title) pairs, in the missing of the returned counts. With an expansion (PipelineConfig.expansion), each
+    concept's references are then followed further, within what is left of the budget, and the
+    expanded papers' references are counted as well. With a work_queue (a WorkQueueClient), each
+    survey paper's query runs as a queued task on a worker.
+    """
+    find = work_queue.afind_seminal_works if work_queue is not None else afind_seminal_works
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results, missing = await gather_within(
+        budget,
+        {
+            (concept, index): find(concept, paper, gpt_agent, citation_index)
+            for concept, papers in survey_papers.items()
+            for index, paper in enumerate(papers.get("papers", []))
+        },
+        fail_soft=True,
+    )
+    results = list(results.values())
+    if expansion is not None:
+        by_concept = {}
+        for result in results:
+            by_concept.setdefault(result[0], []).append(result)
+        remaining = budget - (loop.time() - started) if budget is not None else None
+        expansions = await asyncio.gather(
+            *(expansion(concept, concept_results, budget=remaining) for concept, concept_results in by_concept.items())
+        )
+        for concept, (expanded, stats) in zip(by_concept, expansions):
+            print(f"Citation expansion for '{concept}': {stats}")
+            results.extend(expanded)
+    counts, references = count_seminal_works(results, title_index)
+    missing = [
+        (concept, survey_papers[concept]["papers"][index].get("title", "Unknown Title")) for concept, index in missing
+    ]
+    return PartialResult(counts, missing=missing), references
+
+
+def query_seminal_works(survey_papers, gpt_agent, title_index=None, citation_index=None):
+    """
+    Query for seminal works for each paper in the survey papers.
+    """
+    return gpt_agent.run(
+        aquery_seminal_works(survey_papers, gpt_agent, title_index, citation_index=citation_index)
+    )
@@ -1,38 +1,74 @@
-from concurrent.futures import ThreadPoolExecutor
 import json
 
+from utils.budget import PartialResult, gather_within
+from utils.prompts import get_prompt
+from utils.title_index import normalize_title
 
-def query_survey_papers(core_concepts, gpt_agent):
+SURVEY_PROMPT = get_prompt("survey_papers")
+
+
+def survey_prompt(concept):
+    return SURVEY_PROMPT.render(concept=concept)
+
+
+async def afind_survey_papers(concept, gpt_agent):
     """
-    Query for survey papers for each core concept.
+    Query for survey papers on a single core concept.
+    """
+    gpt_response = await gpt_agent.aquery(
+        *survey_prompt(concept),
+        stage="survey_papers",
+        response_format=SURVEY_PROMPT.response_format,
+    )
+    try:
+        papers = json.loads(gpt_response)
+        print(f"Survey papers for {concept}:\n{json.dumps(papers, indent=4)}")
+        return concept, papers
+    except json.JSONDecodeError:
+        gpt_agent.parse_failed("survey_papers")
+        print(f"Failed to parse GPT-4 response for {concept}. Response: {gpt_response}")
+        return concept, {"papers": []}
+
+
+def paper_key(paper):
+    """
+    Identity of a streamed survey paper: its normalized title, or the whole entry without one.
+    """
+    title = paper.get("title") if isinstance(paper, dict) else None
+    return normalize_title(title) if isinstance(title, str) and title.strip() else json.dumps(paper, sort_keys=True)
+
+
+async def astream_survey_papers(concept, gpt_agent):
+    """
+    Streaming version of afind_survey_papers: yields each survey paper as soon as the model has
+    written it, so work on the first paper can start before the list is complete. A paper the
+    model lists again after a retried stream is yielded once, matched by normalized title.
     """
-    survey_papers = {}
-
-    def find_survey_papers(concept):
-        input_text = f"""
-        Provide 6 survey papers on the topic '{concept}' in the following JSON format.
-        Do NOT include tick marks or any other formatting. Just ONLY provide the JSON object: 
-        {{
-            "papers": [
-                {{
-                    "title": "<title>"
-                }}
-            ]
-        }}
-        """
-        try:
-            gpt_response = gpt_agent.query("You are a helpful assistant.", input_text)
-            print(f"Survey papers for {concept}:\n{json.dumps(json.loads(gpt_response), indent=4)}")
-            return concept, json.loads(gpt_response)
-        except json.JSONDecodeError:
-            print(f"Failed to parse GPT-4 response for {concept}. Response: {gpt_response}")
-            return concept, []
+    async for paper in gpt_agent.astream_items(
+        *survey_prompt(concept),
+        "papers",
+        stage="survey_papers",
+        response_format=SURVEY_PROMPT.response_format,
+        item_key=paper_key,
+    ):
+        if isinstance(paper, dict):
+            yield paper
 
+
+async def aquery_survey_papers(core_concepts, gpt_agent, budget=None):
+    """
+    Query for survey papers for each core concept concurrently.
+    Concepts still running after budget seconds are listed in the result's missing.
+    """
     print("Surveying for papers...")
-    with ThreadPoolExecutor() as executor:
-        future_to_concept = {executor.submit(find_survey_papers, concept): concept for concept in core_concepts}
-        for future in future_to_concept:
-            concept, papers = future.result()
-            survey_papers[concept] = papers
+    results, missing = await gather_within(
+        budget, {concept: afind_survey_papers(concept, gpt_agent) for concept in core_concepts}
+    )
+    return PartialResult(results.values(), missing=missing)
 
-    return survey_papers
+
+def query_survey_papers(core_concepts, gpt_agent):
+    """
+    Query for survey papers for each core concept.
+    """
+    return gpt_agent.run(aquery_survey_papers(core_concepts, gpt_agent))
@@ -0,0 +1,136 @@
+import hashlib
+import re
+import struct
+
+_YEAR_SUFFIX = re.compile(r"[\s,.:;-]*[\(\[]?((?:19|20)\d{2})[\)\]]?\s*$")
+
+
+def split_title_year(title):
+    """
+    Split a trailing publication year off a title: "Attention Is All You Need (2017)" -> (title, 2017).
+    """
+    match = _YEAR_SUFFIX.search(title)
+    if match and match.start() > 0:
+        return title[: match.start()].strip(), int(match.group(1))
+    return title.strip(), None
+
+
+def normalize_title(title):
+    """
+    Fold case, punctuation, whitespace and a trailing year so spelling variants of a title compare equal.
+    """
+    title, _ = split_title_year(title)
+    return " ".join(re.sub(r"[^\w\s]", " ", title.casefold()).split())
+
+
+def parse_year(year):
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return None
+
+
+class TitleIndex:
+    """
+    Canonicalizes near-duplicate paper titles to one display title.
+
+    Titles that normalize to the same string merge directly. Other titles are matched with
+    MinHash over character shingles and banded locality-sensitive hashing, so each lookup only
+    compares against a handful of candidates instead of every title seen so far. A candidate is
+    accepted when its shingle Jaccard similarity reaches threshold; the year breaks ties between
+    candidates, and a fuzzy match whose year conflicts by more than one is rejected.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3):
+        if num_perm % bands or num_perm % 16:
+            raise ValueError("num_perm must be a multiple of 16 and divisible by bands.")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Each keyed 64-byte blake2b digest yields 16 independent 32-bit hash functions; fixed
+        # keys keep signatures, and therefore canonical choices, stable across runs
+        self._hash_keys = [f"minhash-{i}".encode() for i in range(num_perm // 16)]
+        self._unpack = struct.Struct(f"<{num_perm}I").unpack
+        # Shingles recur across titles, so their hash rows are computed once
+        self._shingle_hashes = {}
+        self._by_key = {}
+        self._entries = []
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _shingles(self, key):
+        padded = f" {key} "
+        if len(padded) <= self.shingle_size:
+            return {padded}
+        return {padded[i : i + self.shingle_size] for i in range(len(padded) - self.shingle_size + 1)}
+
+    def _shingle_hash(self, shingle):
+        row = self._shingle_hashes.get(shingle)
+        if row is None:
+            row = self._unpack(
+                b"".join(hashlib.blake2b(shingle.encode(), digest_size=64, key=key).digest() for key in self._hash_keys)
+            )
+            self._shingle_hashes[shingle] = row
+        return row
+
+    def _signature(self, shingles):
+        return list(map(min, zip(*map(self._shingle_hash, shingles))))
+
+    def _band_keys(self, signature):
+        return [(band, tuple(signature[band * self.rows : (band + 1) * self.rows])) for band in range(self.bands)]
+
+    def canonical(self, title, year=None):
+        """
+        Return the canonical display title for title, registering it as a new entry if nothing matches.
+        """
+        bare_title, title_year = split_title_year(title)
+        year = parse_year(year) or title_year
+        key = normalize_title(bare_title)
+        if not key:
+            return title
+
+        if key in self._by_key:
+            entry = self._entries[self._by_key[key]]
+            if entry["year"] is None:
+                entry["year"] = year
+            return entry["title"]
+
+        shingles = self._shingles(key)
+        signature = self._signature(shingles)
+        band_keys = self._band_keys(signature)
+
+        best = None
+        candidates = {entry_id for band_key in band_keys for entry_id in self._buckets.get(band_key, ())}
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            similarity = len(shingles & entry["shingles"]) / len(shingles | entry["shingles"])
+            if similarity < self.threshold:
+                continue
+            if year is not None and entry["year"] is not None and abs(year - entry["year"]) > 1:
+                continue
+            same_year = year is not None and entry["year"] == year
+            rank = (same_year, similarity, -entry_id)
+            if best is None or rank > best[0]:
+                best = (rank, entry_id)
+
+        if best is not None:
+            entry_id = best[1]
+        else:
+            entry_id = len(self._entries)
+            self._entries.append({"title": bare_title, "year": year, "shingles": shingles})
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, []).append(entry_id)
+
+        self._by_key[key] = entry_id
+        return self._entries[entry_id]["title"]
+
+    def year(self, title):
+        """
+        Return the year recorded for a canonical title, if any.
+        """
+        entry_id = self._by_key.get(normalize_title(title))
+        return self._entries[entry_id]["year"] if entry_id is not None else None
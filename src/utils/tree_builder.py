@@ -1,5 +1,8 @@
 import networkx as nx
 
+# Version of the graph layout of nodes and edges, part of the graph checkpoint fingerprint
+GRAPH_VERSION = 2
+
 
 def build_tree_graph(
     project_title,
@@ -23,24 +26,34 @@ def build_tree_graph(
 
         # Add selected papers as children of core concepts
         for paper in pruned_selected_papers.get(concept, []):
-            # Extract foundational topics for the paper
-            paper_foundational_topics = [
-                topic["topic"] for topic in foundational_topics.get(paper, [])
-            ]
-            G.add_node(
-                paper,
-                group="seminal_paper",
-                metadata=f"Seminal Paper\nFoundational Topics: {', '.join(paper_foundational_topics) if paper_foundational_topics else 'None'}",
-            )
+            G.add_node(paper, **paper_attributes(foundational_topics.get(paper, [])))
             G.add_edge(concept, paper)
 
             # Add foundational topics as children of selected papers
             for topic in foundational_topics.get(paper, []):
-                G.add_node(
-                    topic["topic"],
-                    group="foundational_topic",
-                    metadata=f"Foundational Topic\nResource: {topic.get('resource', 'No resource available')}",
-                )
+                G.add_node(topic["topic"], **topic_attributes(topic))
                 G.add_edge(paper, topic["topic"])
 
     return G
+
+
+def paper_attributes(topics):
+    """
+    Node attributes of a seminal paper with the given foundational topics.
+    """
+    names = [topic["topic"] for topic in topics]
+    return {
+        "group": "seminal_paper",
+        "metadata": f"Seminal Paper\nFoundational Topics: {', '.join(names) if names else 'None'}",
+    }
+
+
+def topic_attributes(topic):
+    """
+    Node attributes of a foundational topic, a {"topic", "resource"} dict.
+    """
+    return {
+        "group": "foundational_topic",
+        "metadata": f"Foundational Topic\nResource: {topic.get('resource', 'No resource available')}",
+        "resource": topic.get("resource"),
+    }
@@ -1,31 +1,194 @@
-from pyvis.network import Network
+import json
+import os
+import shutil
 
+from utils.graph_layout import radial_layout
 
-def visualize(G, output_file="knowledge_graph.html"):
+# Define styles for different node types
+NODE_STYLES = {
+    "project_title": {"background": "#FFD700", "border": "#DAA520"},  # Gold
+    "core_concept": {"background": "#87CEEB", "border": "#4682B4"},  # Light Blue
+    "seminal_paper": {
+        "background": "#87CEEB",
+        "border": "#4682B4",
+    },  # Light Blue (same as core concepts)
+    "foundational_topic": {
+        "background": "#87CEEB",
+        "border": "#4682B4",
+    },  # Light Blue (same as core concepts)
+    "default": {"background": "white", "border": "black"},  # Default
+}
+
+# Graphs with more nodes than this open with every core concept collapsed into one cluster node
+COLLAPSE_THRESHOLD = 300
+
+# The vendored vis-network script, copied next to each page so it opens offline
+VIS_NETWORK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib", "vis-9.1.2")
+VIS_NETWORK_URL = "lib/vis-9.1.2/vis-network.min.js"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<script src="__VIS_URL__"></script>
+<style>
+  body { margin: 0; font-family: sans-serif; }
+  #controls { position: absolute; top: 8px; left: 8px; z-index: 1; }
+  #graph { width: 100%; height: 100vh; }
+</style>
+</head>
+<body>
+<div id="controls">
+  <button onclick="expandAll()">Expand all</button>
+  <button onclick="collapseAll()">Collapse all</button>
+  <span>Click a cluster to expand it; double-click a core concept to collapse it.</span>
+</div>
+<div id="graph"></div>
+<script src="__DATA_FILE__"></script>
+<script>
+  var data = GRAPH_DATA;
+  var nodes = data.labels.map(function (label, i) {
+    var group = data.groups[data.group[i]];
+    return {
+      id: i, label: label, title: data.titles[i], group: group, color: data.styles[group],
+      x: data.x[i], y: data.y[i], cluster: data.cluster[i]
+    };
+  });
+  var edges = [];
+  for (var i = 0; i < data.edges.length; i += 2) {
+    edges.push({ from: data.edges[i], to: data.edges[i + 1] });
+  }
+  var network = new vis.Network(
+    document.getElementById("graph"),
+    { nodes: new vis.DataSet(nodes), edges: new vis.DataSet(edges) },
+    {
+      layout: { improvedLayout: false },
+      physics: false,
+      nodes: { font: { multi: true, size: 20 }, size: 25, shape: "box", widthConstraint: { maximum: 200 } },
+      edges: { arrows: "to", smooth: false },
+      interaction: { hover: true, dragNodes: true, selectConnectedEdges: false, hideEdgesOnDrag: true }
+    }
+  );
+
+  function collapse(concept) {
+    var size = data.cluster.filter(function (c) { return c === concept; }).length;
+    network.cluster({
+      joinCondition: function (node) { return node.cluster === concept; },
+      clusterNodeProperties: {
+        id: "cluster:" + concept, label: data.labels[concept] + "\\n(" + size + " nodes)",
+        shape: "box", color: data.styles.core_concept, font: { size: 24 },
+        x: data.x[concept], y: data.y[concept], borderWidth: 3
+      }
+    });
+  }
+  function collapseAll() { data.concepts.forEach(function (concept) {
+    if (!network.isCluster("cluster:" + concept)) { collapse(concept); }
+  }); }
+  function expandAll() { data.concepts.forEach(function (concept) {
+    if (network.isCluster("cluster:" + concept)) { network.openCluster("cluster:" + concept); }
+  }); }
+  network.on("click", function (params) {
+    if (params.nodes.length === 1 && network.isCluster(params.nodes[0])) { network.openCluster(params.nodes[0]); }
+  });
+  network.on("doubleClick", function (params) {
+    if (params.nodes.length === 1 && data.concepts.indexOf(params.nodes[0]) >= 0) { collapse(params.nodes[0]); }
+  });
+  if (data.collapsed) { collapseAll(); }
+</script>
+</body>
+</html>
+"""
+
+
+def graph_data(G, collapse_threshold=COLLAPSE_THRESHOLD):
+    """
+    Compact, column-oriented description of G for the precomputed page: labels, hover titles,
+    group codes, fixed positions and a flat [source, target, ...] edge list, all indexed by node
+    number. Every node also records its level-of-detail cluster, the core concept whose subtree
+    it was laid out in (-1 for the root and for nodes outside any concept).
+    """
+    positions, parent = radial_layout(G)
+    nodes = list(positions)
+    index = {node: number for number, node in enumerate(nodes)}
+    groups = sorted({data.get("group", "default") for _, data in G.nodes(data=True)} | {"core_concept"})
+    concepts = [node for node in nodes if G.nodes[node].get("group") == "core_concept"]
+
+    def cluster(node):
+        while node is not None:
+            if G.nodes[node].get("group") == "core_concept":
+                return index[node]
+            node = parent.get(node)
+        return -1
+
+    return {
+        "labels": [str(node) for node in nodes],
+        "titles": [G.nodes[node].get("metadata", "") for node in nodes],
+        "groups": groups,
+        "group": [groups.index(G.nodes[node].get("group", "default")) for node in nodes],
+        "styles": {group: NODE_STYLES.get(group, NODE_STYLES["default"]) for group in groups},
+        "x": [positions[node][0] for node in nodes],
+        "y": [positions[node][1] for node in nodes],
+        "cluster": [cluster(node) for node in nodes],
+        "concepts": [index[node] for node in concepts],
+        "edges": [index[end] for edge in G.edges() for end in edge],
+        "collapsed": len(nodes) > collapse_threshold,
+    }
+
+
+def visualize(G, output_file="knowledge_graph.html", layout="precomputed"):
+    """
+    Write an interactive page for the tree graph to output_file.
+
+    The default "precomputed" layout places every node in Python (a radial tree around the
+    project title) and writes a page with physics turned off, so it opens at once however
+    large the graph is. The graph data goes to a sidecar output_file with a .graph.js suffix
+    (JSON assigned to GRAPH_DATA, which loads from file:// where fetching a .json would not), and
+    vis-network is copied from src/lib to a lib directory beside it.
+    Large graphs open with each core concept collapsed into a cluster that expands on click.
+    layout="physics" keeps the original pyvis page with forceAtlas2 simulated in the browser.
+    """
+    if layout == "physics":
+        return visualize_physics(G, output_file)
+
+    data_file = os.path.splitext(output_file)[0] + ".graph.js"
+    copy_vis_network(os.path.dirname(os.path.abspath(output_file)))
+    with open(data_file, "w", encoding="utf-8") as file:
+        file.write("var GRAPH_DATA = ")
+        json.dump(graph_data(G), file, ensure_ascii=False, separators=(",", ":"))
+        file.write(";\n")
+    title = next((str(node) for node, data in G.nodes(data=True) if data.get("group") == "project_title"), "")
+    page = (
+        PAGE_TEMPLATE.replace("__TITLE__", title.replace("<", "&lt;"))
+        .replace("__VIS_URL__", VIS_NETWORK_URL)
+        .replace("__DATA_FILE__", os.path.basename(data_file))
+    )
+    with open(output_file, "w", encoding="utf-8") as file:
+        file.write(page)
+
+
+def copy_vis_network(directory):
+    """
+    Copy the vendored vis-network script to VIS_NETWORK_URL under directory, unless it is there.
+    """
+    target = os.path.join(directory, *VIS_NETWORK_URL.split("/"))
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(os.path.join(VIS_NETWORK_DIR, "vis-network.min.js"), target)
+
+
+def visualize_physics(G, output_file="knowledge_graph.html"):
     """
     Visualize the tree graph using pyvis with full drag-and-drop functionality for nodes.
     Differentiate node types with distinct colors or appearances.
     """
-    net = Network(notebook=True, directed=True, height="600px", width="100%")
+    from pyvis.network import Network
 
-    # Define styles for different node types
-    node_styles = {
-        "project_title": {"background": "#FFD700", "border": "#DAA520"},  # Gold
-        "core_concept": {"background": "#87CEEB", "border": "#4682B4"},  # Light Blue
-        "seminal_paper": {
-            "background": "#87CEEB",
-            "border": "#4682B4",
-        },  # Light Blue (same as core concepts)
-        "foundational_topic": {
-            "background": "#87CEEB",
-            "border": "#4682B4",
-        },  # Light Blue (same as core concepts)
-        "default": {"background": "white", "border": "black"},  # Default
-    }
+    net = Network(notebook=True, directed=True, height="600px", width="100%")
 
     for node, data in G.nodes(data=True):
         node_type = data.get("group", "default")  # Use 'group' to determine type
-        style = node_styles.get(node_type, node_styles["default"])
+        style = NODE_STYLES.get(node_type, NODE_STYLES["default"])
         net.add_node(
             node,
             title=data.get("metadata", ""),
@@ -46,8 +209,8 @@ def visualize(G, output_file="knowledge_graph.html"):
               "enabled": false,
               "direction": "UD",
               "sortMethod": "directed",
-              "nodeSpacing": 200, 
-              "treeSpacing": 300 
+              "nodeSpacing": 200,
+              "treeSpacing": 300
             }
           },
           "nodes": {
@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from utils.foundational_topics import ResourceIndex, afind_foundational_for_paper
+from utils.prune_papers import ajudge_paper_batch, ajudge_paper_topics
+from utils.seminal_works import afind_seminal_works
+
+# Most ids per outcomes() query, below SQLite's bound-parameter limit
+_ID_CHUNK = 500
+
+
+class TaskFailed(Exception):
+    """
+    A queued task that failed on every attempt.
+    """
+
+
+class SQLiteWorkQueue:
+    """
+    Durable work queue of per-item pipeline tasks in one SQLite file, shared by a coordinator
+    and any number of worker processes on the same machine.
+
+    A task is a kind (see Worker.execute) and JSON arguments under an idempotency key: enqueuing
+    a key that already exists returns the existing task, so a restarted coordinator picks up
+    work that was finished or is still running, and only failed tasks and results older than
+    max_age_seconds are run again (finished tasks past that age are deleted as well). Workers
+    lease ready tasks for lease_seconds and renew the lease while the task runs; a task whose
+    lease runs out (its worker died) is leased again. A failed attempt is retried after an
+    exponential backoff from retry_delay, up to max_attempts attempts in all.
+
+    Other backends (see QUEUE_BACKENDS) implement the same methods: enqueue, lease, renew,
+    ack, fail, outcomes, running and stats.
+    """
+
+    def __init__(self, path, lease_seconds=120.0, max_attempts=3, retry_delay=1.0, max_age_seconds=7 * 24 * 3600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_age_seconds = max_age_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                args TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                not_before REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ready ON tasks (state, not_before)")
+
+    def enqueue(self, kind, args, key):
+        """
+        Add a task unless key is already queued; returns its id. A failed task, or one whose
+        result has expired, is reset to run again.
+        """
+        now = time.time()
+        expired = now - self.max_age_seconds if self.max_age_seconds else 0
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO tasks (key, kind, args, state, created_at) VALUES (?, ?, ?, 'pending', ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    state = 'pending', attempts = 0, not_before = 0, result = NULL, error = NULL,
+                    created_at = excluded.created_at, finished_at = NULL
+                WHERE tasks.state = 'failed' OR (tasks.state = 'done' AND tasks.finished_at < ?)
+                """,
+                (key, kind, json.dumps(args, ensure_ascii=False), now, expired),
+            )
+            return self._conn.execute("SELECT id FROM tasks WHERE key = ?", (key,)).fetchone()[0]
+
+    def lease(self, worker, limit=1):
+        """
+        Lease up to limit ready tasks to worker: pending ones past their retry backoff and leased
+        ones whose lease has run out. Returns (id, kind, args) tuples.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.max_age_seconds:
+                    self._conn.execute(
+                        "DELETE FROM tasks WHERE state IN ('done', 'failed') AND finished_at < ?",
+                        (now - self.max_age_seconds,),
+                    )
+                # An expired lease counts as a failed attempt
+                self._conn.execute(
+                    """
+                    UPDATE tasks SET state = 'failed', error = 'lease expired', finished_at = ?
+                    WHERE state = 'leased' AND not_before <= ? AND attempts >= ?
+                    """,
+                    (now, now, self.max_attempts),
+                )
+                rows = self._conn.execute(
+                    """
+                    SELECT id, kind, args FROM tasks
+                    WHERE state IN ('pending', 'leased') AND not_before <= ?
+                    ORDER BY id LIMIT ?
+                    """,
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    """
+                    UPDATE tasks SET state = 'leased', worker = ?, not_before = ?, attempts = attempts + 1
+                    WHERE id = ?
+                    """,
+                    [(worker, now + self.lease_seconds, task_id) for task_id, _, _ in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(task_id, kind, json.loads(args)) for task_id, kind, args in rows]
+
+    def renew(self, task_ids, worker):
+        """
+        Extend worker's leases on the given running tasks.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tasks SET not_before = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                [(time.time() + self.lease_seconds, task_id, worker) for task_id in task_ids],
+            )
+
+    def ack(self, task_id, result):
+        """
+        Record a task's result. The first result wins if an expired lease let two workers run it.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = 'done', result = ?, finished_at = ? WHERE id = ? AND state = 'leased'",
+                (json.dumps(result, ensure_ascii=False), time.time(), task_id),
+            )
+
+    def fail(self, task_id, worker, error):
+        """
+        Record worker's failed attempt: the task is retried after a backoff, or fails for good
+        once it has used max_attempts attempts.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE tasks SET
+                    state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    not_before = ? + ? * (1 << (attempts - 1)),
+                    error = ?,
+                    finished_at = CASE WHEN attempts >= ? THEN ? END
+                WHERE id = ? AND state = 'leased' AND worker = ?
+                """,
+                (self.max_attempts, now, self.retry_delay, error, self.max_attempts, now, task_id, worker),
+            )
+
+    def outcomes(self, task_ids):
+        """
+        The finished tasks among task_ids, as {id: (state, result, error)} with state "done" or "failed".
+        """
+        task_ids = list(task_ids)
+        finished = {}
+        with self._lock:
+            for start in range(0, len(task_ids), _ID_CHUNK):
+                chunk = task_ids[start:start + _ID_CHUNK]
+                rows = self._conn.execute(
+                    f"""
+                    SELECT id, state, result, error FROM tasks
+                    WHERE id IN ({', '.join('?' * len(chunk))}) AND state IN ('done', 'failed')
+                    """,
+                    chunk,
+                ).fetchall()
+                for task_id, state, result, error in rows:
+                    finished[task_id] = (state, json.loads(result) if result is not None else None, error)
+        return finished
+
+    def running(self):
+        """
+        Number of tasks under a lease that has not run out, that is, being run by a live worker.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state = 'leased' AND not_before > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            states = dict(self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+            retried = self._conn.execute("SELECT COUNT(*) FROM tasks WHERE attempts > 1").fetchone()[0]
+        return {state: states.get(state, 0) for state in ("pending", "leased", "done", "failed")} | {"retried": retried}
+
+
+# Queue backends by URL scheme. A backend is built from the rest of the URL and provides the
+# methods of SQLiteWorkQueue; a plain path opens a SQLite queue
+QUEUE_BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+@lru_cache(maxsize=None)
+def load_work_queue(url):
+    """
+    Open the queue at url (e.g. "queue.sqlite" or "sqlite:///tmp/queue.sqlite") once per process.
+    """
+    scheme, separator, location = url.partition("://")
+    if not separator:
+        return SQLiteWorkQueue(url)
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown work queue backend '{scheme}'; expected one of {sorted(QUEUE_BACKENDS)}")
+    return QUEUE_BACKENDS[scheme](location)
+
+
+class WorkQueueClient:
+    """
+    Coordinator side of the queue: runs the pipeline's per-item units as queued tasks.
+
+    The unit coroutines take the same arguments as the local functions they stand in for
+    (afind_seminal_works, ajudge_paper_batch, ajudge_paper_topics, ajudge_topic_papers and
+    afind_foundational_for_paper) and return the same values, so the schedulers can call either.
+    The agent and resource index arguments are ignored; workers bring their own. namespace goes
+    into every task key, so runs with different model settings do not share results.
+
+    Each client runs one poller at a time, which collects finished tasks every poll seconds. If
+    none of the awaited tasks finishes for idle_timeout seconds while no task in the queue is
+    under a live lease (no worker is running, or every worker died holding its leases), every
+    awaited task fails with TaskFailed rather than waiting forever. Queue calls run in a thread so they do not block the event loop.
+    """
+
+    def __init__(self, queue, namespace="", poll=0.1, idle_timeout=60.0):
+        self.queue = queue
+        self.namespace = namespace
+        self.poll = poll
+        self.idle_timeout = idle_timeout
+        self.submitted = 0
+        self._waiting = {}
+        self._poller = None
+
+    def _key(self, kind, args):
+        payload = json.dumps([self.namespace, kind, args], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def arun(self, kind, **args):
+        """
+        Enqueue a task and wait for its result; raises TaskFailed if it fails on every attempt.
+        """
+        task_id = await asyncio.to_thread(self.queue.enqueue, kind, args, self._key(kind, args))
+        self.submitted += 1
+        # A task submitted twice is waited on once
+        future = self._waiting.get(task_id)
+        if future is None:
+            future = self._waiting[task_id] = asyncio.get_running_loop().create_future()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        # Shielded so a caller that gives up (a stage budget) leaves the result to other waiters
+        return await asyncio.shield(future)
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        progress = loop.time()
+        while self._waiting:
+            outcomes = await asyncio.to_thread(self.queue.outcomes, list(self._waiting))
+            for task_id, (state, result, error) in outcomes.items():
+                future = self._waiting.pop(task_id)
+                if state == "done":
+                    future.set_result(result)
+                else:
+                    future.set_exception(TaskFailed(f"Task {task_id} failed: {error}"))
+            if outcomes:
+                progress = loop.time()
+            elif self.idle_timeout is not None and loop.time() - progress >= self.idle_timeout:
+                if await asyncio.to_thread(self.queue.running):
+                    progress = loop.time()
+                else:
+                    self._abandon()
+            await asyncio.sleep(self.poll)
+
+    def _abandon(self):
+        waiting, self._waiting = self._waiting, {}
+        for task_id, future in waiting.items():
+            if not future.done():
+                future.set_exception(
+                    TaskFailed(f"Task {task_id} was not run: no worker leased a task for {self.idle_timeout}s")
+                )
+
+    async def afind_seminal_works(self, concept, paper, gpt_agent=None, citation_index=None):
+        # The coordinator's citation index answers what it covers without queueing a task
+        if citation_index is not None:
+            references = citation_index.seminal_works(paper.get("title", "Unknown Title"))
+            if references is not None:
+                return concept, paper.get("title", "Unknown Title"), references
+        return tuple(await self.arun("seminal_works", concept=concept, paper=paper))
+
+    async def ajudge_paper_batch(self, topic, papers, specialized_topics, gpt_agent, project_summary):
+        return await self.arun(
+            "prune_batch",
+            topic=topic,
+            papers=papers,
+            specialized_topics=specialized_topics,
+            project_summary=project_summary,
+        )
+
+    async def ajudge_paper_topics(self, paper, topics, specialized_topics, gpt_agent, project_summary):
+        return await self.arun(
+            "prune_topics",
+            paper=paper,
+            topics=topics,
+            specialized_topics=specialized_topics,
+            project_summary=project_summary,
+        )
+
+    async def ajudge_topic_papers(
+        self, topic, papers, specialized_topics, gpt_agent, project_summary, batch_size=1
+    ):
+        size = max(batch_size, 1)
+        batches = [papers[start:start + size] for start in range(0, len(papers), size)]
+        results = await asyncio.gather(
+            *(
+                self.ajudge_paper_batch(topic, batch, specialized_topics, gpt_agent, project_summary)
+                for batch in batches
+            )
+        )
+        return [verdict for batch in results for verdict in batch]
+
+    async def afind_foundational_for_paper(
+        self, paper, existing_fundamental_concepts, gpt_agent, core_concepts, index=None, single_pass=False
+    ):
+        return tuple(
+            await self.arun(
+                "foundational",
+                paper=paper,
+                fundamental_concepts=existing_fundamental_concepts,
+                core_concepts=core_concepts,
+                single_pass=single_pass,
+            )
+        )
+
+
+class Worker:
+    """
+    Worker side of the queue: leases tasks, runs up to concurrency of them at once with its own
+    agent, and acks each result or fails the attempt. The units raise when a request still fails
+    after the agent's retries, so an outage fails the attempt and the task is retried instead of
+    an empty result being acked; only the coordinator turns failures into missing results. Leases
+    of running tasks are renewed every third of the lease. With idle_exit, the worker stops after
+    that many seconds without work.
+    """
+
+    def __init__(self, queue, gpt_agent, name=None, concurrency=8, poll=0.2, idle_exit=None):
+        self.queue = queue
+        self.gpt_agent = gpt_agent
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll = poll
+        self.idle_exit = idle_exit
+        # Resource lookups are shared by every foundational task this worker runs
+        self.resources = ResourceIndex(gpt_agent)
+        self.done = 0
+        self.failed = 0
+
+    async def execute(self, kind, args):
+        if kind == "seminal_works":
+            return await afind_seminal_works(args["concept"], args["paper"], self.gpt_agent)
+        if kind == "prune_batch":
+            return await ajudge_paper_batch(
+                args["topic"], args["papers"], args["specialized_topics"], self.gpt_agent, args["project_summary"]
+            )
+        if kind == "prune_topics":
+            return await ajudge_paper_topics(
+                args["paper"], args["topics"], args["specialized_topics"], self.gpt_agent, args["project_summary"]
+            )
+        if kind == "foundational":
+            return await afind_foundational_for_paper(
+                args["paper"],
+                args["fundamental_concepts"],
+                self.gpt_agent,
+                args["core_concepts"],
+                self.resources,
+                args["single_pass"],
+            )
+        raise ValueError(f"Unknown task kind: {kind}")
+
+    async def arun(self):
+        loop = asyncio.get_running_loop()
+        running = {}
+        idle_since = loop.time()
+        renew_at = loop.time() + self.queue.lease_seconds / 3
+        while True:
+            if len(running) < self.concurrency:
+                leased = await asyncio.to_thread(self.queue.lease, self.name, self.concurrency - len(running))
+                for task_id, kind, args in leased:
+                    running[task_id] = asyncio.ensure_future(self.execute(kind, args))
+            if not running:
+                if self.idle_exit is not None and loop.time() - idle_since >= self.idle_exit:
+                    return
+                await asyncio.sleep(self.poll)
+                continue
+
+            await asyncio.wait(running.values(), timeout=self.poll, return_when=asyncio.FIRST_COMPLETED)
+            for task_id, task in list(running.items()):
+                if not task.done():
+                    continue
+                del running[task_id]
+                if task.exception() is not None:
+                    self.failed += 1
+                    await asyncio.to_thread(self.queue.fail, task_id, self.name, repr(task.exception()))
+                else:
+                    self.done += 1
+                    await asyncio.to_thread(self.queue.ack, task_id, task.result())
+            if running and loop.time() >= renew_at:
+                await asyncio.to_thread(self.queue.renew, list(running), self.name)
+                renew_at = loop.time() + self.queue.lease_seconds / 3
+            idle_since = loop.time()
+
+    def stats(self):
+        return {"done": self.done, "failed": self.failed}
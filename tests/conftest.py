@@ -0,0 +1,32 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules import each other relative to src, as when main_workflow.py is run; the benchmarks
+# directory provides the fake OpenAI server
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "benchmarks")]
+
+
+@pytest.fixture
+def fake_server():
+    """
+    Start FakeOpenAIServer instances on free ports: fake_server(**options) -> (server, base_url).
+    """
+    from fake_openai_server import FakeOpenAIServer
+
+    servers = []
+
+    def start(**options):
+        server = FakeOpenAIServer(("127.0.0.1", 0), **{"latency": "fixed:0", **options})
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from utils.budget import PartialResult, gather_within, missing_items
+
+
+async def finish(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def fail(delay=0.0):
+    await asyncio.sleep(delay)
+    raise RuntimeError("request failed")
+
+
+def test_no_budget_gathers_everything_in_input_order():
+    results, missing = asyncio.run(gather_within(None, {"b": finish(2, 0.02), "a": finish(1)}))
+    assert list(results.items()) == [("b", 2), ("a", 1)]
+    assert missing == []
+
+
+def test_expired_budget_lists_late_keys_and_cancels_them():
+    cancelled = []
+
+    async def slow(key):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(key)
+            raise
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        outcome = await gather_within(0.05, {"fast": finish(1), "slow": slow("slow"), "slower": slow("slower")})
+        return outcome, loop.time() - started
+
+    (results, missing), elapsed = asyncio.run(run())
+    assert results == {"fast": 1}
+    assert missing == ["slow", "slower"]
+    # Late tasks are cancelled and awaited before gather_within returns, not left running
+    assert sorted(cancelled) == ["slow", "slower"]
+    assert elapsed < 1
+
+
+def test_failure_propagates_without_fail_soft():
+    with pytest.raises(RuntimeError, match="request failed"):
+        asyncio.run(gather_within(None, {"ok": finish(1), "bad": fail()}))
+    with pytest.raises(RuntimeError, match="request failed"):
+        asyncio.run(gather_within(1.0, {"ok": finish(1), "bad": fail()}))
+
+
+@pytest.mark.parametrize("budget", [None, 1.0])
+def test_fail_soft_lists_failed_keys_as_missing(budget):
+    results, missing = asyncio.run(
+        gather_within(budget, {"ok": finish(1), "bad": fail(), "also_ok": finish(3)}, fail_soft=True)
+    )
+    assert results == {"ok": 1, "also_ok": 3}
+    assert missing == ["bad"]
+
+
+def test_fail_soft_counts_failed_and_late_keys_together():
+    results, missing = asyncio.run(
+        gather_within(0.05, {"late": finish(1, 10), "bad": fail(), "ok": finish(2)}, fail_soft=True)
+    )
+    assert results == {"ok": 2}
+    assert missing == ["late", "bad"]
+
+
+def test_zero_or_negative_budget_keeps_only_finished_work():
+    results, missing = asyncio.run(gather_within(-1, {"a": finish(1, 0.01)}))
+    assert results == {}
+    assert missing == ["a"]
+    assert asyncio.run(gather_within(0, {})) == ({}, [])
+
+
+def test_partial_result_missing():
+    partial = PartialResult({"a": 1}, missing=["b"])
+    assert partial == {"a": 1}
+    assert missing_items(partial) == ["b"]
+    assert missing_items({"a": 1}) == []
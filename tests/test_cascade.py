@@ -0,0 +1,50 @@
+from agents.general_agent import Agent
+from utils.prune_papers import ajudge_paper
+from utils.seminal_works import afind_seminal_works
+
+PAPERS = [f"Paper {index} on Robot Grasping" for index in range(6)]
+
+
+def cascade_agent(base_url, stage):
+    return Agent(model="gpt-4o", api_key="test", base_url=base_url, cascade={stage: "gpt-4o-mini"}, max_retries=0)
+
+
+def judge_all(agent):
+    async def judge():
+        return [await ajudge_paper("Grasping", paper, ["Grasping"], agent, "A robot arm") for paper in PAPERS]
+
+    return agent.run(judge())
+
+
+def test_confident_answers_stay_with_the_cheap_model(fake_server):
+    server, url = fake_server(model_uncertainty={"gpt-4o-mini": 0.0})
+    agent = cascade_agent(url, "prune_papers")
+    judge_all(agent)
+    assert server.stats["by_model"] == {"gpt-4o-mini": len(PAPERS)}
+    report = agent.cascade_report()["prune_papers"]
+    assert (report["answered"], report["escalated"], report["full_latency_mean"]) == (len(PAPERS), 0, None)
+
+
+def test_uncertain_answers_escalate_to_the_stage_model(fake_server):
+    server, url = fake_server(model_uncertainty={"gpt-4o-mini": 1.0})
+    agent = cascade_agent(url, "prune_papers")
+    judge_all(agent)
+    assert server.stats["by_model"] == {"gpt-4o-mini": len(PAPERS), "gpt-4o": len(PAPERS)}
+    report = agent.cascade_report()["prune_papers"]
+    assert (report["answered"], report["escalated"], report["escalation_rate"]) == (0, len(PAPERS), 1.0)
+
+
+def test_unparseable_json_escalates(fake_server):
+    server, url = fake_server(malformed_rate=1.0)
+    agent = cascade_agent(url, "seminal_works")
+    agent.run(afind_seminal_works("Grasping", {"title": PAPERS[0]}, agent))
+    assert server.stats["by_model"] == {"gpt-4o-mini": 1, "gpt-4o": 1}
+    assert agent.cascade_report()["seminal_works"]["escalated"] == 1
+
+
+def test_stages_without_a_cascade_go_straight_to_the_model(fake_server):
+    server, url = fake_server()
+    agent = cascade_agent(url, "seminal_works")
+    judge_all(agent)
+    assert server.stats["by_model"] == {"gpt-4o": len(PAPERS)}
+    assert agent.cascade_report() == {}
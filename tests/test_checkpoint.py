@@ -0,0 +1,49 @@
+from utils.checkpoint import PIPELINE_STAGES, CheckpointStore, load_fresh_outputs, save_outputs
+from utils.pipeline_config import PipelineConfig
+
+CONCEPTS = {
+    "project_title": "Robot Grasping",
+    "project_summary": "Grasp objects with a robot arm",
+    "core_concepts": ["Grasping"],
+    "specialized_concepts": ["Grasp Planning"],
+    "fundamental_concepts": ["Robotics"],
+}
+OUTPUTS = {
+    "survey_papers": {"Grasping": {"papers": [{"title": "A Survey of Grasping"}]}},
+    "seminal_counts": [{"Grasping": {"Grasp Paper": 1}}, {"Grasping": {"A Survey of Grasping": []}}],
+    "selected": {"Grasping": ["Grasp Paper"]},
+    "pruned": {"Grasping": ["Grasp Paper"]},
+    "foundational_topics": {"Grasp Paper": [{"topic": "Kinematics"}]},
+    "graph": {"nodes": [], "links": []},
+}
+
+
+def saved_store(tmp_path, config, **settings):
+    store = CheckpointStore(str(tmp_path), "robotics", "gpt-4o", **settings)
+    save_outputs(store, CONCEPTS, OUTPUTS, config)
+    return store
+
+
+def test_unchanged_settings_resume_every_stage(tmp_path):
+    saved_store(tmp_path, PipelineConfig())
+    store = CheckpointStore(str(tmp_path), "robotics", "gpt-4o")
+    assert list(load_fresh_outputs(store, CONCEPTS, PipelineConfig())) == PIPELINE_STAGES
+
+
+def test_a_stage_setting_invalidates_that_stage_and_later_ones(tmp_path):
+    saved_store(tmp_path, PipelineConfig())
+    store = CheckpointStore(str(tmp_path), "robotics", "gpt-4o")
+    resumed = load_fresh_outputs(store, CONCEPTS, PipelineConfig(prune_batch_size=10))
+    assert list(resumed) == ["survey_papers", "seminal_counts", "selected"]
+
+
+def test_structured_output_invalidates_every_stage(tmp_path):
+    saved_store(tmp_path, PipelineConfig())
+    store = CheckpointStore(str(tmp_path), "robotics", "gpt-4o", structured_output=True)
+    assert load_fresh_outputs(store, CONCEPTS, PipelineConfig()) == {}
+
+
+def test_model_invalidates_every_stage(tmp_path):
+    saved_store(tmp_path, PipelineConfig())
+    store = CheckpointStore(str(tmp_path), "robotics", "gpt-4o-mini")
+    assert load_fresh_outputs(store, CONCEPTS, PipelineConfig()) == {}
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+from utils.citation_expansion import aexpand_citations
+
+
+class ReferenceAgent:
+    """
+    Answers seminal-works prompts from a {title: [reference titles]} map; titles in broken fail.
+    """
+
+    def __init__(self, references, broken=()):
+        self.references = references
+        self.broken = set(broken)
+        self.asked = []
+
+    def parse_failed(self, stage):
+        pass
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        title = next(title for title in self.references if title in input_text)
+        self.asked.append(title)
+        if title in self.broken:
+            raise RuntimeError("outage")
+        return json.dumps({"seminal_works": [{"title": reference} for reference in self.references[title]]})
+
+
+REFERENCES = {
+    "Paper A": ["Paper C"],
+    "Paper B": ["Paper D"],
+    "Paper C": [],
+    "Paper D": [],
+}
+RESULTS = [("Concept", "Survey", [{"title": "Paper A"}, {"title": "Paper B"}])]
+
+
+def test_expansion_follows_references_of_references():
+    agent = ReferenceAgent(REFERENCES)
+    expanded, stats = asyncio.run(aexpand_citations("Concept", RESULTS, agent, max_depth=3))
+    assert sorted(title for _, title, _ in expanded) == ["Paper A", "Paper B", "Paper C", "Paper D"]
+    assert (stats["expanded"], stats["llm_calls"], stats["failed"], stats["deepest"]) == (4, 4, 0, 2)
+
+
+def test_failed_expansions_are_left_out():
+    agent = ReferenceAgent(REFERENCES, broken=["Paper A"])
+    expanded, stats = asyncio.run(aexpand_citations("Concept", RESULTS, agent, max_depth=3))
+    assert sorted(title for _, title, _ in expanded) == ["Paper B", "Paper D"]
+    assert (stats["failed"], stats["out_of_time"]) == (1, False)
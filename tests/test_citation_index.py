@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from utils.citation_index import CitationIndex, build_citation_index
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "semantic_scholar_sample")
+
+
+@pytest.fixture
+def index(tmp_path):
+    meta = build_citation_index(
+        [os.path.join(SAMPLE, "papers.jsonl")], [os.path.join(SAMPLE, "citations.jsonl")], str(tmp_path)
+    )
+    assert meta["papers"] == 18
+    # Citations to papers outside the dump are dropped
+    assert meta["references"] == 42
+    index = CitationIndex(str(tmp_path))
+    yield index
+    index.close()
+
+
+def test_find_matches_spelling_variants(index):
+    row = index.find("a survey of large language models (2023)")
+    assert row is not None
+    assert index.title(row) == "A Survey of Large Language Models"
+    assert index.year(row) == 2023
+    assert index.find("A Survey of Small Language Models") is None
+
+
+def test_seminal_works_are_the_most_cited_references(index):
+    # Papers without a citationcount are ranked by the citations found in the dump
+    assert index.seminal_works("A Survey of Large Language Models") == [
+        {"title": "Sequence to Sequence Learning with Neural Networks", "year": 2014},
+        {"title": "Attention Is All You Need", "year": 2017},
+        {"title": "Long Short-Term Memory", "year": 1997},
+        {"title": "BERT: Pre-training of Deep Bidirectional Transformers for Language Understanding", "year": 2019},
+        {"title": "Adam: A Method for Stochastic Optimization", "year": 2015},
+    ]
+    assert len(index.seminal_works("A Survey of Large Language Models", limit=20)) == 9
+
+
+def test_papers_without_references_are_misses(index):
+    assert index.seminal_works("Deep Residual Learning for Image Recognition") is None
+    assert index.seminal_works("An Unknown Paper") is None
+    assert index.stats() == {"papers": 18, "hits": 0, "misses": 2}
+
+
+def test_build_is_deterministic(index, tmp_path):
+    rebuilt = build_citation_index(
+        [os.path.join(SAMPLE, "papers.jsonl")], [os.path.join(SAMPLE, "citations.jsonl")], str(tmp_path / "again")
+    )
+    assert rebuilt["build_id"] == index.build_id
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from utils.foundational_topics import ResourceIndex, afind_paper_topics, topic_entries
+
+
+class ResourceAgent:
+    """
+    Answers resource prompts with "Book on <topic>"; a request that lists a topic in broken fails.
+    """
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.requests = 0
+        self.parse_failures = 0
+
+    def parse_failed(self, stage):
+        self.parse_failures += 1
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        self.requests += 1
+        topics = re.findall(r"^(\d+)\. (.+)$", input_text, re.MULTILINE)
+        if any(topic in self.broken for _, topic in topics):
+            raise RuntimeError("outage")
+        # Failures come back first, while other batches are still running
+        await asyncio.sleep(0.01)
+        resources = [{"index": int(index), "resource": f"Book on {topic}"} for index, topic in topics]
+        return json.dumps({"resources": resources})
+
+
+def test_topic_entries_skip_malformed_entries():
+    entries = [{"topic": "Kinematics"}, {"topic": ""}, {"resource": "No topic"}, "Dynamics", {"topic": 3}]
+    assert topic_entries(entries) == [{"topic": "Kinematics"}]
+    with pytest.raises(ValueError):
+        topic_entries({"topic": "Kinematics"})
+
+
+def test_unparseable_topics_yield_none():
+    class Agent(ResourceAgent):
+        async def aquery(self, instructions, input_text, stage=None, response_format=None):
+            return "not json"
+
+    agent = Agent()
+    assert asyncio.run(afind_paper_topics("Paper", [], agent, ["Grasping"])) == ("Paper", [])
+    assert agent.parse_failures == 1
+
+
+def test_each_topic_is_looked_up_once():
+    agent = ResourceAgent()
+    index = ResourceIndex(agent, batch_size=2)
+
+    async def run():
+        await asyncio.gather(index.resolve(["Kinematics", "Dynamics"]), index.resolve(["kinematics", "Control"]))
+
+    asyncio.run(run())
+    assert index.attach([{"topic": "KINEMATICS"}, {"topic": "Control"}]) == [
+        {"topic": "KINEMATICS", "resource": "Book on Kinematics"},
+        {"topic": "Control", "resource": "Book on Control"},
+    ]
+    assert agent.requests == 2
+
+
+def test_a_failed_batch_fails_only_its_own_topics():
+    agent = ResourceAgent(broken=["Dynamics"])
+    index = ResourceIndex(agent, batch_size=1)
+
+    async def run():
+        return await asyncio.gather(
+            index.resolve(["Dynamics", "Kinematics", "Control"]), index.resolve(["Kinematics"]), return_exceptions=True
+        )
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, RuntimeError)
+    assert second is None
+    assert index.attach([{"topic": "Kinematics"}, {"topic": "Control"}, {"topic": "Dynamics"}]) == [
+        {"topic": "Kinematics", "resource": "Book on Kinematics"},
+        {"topic": "Control", "resource": "Book on Control"},
+        {"topic": "Dynamics"},
+    ]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import httpx
+import openai
+
+from agents.general_agent import Agent
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://127.0.0.1/v1/responses"))
+
+
+class ScriptedStreamAgent(Agent):
+    """
+    Streams each attempt's answer from a script in five-character chunks; an attempt whose script
+    ends in an exception raises it after streaming the text before it.
+    """
+
+    def __init__(self, attempts):
+        super().__init__(api_key="test", base_url="http://127.0.0.1:9/v1")
+        self.rate_control.base_delay = 0.0
+        self.attempts = list(attempts)
+
+    async def _astream_attempt(self, client, request, stage, estimated):
+        text, error = self.attempts.pop(0)
+        for start in range(0, len(text), 5):
+            yield text[start:start + 5]
+        if error is not None:
+            raise error
+
+
+def stream_titles(agent, item_key=None):
+    async def collect():
+        return [item async for item in agent.astream_items("Instructions", "Input", "papers", item_key=item_key)]
+
+    return [paper["title"] for paper in agent.run(collect())]
+
+
+def answer(*titles):
+    return json.dumps({"papers": [{"title": title} for title in titles]})
+
+
+def test_retried_stream_yields_each_element_once():
+    first = answer("A", "B", "C")
+    agent = ScriptedStreamAgent(
+        [
+            # Cut off after A and B, then resampled in a different order with a new paper
+            (first[:first.index('{"title": "C"')], connection_error()),
+            (answer("B", "D", "A", "C"), None),
+        ]
+    )
+    assert stream_titles(agent) == ["A", "B", "D", "C"]
+    assert agent.retries[None] == 1
+
+
+def test_item_key_matches_respelled_elements():
+    first = answer("A", "B")
+    agent = ScriptedStreamAgent([(first[:first.index('{"title": "B"')], connection_error()), (answer("a.", "B"), None)])
+    assert stream_titles(agent, item_key=lambda paper: paper["title"].strip(".").lower()) == ["A", "B"]
+
+
+class SlowThenFastClient:
+    """
+    Fake async client whose calls take the given delays in turn; records cancelled calls.
+    """
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self.cancelled = []
+        self.responses = self
+
+    async def create(self, **request):
+        call = self.calls
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delays[call])
+        except asyncio.CancelledError:
+            self.cancelled.append(call)
+            raise
+        return f"response {call}"
+
+
+def hedging_agent():
+    agent = Agent(api_key="test", base_url="http://127.0.0.1:9/v1", hedge_percentile=90, hedge_min_samples=5)
+    for _ in range(5):
+        agent._record_latency("stage", 0.02)
+    return agent
+
+
+def create(agent, client):
+    request = {"model": "gpt-4o", "instructions": "Instructions", "input": "Input"}
+    return agent.run(agent._acreate(client, request, "stage"))
+
+
+def test_hedge_wins_and_cancels_the_slow_attempt():
+    agent = hedging_agent()
+    client = SlowThenFastClient(10, 0.01)
+    assert create(agent, client) == "response 1"
+    assert client.calls == 2
+    assert client.cancelled == [0]
+    assert agent.hedged["stage"] == 1
+    assert agent.hedge_wins["stage"] == 1
+
+
+def test_primary_finishing_first_cancels_the_hedge():
+    agent = hedging_agent()
+    client = SlowThenFastClient(0.1, 10)
+    assert create(agent, client) == "response 0"
+    assert client.cancelled == [1]
+    assert agent.hedged["stage"] == 1
+    assert agent.hedge_wins["stage"] == 0
+
+
+def test_no_hedge_before_enough_latency_samples():
+    agent = Agent(api_key="test", base_url="http://127.0.0.1:9/v1", hedge_percentile=90, hedge_min_samples=5)
+    client = SlowThenFastClient(0.05)
+    assert create(agent, client) == "response 0"
+    assert client.calls == 1
+    assert agent.hedged["stage"] == 0
@@ -0,0 +1,73 @@
+import networkx as nx
+import pytest
+
+from utils.graph_store import GraphStore
+from utils.tree_builder import build_tree_graph
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = GraphStore(str(tmp_path / "graphs.sqlite"))
+    yield store
+    store.close()
+
+
+def project_graph(papers, topics=None):
+    return build_tree_graph("Robot Grasping", ["Grasping", "Perception"], papers, topics or {})
+
+
+def assert_same_graph(rebuilt, G):
+    # A resource of None is stored as no resource
+    nodes = [
+        (node, {name: value for name, value in data.items() if value is not None}) for node, data in G.nodes(data=True)
+    ]
+    assert list(rebuilt.nodes(data=True)) == nodes
+    assert list(rebuilt.edges()) == list(G.edges())
+
+
+def test_subgraph_round_trips_the_upserted_graph(store):
+    G = project_graph(
+        {"Grasping": ["Dex-Net 2.0"], "Perception": ["PointNet"]},
+        {"Dex-Net 2.0": [{"topic": "Deep Learning", "resource": "A book"}], "PointNet": [{"topic": "Geometry"}]},
+    )
+    store.upsert("robotics", G)
+    assert_same_graph(store.subgraph("robotics"), G)
+    assert store.subgraph("unknown") is None
+
+
+def test_upsert_writes_only_the_difference(store):
+    store.upsert("robotics", project_graph({"Grasping": ["Dex-Net 2.0"], "Perception": ["PointNet"]}))
+    G = project_graph({"Grasping": ["Dex-Net 2.0"], "Perception": ["VoxNet"]})
+    counts = store.upsert("robotics", G)
+    assert counts == {"memberships": {"added": 1, "removed": 1}, "edges": {"added": 1, "removed": 1}}
+    assert store.upsert("robotics", G) == {
+        "memberships": {"added": 0, "removed": 0},
+        "edges": {"added": 0, "removed": 0},
+    }
+    assert_same_graph(store.subgraph("robotics"), G)
+    # PointNet is no longer referenced by any project, so its node is dropped
+    assert store.stats() == {"projects": 1, "nodes": G.number_of_nodes(), "edges": G.number_of_edges()}
+
+
+def test_nodes_are_shared_across_projects(store):
+    store.upsert("robotics", project_graph({"Grasping": ["Dex-Net 2.0"], "Perception": []}))
+    other = build_tree_graph("Warehouse Picking", ["Picking"], {"Picking": ["dex-net 2.0."]}, {})
+    store.upsert("warehouse", other)
+    assert store.projects_for("Dex-Net 2.0") == ["robotics", "warehouse"]
+    # The node carries the spelling it was last upserted with, each project its own
+    assert ("dex-net 2.0.", "seminal_paper", ["robotics", "warehouse"]) in store.shared_nodes()
+    assert "dex-net 2.0." in store.subgraph("warehouse")
+    store.remove_project("warehouse")
+    assert store.projects_for("Dex-Net 2.0") == ["robotics"]
+
+
+def test_labels_with_the_same_key_merge_into_one_node(store):
+    G = nx.DiGraph()
+    G.add_node("Project", group="project_title", metadata="Project Title")
+    for label in ("Grasp Planning", "grasp planning."):
+        G.add_node(label, group="core_concept", metadata="Core Concept")
+        G.add_edge("Project", label)
+    store.upsert("robotics", G)
+    rebuilt = store.subgraph("robotics")
+    assert list(rebuilt.nodes) == ["Project", "Grasp Planning"]
+    assert list(rebuilt.edges()) == [("Project", "Grasp Planning")]
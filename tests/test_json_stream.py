@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from utils.json_stream import JsonArrayStream, iter_array_items
+
+DOCUMENT = json.dumps(
+    {
+        "note": "papers: [not this]",
+        "papers": [
+            {"title": "Quotes \" and \\ backslashes, commas, and ] brackets", "year": 2020},
+            {"title": "Nested", "authors": [{"name": "A"}, {"name": "B"}], "meta": {"papers": [1, 2]}},
+            "a string",
+            42,
+            None,
+        ],
+        "after": [1, 2],
+    }
+)
+ITEMS = json.loads(DOCUMENT)["papers"]
+
+
+def feed_in_chunks(text, size, key="papers"):
+    parser = JsonArrayStream(key)
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return parser, items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_any_chunking_yields_the_same_items(size):
+    # Chunks of one or two characters split every string, escape sequence and number
+    parser, items = feed_in_chunks(DOCUMENT, size)
+    assert items == ITEMS
+    assert parser.done
+
+
+def test_items_are_yielded_as_soon_as_they_close():
+    parser = JsonArrayStream("papers")
+    assert parser.feed('{"papers": [{"title": "A"}, {"ti') == [{"title": "A"}]
+    assert parser.feed('tle": "B"}') == [{"title": "B"}]
+    assert parser.feed(", 3") == []
+    assert parser.feed("]}") == [3]
+
+
+def test_code_fenced_output():
+    fenced = "Here you go:\n```json\n" + DOCUMENT + "\n```\n"
+    parser, items = feed_in_chunks(fenced, 5)
+    assert items == ITEMS
+    assert parser.done
+
+
+def test_truncated_input_yields_only_complete_items():
+    cut = DOCUMENT.index("a string")
+    parser, items = feed_in_chunks(DOCUMENT[:cut + 4], 3)
+    assert items == ITEMS[:2]
+    assert not parser.done
+
+
+def test_array_under_a_nested_key():
+    assert iter_array_items('{"result": {"papers": [1, [2, 3], {"x": []}]}}', "papers") == [1, [2, 3], {"x": []}]
+
+
+def test_missing_key_yields_nothing():
+    parser, items = feed_in_chunks(DOCUMENT, 4, key="missing")
+    assert items == []
+    assert not parser.done
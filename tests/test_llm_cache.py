@@ -0,0 +1,103 @@
+import types
+
+import pytest
+
+from agents.general_agent import Agent
+from utils import llm_cache
+from utils.llm_cache import LLMCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    The cache's clock, advanced by hand: clock.now += seconds.
+    """
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(llm_cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def cache_at(tmp_path, **options):
+    return LLMCache(str(tmp_path / "cache.sqlite"), **options)
+
+
+def test_keys_depend_on_every_request_field():
+    key = LLMCache.make_key("gpt-4o", 0.0, "Instructions", "Input")
+    assert key == LLMCache.make_key("gpt-4o", 0.0, "Instructions", "Input")
+    variants = {
+        key,
+        LLMCache.make_key("gpt-4o-mini", 0.0, "Instructions", "Input"),
+        LLMCache.make_key("gpt-4o", 0.5, "Instructions", "Input"),
+        LLMCache.make_key("gpt-4o", 0.0, "Other", "Input"),
+        LLMCache.make_key("gpt-4o", 0.0, "Instructions", "Other"),
+        LLMCache.make_key("gpt-4o", 0.0, "Instructions", "Input", {"type": "json_schema"}),
+    }
+    assert len(variants) == 6
+
+
+def test_eviction_drops_least_recently_used_first(tmp_path, clock):
+    cache = cache_at(tmp_path, max_bytes=100)
+    for key in "abcd":
+        cache.set(key, "gpt-4o", "x" * 20)
+        clock.now += 1
+    # Reading a makes b the least recently used entry
+    assert cache.get("a") == "x" * 20
+    clock.now += 1
+    cache.set("e", "gpt-4o", "x" * 20)
+    assert cache.stats()["entries"] == 5
+    # Over max_bytes: trimmed to at most 90 bytes, least recently used first
+    cache.set("f", "gpt-4o", "x" * 20)
+    assert [key for key in "abcdef" if cache.get(key) is not None] == ["a", "d", "e", "f"]
+    assert cache.stats()["bytes"] == 80
+
+
+def test_entries_expire(tmp_path, clock):
+    cache = cache_at(tmp_path, max_age_seconds=60)
+    cache.set("old", "gpt-4o", "answer")
+    clock.now += 30
+    cache.set("new", "gpt-4o", "answer")
+    assert cache.get("old") == "answer"
+    clock.now += 40
+    assert cache.get("old") is None
+    assert cache.get("new") == "answer"
+    # Expired entries are deleted when the cache is next opened
+    cache.close()
+    assert cache_at(tmp_path, max_age_seconds=60).stats()["entries"] == 1
+
+
+def test_hit_and_miss_counts(tmp_path):
+    cache = cache_at(tmp_path)
+    cache.set("key", "gpt-4o", "answer")
+    cache.get("key")
+    cache.get("other")
+    assert {name: cache.stats()[name] for name in ("hits", "misses", "hit_rate")} == {
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def query(agent):
+    return agent.run(agent.aquery("Instructions", "Input", stage="survey_papers"))
+
+
+def test_agent_answers_repeats_from_the_cache(tmp_path, fake_server):
+    server, url = fake_server()
+    cache = cache_at(tmp_path)
+    first = query(Agent(api_key="test", base_url=url, cache=cache))
+    assert query(Agent(api_key="test", base_url=url, cache=cache)) == first
+    assert server.stats["requests"] == 1
+
+
+def test_refresh_cache_skips_lookups_but_writes_through(tmp_path, fake_server):
+    server, url = fake_server()
+    cache = cache_at(tmp_path)
+    key = LLMCache.make_key("gpt-4o", 0.0, "Instructions", "Input")
+    cache.set(key, "gpt-4o", "stale answer")
+    fresh = query(Agent(api_key="test", base_url=url, cache=cache, refresh_cache=True))
+    assert fresh != "stale answer"
+    assert server.stats["requests"] == 1
+    assert cache.get(key) == fresh
+    # The fresh answer replaced the stale one, and a normal run now reuses it
+    assert query(Agent(api_key="test", base_url=url, cache=cache)) == fresh
+    assert server.stats["requests"] == 1
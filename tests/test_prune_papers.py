@@ -0,0 +1,72 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from utils.prune_papers import ajudge_paper_batch, parse_batch_verdicts
+
+
+def verdicts(*answers):
+    return json.dumps({"verdicts": [{"index": index, "relevant": answer} for index, answer in answers]})
+
+
+def test_parse_batch_verdicts_orders_by_index():
+    assert parse_batch_verdicts(verdicts((2, "no"), (1, "Yes"), (3, "yes")), 3) == [True, False, True]
+
+
+def test_parse_batch_verdicts_skips_malformed_entries():
+    response = json.dumps(
+        {"verdicts": [{"index": 1, "relevant": "yes"}, {"index": 9, "relevant": "no"}, {"relevant": "no"}, "no"]}
+    )
+    assert parse_batch_verdicts(response, 1) == [True]
+
+
+@pytest.mark.parametrize(
+    "response",
+    ["not json", "[]", verdicts((1, "yes")), verdicts((1, "yes"), (2, "maybe")), verdicts((1, "yes"), (1, "no"))],
+)
+def test_parse_batch_verdicts_rejects_incomplete_answers(response):
+    with pytest.raises(ValueError):
+        parse_batch_verdicts(response, 2)
+
+
+class BatchAgent:
+    """
+    Answers batches of at most max_batch papers, and single papers with yes or no; larger
+    batches get an answer that does not parse. Papers are relevant when their title says so.
+    """
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.batches = []
+        self.parse_failures = 0
+
+    def parse_failed(self, stage):
+        self.parse_failures += 1
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        if response_format is None:
+            return "yes" if "relevant" in input_text.split("Paper:")[-1] else "no"
+        papers = re.findall(r"^(\d+)\. (.+)$", input_text, re.MULTILINE)
+        self.batches.append(len(papers))
+        if len(papers) > self.max_batch:
+            return "Sorry, I cannot judge that many papers."
+        return verdicts(*((int(index), "yes" if "relevant" in paper else "no") for index, paper in papers))
+
+
+def test_batch_splits_until_answers_parse():
+    papers = [f"Paper {index} {'relevant' if index % 2 else 'unrelated'}" for index in range(8)]
+    agent = BatchAgent(max_batch=2)
+    result = asyncio.run(ajudge_paper_batch("Topic", papers, ["Topic"], agent, "Summary"))
+    assert result == [paper if "relevant" in paper else None for paper in papers]
+    assert agent.batches == [8, 4, 4, 2, 2, 2, 2]
+    assert agent.parse_failures == 3
+
+
+def test_batch_falls_back_to_single_paper_prompts():
+    papers = ["A relevant paper", "An unrelated paper"]
+    agent = BatchAgent(max_batch=1)
+    result = asyncio.run(ajudge_paper_batch("Topic", papers, ["Topic"], agent, "Summary"))
+    assert result == ["A relevant paper", None]
+    assert agent.batches == [2]
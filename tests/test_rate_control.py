@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from agents.general_agent import Agent
+from utils.rate_control import AdaptiveLimiter, retry_delay
+
+
+def succeed(limiter, count=1, stage="stage"):
+    # Calls of a steady 10ms, so scheduling jitter cannot look like a latency spike
+    for _ in range(count):
+        limiter.acquire_sync()
+        limiter.release(time.monotonic() - 0.01, stage)
+
+
+def throttle(limiter):
+    limiter.release(limiter.acquire_sync(), rate_limited=True)
+
+
+def test_slow_start_adds_one_per_success():
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=4)
+    succeed(limiter, 5)
+    assert limiter.limit == 9
+    succeed(limiter, 50)
+    assert limiter.limit == 32
+
+
+def test_rate_limit_halves_then_grows_additively():
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=16)
+    throttle(limiter)
+    assert (limiter.limit, limiter.slow_start, limiter.decreases) == (8, False, 1)
+    # Congestion avoidance: one more slot per limit-many successes
+    succeed(limiter, 8)
+    assert limiter.limit == pytest.approx(9, abs=0.05)
+    throttle(limiter)
+    assert limiter.limit == pytest.approx(4.5, abs=0.05)
+    assert limiter.snapshot()["rate_limited"] == 2
+
+
+def test_a_burst_of_rate_limits_counts_once():
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=16)
+    started = [limiter.acquire_sync() for _ in range(4)]
+    time.sleep(0.001)
+    for start in started:
+        limiter.release(start, rate_limited=True)
+    assert (limiter.limit, limiter.decreases, limiter.rate_limited) == (8, 1, 4)
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveLimiter(max_limit=4, initial_limit=2, min_limit=1)
+    for _ in range(10):
+        throttle(limiter)
+    assert limiter.limit == 1
+    succeed(limiter, 100)
+    assert limiter.limit == 4
+
+
+def test_slow_calls_shrink_the_limit_and_other_failures_do_not():
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=10, latency_tolerance=3.0)
+    limiter.release(time.monotonic() - 0.01, "stage")
+    assert limiter.limit == 11
+    limiter.in_flight += 1
+    limiter.release(time.monotonic() - 1.0, "stage")
+    assert limiter.limit == pytest.approx(9.9)
+    limiter.in_flight += 1
+    limiter.release(time.monotonic(), "stage", failed=True)
+    assert limiter.limit == pytest.approx(9.9)
+
+
+def test_waiters_get_slots_as_they_free_up():
+    limiter = AdaptiveLimiter(max_limit=2, initial_limit=2)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        started = await limiter.acquire()
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        limiter.release(started, "stage")
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+def rate_limit_error(headers):
+    request = httpx.Request("POST", "http://127.0.0.1/v1/responses")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_retry_after_is_respected():
+    for _ in range(20):
+        assert 2.0 <= retry_delay(rate_limit_error({"Retry-After": "2"}), 0, base_delay=0.5) <= 2.5
+        assert 0.25 <= retry_delay(rate_limit_error({"retry-after-ms": "250"}), 3, base_delay=0.5) <= 0.75
+
+
+def test_backoff_without_a_usable_retry_after():
+    for attempt in range(8):
+        for headers in ({}, {"Retry-After": "soon"}, {"Retry-After": "3600"}):
+            delay = retry_delay(rate_limit_error(headers), attempt, base_delay=0.5, max_delay=30.0)
+            assert 0 <= delay <= min(30.0, 0.5 * 2**attempt)
+
+
+def test_agent_waits_out_server_rate_limits(fake_server):
+    server, url = fake_server(rate_limit_rate=0.5, retry_after=0.05)
+    agent = Agent(api_key="test", base_url=url, max_retries=20)
+    agent.rate_control.base_delay = 0.01
+    delays = []
+    delay = agent.rate_control.delay
+    agent.rate_control.delay = lambda error, attempt: delays.append(delay(error, attempt)) or delays[-1]
+
+    async def run():
+        return await asyncio.gather(*(agent.aquery("Instructions", f"Input {index}") for index in range(10)))
+
+    assert all(agent.run(run()))
+    assert server.stats["rate_limited"] > 0
+    assert agent.rate_control.limiter.rate_limited == server.stats["rate_limited"] == len(delays)
+    assert all(0.05 <= delay <= 0.06 for delay in delays)
+    assert agent.rate_control.limiter.decreases >= 1
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from utils.prune_papers import aprune_papers
+from utils.relevance_prefilter import RelevancePrefilter
+
+TOPIC = "Robotic Grasping"
+SPECIALIZED = ["Robotic Grasping", "Grasp Pose Detection"]
+SUMMARY = "A robot arm that picks up household objects"
+PAPERS = [
+    "Robotic Grasping of Household Objects",
+    "Learning Grasp Pose Detection from Point Clouds",
+    "A Survey of Medieval Poetry",
+]
+
+
+class CountingAgent:
+    """
+    Stub agent that judges every paper relevant and counts its requests.
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        self.requests += 1
+        return "yes"
+
+    def parse_failed(self, stage):
+        pass
+
+
+def test_scores_rank_on_topic_titles_above_unrelated_ones():
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY)
+    assert prefilter.scores(TOPIC, [TOPIC])[0] == pytest.approx(1.0, abs=1e-5)
+    scores = prefilter.scores(TOPIC, PAPERS)
+    assert min(scores[0], scores[1]) > 0.5
+    assert scores[2] < 0.1
+
+
+def test_thresholds_keep_drop_and_defer():
+    scores = RelevancePrefilter(SPECIALIZED, SUMMARY).scores(TOPIC, PAPERS)
+    middle = sorted(scores)[1]
+    middle_paper = PAPERS[list(scores).index(middle)]
+    best_paper = PAPERS[int(scores.argmax())]
+
+    # A score equal to low is kept for the LLM; a score equal to high is accepted
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY, low=middle, high=float(scores.max()) + 1)
+    assert prefilter.split(TOPIC, PAPERS) == ({PAPERS[2]: False}, [paper for paper in PAPERS if paper != PAPERS[2]])
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY, low=float(scores.min()) - 1, high=middle)
+    decided, uncertain = prefilter.split(TOPIC, PAPERS)
+    assert decided == {middle_paper: True, best_paper: True}
+    assert uncertain == [PAPERS[2]]
+    assert prefilter.stats() == {"accepted": 2, "rejected": 0, "sent_to_llm": 1, "requests_avoided": 0}
+
+
+def test_no_thresholds_send_everything_to_the_llm():
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY)
+    assert prefilter.split(TOPIC, PAPERS) == ({}, PAPERS)
+
+
+def test_low_above_high_is_rejected():
+    with pytest.raises(ValueError):
+        RelevancePrefilter(SPECIALIZED, SUMMARY, low=0.5, high=0.2)
+
+
+def test_empty_candidate_list():
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY, low=0.1, high=0.6)
+    assert prefilter.scores(TOPIC, []).shape == (0,)
+    assert prefilter.split(TOPIC, []) == ({}, [])
+    assert prefilter.stats() == {"accepted": 0, "rejected": 0, "sent_to_llm": 0, "requests_avoided": 0}
+
+    agent = CountingAgent()
+    pruned = asyncio.run(aprune_papers(SPECIALIZED, {TOPIC: []}, agent, SUMMARY, prefilter=prefilter))
+    assert pruned == {TOPIC: []}
+    assert agent.requests == 0
+
+
+def test_prune_papers_sends_only_uncertain_papers():
+    scores = RelevancePrefilter(SPECIALIZED, SUMMARY).scores(TOPIC, PAPERS)
+    prefilter = RelevancePrefilter(SPECIALIZED, SUMMARY, low=0.05, high=float(scores.max()))
+    agent = CountingAgent()
+    pruned = asyncio.run(aprune_papers(SPECIALIZED, {TOPIC: PAPERS}, agent, SUMMARY, prefilter=prefilter))
+    best_paper = PAPERS[int(scores.argmax())]
+    # The unrelated paper is dropped locally, the best accepted locally, the other judged by the agent
+    assert pruned == {TOPIC: [paper for paper in PAPERS if paper != PAPERS[2]]}
+    assert agent.requests == 1
+    assert prefilter.stats() == {"accepted": 1, "rejected": 1, "sent_to_llm": 1, "requests_avoided": 2}
+    assert best_paper in pruned[TOPIC]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from agents.seminal_eval_agent import TOP_K, SeminalEvalAgent
+
+
+class RankingAgent:
+    """
+    Stub agent that ranks the papers in each prompt by the number in their title, highest first,
+    and records every prompt's candidates. extra titles are appended to each answer, as a model
+    might add papers it was not asked about or repeat one.
+    """
+
+    def __init__(self, extra=()):
+        self.prompts = []
+        self.extra = list(extra)
+
+    async def aquery(self, instructions, input_text, stage=None, response_format=None):
+        papers = input_text.split("Papers: ")[1].strip().split(", ")
+        self.prompts.append(papers)
+        await asyncio.sleep(0)
+        ranked = sorted(papers, key=lambda title: int(title.split()[-1]), reverse=True)
+        return json.dumps({"top_papers": ranked[:TOP_K] + self.extra})
+
+    def parse_failed(self, stage):
+        pass
+
+
+def titles(count, seed=0):
+    papers = [f"Paper {number}" for number in range(count)]
+    random.Random(seed).shuffle(papers)
+    return papers
+
+
+def best(count):
+    return [f"Paper {number}" for number in range(count - 1, count - 1 - TOP_K, -1)]
+
+
+@pytest.mark.parametrize("count", [23, 41, 64])
+def test_tournament_over_several_rounds_keeps_the_true_top(count):
+    agent = RankingAgent()
+    evaluator = SeminalEvalAgent({}, agent, "summary", chunk_size=8)
+    papers = titles(count)
+    assert asyncio.run(evaluator.atournament("topic", papers)) == best(count)
+    # Every candidate was seen in the first round, and no prompt went over chunk_size
+    assert sorted(paper for prompt in agent.prompts[:-(-count // 8)] for paper in prompt) == sorted(papers)
+    assert max(len(prompt) for prompt in agent.prompts) <= 8
+    # More than one round of chunks before the final ranking
+    assert len(agent.prompts) > -(-count // 8) + 1
+
+
+def test_tournament_advances_only_each_chunks_own_candidates():
+    # Each answer also names an outsider and repeats the chunk's best paper
+    agent = RankingAgent(extra=["Paper 999", "Paper 1"])
+    evaluator = SeminalEvalAgent({}, agent, "summary", chunk_size=8)
+    papers = titles(30)
+    result = asyncio.run(evaluator.atournament("topic", papers))
+    # The final ranking is answered as-is; every round before it is filtered to its chunk
+    assert result[:TOP_K] == best(30)
+    later_rounds = agent.prompts[4:]
+    assert len(later_rounds) > 1
+    for prompt in later_rounds:
+        assert set(prompt) <= set(papers)
+        assert len(prompt) == len(set(prompt))
+
+
+def test_tournament_without_chunk_size_is_one_call():
+    agent = RankingAgent()
+    evaluator = SeminalEvalAgent({}, agent, "summary")
+    assert asyncio.run(evaluator.atournament("topic", titles(20))) == best(20)
+    assert len(agent.prompts) == 1
+
+
+def test_chunk_size_must_exceed_top_k():
+    with pytest.raises(ValueError):
+        SeminalEvalAgent({}, RankingAgent(), "summary", chunk_size=TOP_K)
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import httpx
+import openai
+
+from agents.general_agent import Agent
+
+CALLERS = 5
+
+
+def upstream_requests(base_url):
+    return httpx.get(f"{base_url}/stats").json()["requests"]
+
+
+def singleflight_agent(base_url):
+    return Agent(api_key="test", base_url=base_url, max_retries=0)
+
+
+def aquery_together(agent):
+    async def ask():
+        return await asyncio.gather(
+            *(agent.aquery("Instructions", "Input", stage="stage") for _ in range(CALLERS)), return_exceptions=True
+        )
+
+    return agent.run(ask())
+
+
+def query_together(agent):
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+
+    def ask(slot):
+        barrier.wait()
+        try:
+            results[slot] = agent.query("Instructions", "Input", stage="stage")
+        except Exception as e:
+            results[slot] = e
+
+    threads = [threading.Thread(target=ask, args=(slot,)) for slot in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_aqueries_make_one_upstream_call(fake_server):
+    _, url = fake_server(latency="fixed:0.2")
+    agent = singleflight_agent(url)
+    answers = aquery_together(agent)
+    assert upstream_requests(url) == 1
+    assert len(set(answers)) == 1 and isinstance(answers[0], str)
+    assert agent.singleflight_saved["stage"] == CALLERS - 1
+    assert agent._inflight == {}
+
+
+def test_aquery_failure_reaches_every_waiter_and_clears_the_entry(fake_server):
+    server, url = fake_server(latency="fixed:0.2", error_rate=1.0)
+    agent = singleflight_agent(url)
+    errors = aquery_together(agent)
+    assert upstream_requests(url) == 1
+    assert all(isinstance(error, openai.InternalServerError) for error in errors)
+    assert agent._inflight == {}
+    # The failed call is not reused: the next identical request goes upstream again
+    server.error_rate = 0.0
+    assert isinstance(agent.run(agent.aquery("Instructions", "Input", stage="stage")), str)
+    assert upstream_requests(url) == 2
+
+
+def test_concurrent_identical_queries_make_one_upstream_call(fake_server):
+    _, url = fake_server(latency="fixed:0.2")
+    agent = singleflight_agent(url)
+    answers = query_together(agent)
+    assert upstream_requests(url) == 1
+    assert len(set(answers)) == 1 and isinstance(answers[0], str)
+    assert agent.singleflight_saved["stage"] == CALLERS - 1
+    assert agent._sync_inflight == {}
+
+
+def test_query_failure_reaches_every_waiter_and_clears_the_entry(fake_server):
+    server, url = fake_server(latency="fixed:0.2", error_rate=1.0)
+    agent = singleflight_agent(url)
+    errors = query_together(agent)
+    assert upstream_requests(url) == 1
+    assert all(isinstance(error, openai.InternalServerError) for error in errors)
+    assert agent._sync_inflight == {}
+    server.error_rate = 0.0
+    assert isinstance(agent.query("Instructions", "Input", stage="stage"), str)
+    assert upstream_requests(url) == 2
@@ -0,0 +1,51 @@
+from utils.seminal_works import count_seminal_works
+from utils.title_index import TitleIndex, normalize_title, split_title_year
+
+
+def test_split_title_year():
+    assert split_title_year("Attention Is All You Need (2017)") == ("Attention Is All You Need", 2017)
+    assert split_title_year("Attention Is All You Need, 2017") == ("Attention Is All You Need", 2017)
+    assert split_title_year("2001: A Space Odyssey") == ("2001: A Space Odyssey", None)
+
+
+def test_normalize_title_folds_spelling_variants():
+    assert normalize_title("BERT: Pre-training of Deep Bidirectional Transformers") == normalize_title(
+        "bert pre training of deep  bidirectional transformers (2019)"
+    )
+
+
+def test_near_duplicates_share_the_first_spelling():
+    index = TitleIndex()
+    first = index.canonical("Attention Is All You Need", 2017)
+    assert index.canonical("attention is all you need.") == first
+    assert index.canonical("Attention is All You Need (2017)") == first
+    assert index.canonical("Attention Is All You Needed") == first
+    assert len(index) == 1
+
+
+def test_distinct_titles_stay_apart():
+    index = TitleIndex()
+    titles = [
+        "Deep Residual Learning for Image Recognition",
+        "Long Short-Term Memory",
+        "Neo: A Learned Query Optimizer",
+    ]
+    assert [index.canonical(title) for title in titles] == titles
+    assert len(index) == 3
+
+
+def test_conflicting_years_block_a_fuzzy_match():
+    index = TitleIndex()
+    index.canonical("A Survey of Large Language Models", 2023)
+    assert index.canonical("A Survey of Large Language Model", 2010) == "A Survey of Large Language Model"
+    assert index.year("A Survey of Large Language Models") == 2023
+
+
+def test_count_seminal_works_counts_each_work_once_per_citing_paper():
+    results = [
+        ("NLP", "Survey A", [{"title": "Attention Is All You Need"}, {"title": "attention is all you need (2017)"}]),
+        ("NLP", "Survey B", [{"title": "Attention is all you need."}, {"title": "Long Short-Term Memory"}]),
+    ]
+    counts, references = count_seminal_works(results)
+    assert counts == {"NLP": {"Attention Is All You Need": 2, "Long Short-Term Memory": 1}}
+    assert list(references["NLP"]) == ["Survey A", "Survey B"]
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.work_queue import SQLiteWorkQueue, TaskFailed, Worker, WorkQueueClient
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0.2, max_attempts=2, retry_delay=0.0)
+
+
+def test_enqueue_is_idempotent(queue):
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    assert queue.enqueue("double", {"x": 1}, "key") == task_id
+    assert queue.enqueue("double", {"x": 2}, "other") != task_id
+    assert queue.stats()["pending"] == 2
+
+
+def test_lease_and_ack(queue):
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    assert queue.lease("a", limit=5) == [(task_id, "double", {"x": 1})]
+    # A leased task is not handed to another worker while its lease runs
+    assert queue.lease("b") == []
+    assert queue.outcomes([task_id]) == {}
+    queue.ack(task_id, 2)
+    assert queue.outcomes([task_id]) == {task_id: ("done", 2, None)}
+    # The finished task is reused rather than run again
+    assert queue.enqueue("double", {"x": 1}, "key") == task_id
+    assert queue.lease("a") == []
+
+
+def test_failed_attempts_are_retried_then_fail(queue):
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    queue.lease("a")
+    queue.fail(task_id, "a", "first")
+    assert queue.stats()["pending"] == 1
+    assert queue.lease("b") == [(task_id, "double", {"x": 1})]
+    # Only the worker holding the lease can fail it
+    queue.fail(task_id, "a", "stale")
+    assert queue.outcomes([task_id]) == {}
+    queue.fail(task_id, "b", "second")
+    assert queue.outcomes([task_id]) == {task_id: ("failed", None, "second")}
+    assert queue.stats()["retried"] == 1
+
+    # Enqueuing a failed task runs it again from scratch
+    assert queue.enqueue("double", {"x": 1}, "key") == task_id
+    assert queue.lease("a") == [(task_id, "double", {"x": 1})]
+
+
+def test_expired_leases_are_leased_again(queue):
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    queue.lease("a")
+    time.sleep(0.25)
+    assert queue.lease("b") == [(task_id, "double", {"x": 1})]
+    # a no longer holds the lease, so its renewal is ignored
+    queue.renew([task_id], "a")
+    time.sleep(0.25)
+    # Both attempts' leases ran out
+    assert queue.lease("c") == []
+    assert queue.outcomes([task_id]) == {task_id: ("failed", None, "lease expired")}
+
+
+def test_renew_keeps_a_lease(queue):
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    queue.lease("a")
+    for _ in range(3):
+        time.sleep(0.1)
+        queue.renew([task_id], "a")
+    assert queue.lease("b") == []
+
+
+def test_results_expire(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_age_seconds=0.1)
+    task_id = queue.enqueue("double", {"x": 1}, "key")
+    queue.lease("a")
+    queue.ack(task_id, 2)
+    time.sleep(0.15)
+    assert queue.enqueue("double", {"x": 1}, "key") == task_id
+    assert queue.outcomes([task_id]) == {}
+    assert queue.stats()["pending"] == 1
+
+
+class DoublingWorker(Worker):
+    """
+    Doubles x. The first attempts at the values in flaky fail, all attempts at those in broken.
+    """
+
+    def __init__(self, queue, flaky=(), broken=()):
+        super().__init__(queue, gpt_agent=None, name="test", concurrency=4, poll=0.01, idle_exit=0.3)
+        self.flaky = set(flaky)
+        self.broken = set(broken)
+
+    async def execute(self, kind, args):
+        if args["x"] in self.broken or args["x"] in self.flaky:
+            self.flaky.discard(args["x"])
+            raise RuntimeError("outage")
+        return args["x"] * 2
+
+
+def test_worker_runs_tasks_for_a_client(queue):
+    client = WorkQueueClient(queue, poll=0.01)
+    worker = DoublingWorker(queue, flaky=[2])
+
+    async def run():
+        results = asyncio.gather(*(client.arun("double", x=x) for x in (1, 2, 3, 1)))
+        await asyncio.gather(results, worker.arun())
+        return results.result()
+
+    assert asyncio.run(run()) == [2, 4, 6, 2]
+    assert client.submitted == 4
+    assert worker.stats() == {"done": 3, "failed": 1}
+    assert queue.stats() == {"pending": 0, "leased": 0, "done": 3, "failed": 0, "retried": 1}
+
+
+def test_client_raises_for_failed_tasks(queue):
+    client = WorkQueueClient(queue, poll=0.01)
+    worker = DoublingWorker(queue, broken=[5])
+
+    async def run():
+        results = await asyncio.gather(client.arun("double", x=5), worker.arun(), return_exceptions=True)
+        return results[0]
+
+    assert isinstance(asyncio.run(run()), TaskFailed)
+    assert worker.stats() == {"done": 0, "failed": 2}
+
+
+def test_client_gives_up_without_workers(queue):
+    client = WorkQueueClient(queue, poll=0.01, idle_timeout=0.1)
+    with pytest.raises(TaskFailed, match="no worker"):
+        asyncio.run(client.arun("double", x=1))
+
+
+def test_client_gives_up_when_its_worker_dies(queue):
+    client = WorkQueueClient(queue, poll=0.01, idle_timeout=0.1)
+
+    async def run():
+        task = asyncio.ensure_future(client.arun("double", x=1))
+        await asyncio.sleep(0.05)
+        # A worker leases the task and dies without acking it; no other worker is running
+        assert [task_id for task_id, _, _ in queue.lease("dead")] == [1]
+        assert queue.running() == 1
+        await asyncio.sleep(0.25)
+        assert queue.running() == 0
+        return await task
+
+    with pytest.raises(TaskFailed, match="no worker"):
+        asyncio.run(run())
+
+
+def test_namespaces_keep_tasks_apart(queue):
+    first = WorkQueueClient(queue, namespace="a")
+    second = WorkQueueClient(queue, namespace="b")
+    assert first._key("double", {"x": 1}) != second._key("double", {"x": 1})
+    assert first._key("double", {"x": 1}) == WorkQueueClient(queue, namespace="a")._key("double", {"x": 1})